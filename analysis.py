@@ -0,0 +1,854 @@
+"""
+The analyses behind the Explorer, Trend and Author pages, independent of Streamlit.
+
+`Dataset` bundles a loaded snapshot with the indexes built from it (token index per text
+column, BM25 index for ranked search, author and author-name indexes, year table, year x cluster x journal
+trend cube, spatial grid over the t-SNE map), the query cache its
+results go to and, optionally, the process pool that runs regex keyword verification
+(regex_pool.RegexPool). The app keeps one per process; benchmarks and command-line tools create their own, e.g. over a synthetic
+corpus with a private cache so every query is measured cold.
+
+A Dataset loaded with `columns` converts only those columns up front and the others from
+the mapped snapshot when an analysis first needs them (see `require`), so a page pulls only
+the columns it uses.
+
+Map figures send at most MAX_BACKGROUND_POINTS background papers as points; beyond that the
+background is a density raster (cached per cluster) and only matched or highlighted papers
+are points. A figure built for a viewport holds only the papers inside it.
+
+Slow keyword queries can also be run progressively (`cluster_figure_progressive`,
+`trend_progressive`): regex keywords are verified in steps and a partial figure is built
+between steps, so a caller can show results before the whole corpus is scanned and stop
+iterating when the query is superseded.
+
+The papers and series behind a figure can be exported as CSV or Parquet (`keyword_export`,
+`author_export`, `trend_export`); papers are read from the mapped snapshot and encoded in
+chunks (see export.py).
+
+New delta batches in the snapshot store are picked up with `refresh`, which extends the
+built indexes with the new rows only; `LiveDataset` does that periodically for long-running
+processes, so the app serves a new version without a restart.
+"""
+import datetime
+import functools
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import data_store
+import instrumentation
+from author_index import AuthorIndex, AuthorNameIndex, fold_name, parse_author_query
+from export import EXPORT_COLUMNS, encode, paper_chunks
+from figures import (author_figure, cooccurrence_figure, density_raster, explorer_figure, overlap_figure,
+                     ranked_figure, trend_facet_figure, trend_figure)
+from match_bits import MatchBits
+from query_cache import QUERY_CACHE, canonical_group
+from ranked_index import RankedIndex, query_tokens
+from regex_pool import RegexPool
+from spatial_index import SpatialIndex
+from text_index import MatchStep, TextIndex, split_keyword_groups
+from trends import TermCube, TrendCells, YearTable, percentages
+
+# Explorer cluster choice that plots every paper
+ALL_CLUSTERS = 'All embeddings'
+
+# How often LiveDataset checks the snapshot store for new delta batches
+DEFAULT_REFRESH_S = float(os.environ.get('MLA_REFRESH_S', 60))
+
+# Map figures draw the background as a density raster when it has more papers than this
+MAX_BACKGROUND_POINTS = int(os.environ.get('MLA_MAP_MAX_POINTS', 20000))
+
+# Papers returned by a ranked search
+RANKED_RESULTS = 50
+
+# Names suggested for an Author Search query
+AUTHOR_SUGGESTIONS = 10
+
+# Trend facets: papers are split by one of these columns
+FACETS = {'cluster': 'predicted_category', 'journal': 'journal_title'}
+
+# Journals shown when trends are split by journal: those with the most matches
+TOP_JOURNALS = 8
+
+# Progressive queries verify about this many candidate rows per step, and build a partial
+# figure at most every PROGRESS_INTERVAL_S seconds
+PROGRESS_CHUNK_ROWS = int(os.environ.get('MLA_PROGRESS_CHUNK_ROWS', 10000))
+PROGRESS_INTERVAL_S = 0.5
+
+
+class Dataset:
+    """A loaded snapshot, its lazily built indexes and the cache for its query results."""
+
+    def __init__(self, df, cache=QUERY_CACHE, regex_pool=None, table=None, source=None):
+        self.df = df
+        self.fingerprint = df.attrs.get('fingerprint')
+        self.cache = cache
+        self.regex_pool = regex_pool
+        # Mapped snapshot table that columns missing from df are converted from, and the
+        # (source_path, store_dir, delta_dir) it was loaded from, for refresh
+        self._table = table
+        self._source = source
+        # Cached results are only valid for this dataset version
+        cache.bind(self.fingerprint)
+        self._indexes = {}
+        # Reentrant: building an index may build the ones it depends on (the trend cube its cells)
+        self._lock = threading.RLock()
+        self._columns_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, source_path=data_store.SOURCE_PATH, store_dir=data_store.STORE_DIR, cache=QUERY_CACHE,
+             regex_workers=0, columns=None, delta_dir=data_store.DELTA_DIR):
+        """
+        Open the memory-mapped snapshot of `source_path` with the delta batches in `delta_dir`
+        appended, converting workbooks on first use.
+        With `regex_workers` > 0, regex keywords are verified in a RegexPool of that size.
+        With `columns`, only those columns are converted to pandas now; the rest on first use.
+        """
+        source = (source_path, store_dir, delta_dir)
+        with instrumentation.trace('load_data', columns=None if columns is None else len(columns)):
+            df, table = _open(data_store.snapshot_paths(*source), columns)
+            instrumentation.record(rows=len(df))
+        paths = df.attrs['snapshot_paths']
+        regex_pool = RegexPool(paths, workers=regex_workers) if regex_workers > 0 else None
+        return cls(df, cache, regex_pool, table, source)
+
+    def refresh(self):
+        """
+        The current version of this dataset: itself if the snapshot store is unchanged, a new
+        Dataset whose built indexes are extended with only the new rows when delta batches were
+        added, or a fresh load (sharing the regex pool) when the base or a batch changed.
+        """
+        if self._source is None:
+            return self
+        paths = data_store.snapshot_paths(*self._source)
+        current = self.df.attrs['snapshot_paths']
+        if paths == current:
+            return self
+
+        loaded = list(self.df.columns)
+        appended = paths[:len(current)] == current
+        with instrumentation.trace('refresh', deltas=len(paths) - 1, incremental=appended):
+            df, table = _open(paths, loaded)
+            instrumentation.record(rows=len(df), new_rows=len(df) - len(self.df))
+            if self.regex_pool is not None:
+                self.regex_pool.use_snapshots(paths)
+            dataset = Dataset(df, self.cache, self.regex_pool, table, self._source)
+            if appended:
+                dataset._extend_indexes(self._indexes, len(self.df))
+        return dataset
+
+    def require(self, *columns):
+        """
+        The frame with `columns` present, converting any that were not loaded yet from the
+        mapped snapshot. The new frame replaces `df`; frames handed out earlier stay valid.
+        """
+        df = self.df
+        missing = [column for column in columns if column not in df.columns]
+        if not missing:
+            return df
+        with self._columns_lock:
+            df = self.df
+            missing = [column for column in columns if column not in df.columns]
+            if missing and self._table is not None:
+                with instrumentation.trace('load_columns', columns=len(missing)):
+                    extra = data_store.to_frame(self._table.select(missing))
+                    attrs = df.attrs
+                    df = pd.concat([df, extra], axis=1, copy=False)
+                    df.attrs = attrs
+                    self.df = df
+        return df
+
+    def cluster_names(self):
+        """Research clusters in snapshot order, without loading the cluster column."""
+        return list(self.df.attrs['cluster_offsets'])
+
+    def text_index(self, location):
+        """Inverted token index over the 'abstract' or 'title' column."""
+        return self._index(('text', location), 'build_text_index',
+                           lambda: TextIndex(self.require(location)[location]), location=location)
+
+    def ranked_index(self):
+        """BM25 term statistics over titles and abstracts, for ranked search."""
+        return self._index('ranked', 'build_ranked_index', lambda: RankedIndex(
+            *(self.require('title', 'abstract')[column] for column in ('title', 'abstract'))))
+
+    def author_index(self):
+        """(last name, first initial) and last name -> row ids, for author searches."""
+        return self._index('authors', 'build_author_index', lambda: AuthorIndex(self.require('authors')['authors']))
+
+    def author_name_index(self):
+        """Trigram index over the distinct author names, for fuzzy name suggestions."""
+        return self._index('author_names', 'build_author_name_index',
+                           lambda: AuthorNameIndex(self.require('authors')['authors']))
+
+    def year_table(self):
+        """Publication-year codes and per-year totals used as trend denominators."""
+        return self._index('years', 'build_year_table', lambda: YearTable(self.require('pub_year')['pub_year']))
+
+    def trend_cells(self):
+        """(year, cluster, journal) cell of every paper, the dimensions of the trend cube."""
+        return self._index('cells', 'build_trend_cells', lambda: TrendCells(
+            self.year_table(), *(self.require(*FACETS.values())[column] for column in FACETS.values())))
+
+    def term_cube(self, location):
+        """Papers containing each token of the 'abstract' or 'title' index, per trend cell."""
+        return self._index(('cube', location), 'build_term_cube',
+                           lambda: TermCube(self.text_index(location), self.trend_cells()), location=location)
+
+    def spatial_index(self):
+        """Grid over the t-SNE coordinates, for region and nearest-neighbour queries."""
+        return self._index('spatial', 'build_spatial_index', lambda: SpatialIndex(
+            *(self.require('tsne_2D_x', 'tsne_2D_y')[column].to_numpy() for column in ('tsne_2D_x', 'tsne_2D_y'))))
+
+    def trend_years(self):
+        """
+        Mask over year_table().years of the years trend series report: the years completed by
+        the data's collection date (all years when it is unknown).
+        """
+        years = self.year_table().years
+        collected = self.df.attrs.get('collected')
+        if collected is None:
+            return np.ones(len(years), dtype=bool)
+        collected = datetime.date.fromisoformat(collected)
+        last_complete = collected.year if (collected.month, collected.day) == (12, 31) else collected.year - 1
+        return years <= last_complete
+
+    def match_keyword_groups(self, location, groups):
+        """
+        Match masks of several OR groups, cached per column and canonical group and stored
+        bit-packed. Groups not in the cache are matched together, so all their regex keywords
+        are verified in one (parallel, with a regex pool) scan.
+        """
+        with instrumentation.stage('match'):
+            fingerprint = self.fingerprint
+            keys = [('mask', location, canonical_group(alternatives)) for alternatives in groups]
+            packed = [self.cache.get(key, fingerprint=fingerprint) for key in keys]
+            missing = [i for i, p in enumerate(packed) if p is None]
+            if missing:
+                verify_many = (functools.partial(self.regex_pool.scan, location)
+                               if self.regex_pool is not None else None)
+                masks = self.text_index(location).match_groups([groups[i] for i in missing], verify_many)
+                for i, mask in zip(missing, masks):
+                    packed[i] = np.packbits(mask)
+                    self.cache.put(keys[i], packed[i], fingerprint)
+            return [np.unpackbits(p, count=len(self.df)).astype(bool) for p in packed]
+
+    def match_keyword_groups_progressive(self, location, groups, chunk_rows=PROGRESS_CHUNK_ROWS):
+        """
+        match_keyword_groups in steps (see TextIndex.match_groups_progressive), yielding a
+        MatchStep after each one. Cached groups are complete from the first step; the masks of
+        the last step are cached like those of match_keyword_groups.
+        """
+        fingerprint = self.fingerprint
+        keys = [('mask', location, canonical_group(alternatives)) for alternatives in groups]
+        packed = [self.cache.get(key, fingerprint=fingerprint) for key in keys]
+        missing = [i for i, p in enumerate(packed) if p is None]
+        masks = [np.unpackbits(p, count=len(self.df)).astype(bool) if p is not None else None for p in packed]
+        steps = [MatchStep(1.0, np.ones(len(self.df), dtype=bool), [], [])]
+        if missing:
+            verify_many = (functools.partial(self.regex_pool.scan, location)
+                           if self.regex_pool is not None else None)
+            steps = self.text_index(location).match_groups_progressive([groups[i] for i in missing], chunk_rows,
+                                                                       verify_many)
+        for step in steps:
+            complete = [True] * len(groups)
+            for i, mask, done in zip(missing, step.masks, step.complete):
+                masks[i], complete[i] = mask, done
+            if step.done == 1:
+                for i in missing:
+                    self.cache.put(keys[i], np.packbits(masks[i]), fingerprint)
+            yield step._replace(masks=list(masks), complete=complete)
+
+    def cluster_rows(self, cluster_name):
+        """
+        Rows of a research cluster (or ALL_CLUSTERS): a slice, as rows are stored grouped by
+        cluster, or an array of row ids when delta batches add rows to the cluster.
+        """
+        if cluster_name != ALL_CLUSTERS:
+            return data_store.cluster_rows(self.df, cluster_name)
+        return slice(0, len(self.df))
+
+    def keyword_matches(self, keywords, location, cluster_name=ALL_CLUSTERS):
+        """
+        Row ids matching each keyword group, within a research cluster.
+
+        Returns a list of (display_name, sorted row ids), one per group of split_keyword_groups.
+        """
+        groups = split_keyword_groups(keywords)
+        with instrumentation.trace('match', cluster=cluster_name, location=location, groups=len(groups)):
+            row_ids = np.arange(len(self.df))[self.cluster_rows(cluster_name)]
+            masks = self.match_keyword_groups(location, [alternatives for _, alternatives in groups])
+            matches = [(display_name, row_ids[mask[row_ids]]) for (display_name, _), mask in zip(groups, masks)]
+            instrumentation.count('rows_selected', len(row_ids))
+            instrumentation.count('rows_matched', sum(len(ids) for _, ids in matches))
+            return matches
+
+    def cluster_figure_progressive(self, cluster_name, keywords, location, only_matches=False, viewport=None,
+                                   interval_s=PROGRESS_INTERVAL_S):
+        """
+        cluster_figure in steps, for keywords that take long to verify: yields (done, figure)
+        with the fraction of the verification done and a partial figure, where the papers not
+        verified yet are drawn as unmatched. Steps between two partial figures (built at most
+        every `interval_s` seconds) yield None. The last step yields cluster_figure (done 1.0).
+        """
+        groups = split_keyword_groups(keywords)
+        key = ('explorer', cluster_name, location, bool(only_matches), _groups_key(groups), _viewport_key(viewport))
+        return self._progressive(
+            key, groups, location, interval_s,
+            lambda step: self._cluster_figure(cluster_name, groups, location, only_matches,
+                                              _viewport_key(viewport), step.masks),
+            lambda: self.cluster_figure(cluster_name, keywords, location, only_matches, viewport))
+
+    def trend_progressive(self, keywords, location, facet=None, interval_s=PROGRESS_INTERVAL_S):
+        """
+        trend_figure (or trend_facet_figure with a facet) in steps, like cluster_figure_progressive.
+        In a partial figure, groups still being verified are estimated from the papers scanned so far.
+        """
+        keywords = [k.strip() for k in keywords if k.strip()]
+        if not keywords:
+            return iter([(1.0, None)])
+        groups = split_keyword_groups(keywords)
+        key = ('trends', location, _groups_key(groups)) if facet is None else \
+            ('trend_facets', location, facet, _groups_key(groups))
+        return self._progressive(
+            key, groups, location, interval_s,
+            lambda step: self._partial_trend_figure(groups, step, facet),
+            lambda: self.trend_figure(keywords, location) if facet is None else
+            self.trend_facet_figure(keywords, location, facet))
+
+    def trend_series(self, keywords, location):
+        """
+        Per-year match percentages of each keyword group.
+
+        Returns (years, [(display_name, percentages)]) over the complete years (see trend_years).
+        """
+        groups = split_keyword_groups([k for k in keywords if k.strip()])
+        with instrumentation.trace('trend_series', location=location, groups=len(groups)):
+            return self._trend_series(groups, location)
+
+    def ranked_search(self, query, cluster_name=ALL_CLUSTERS, k=RANKED_RESULTS):
+        """
+        The k papers of a research cluster (or ALL_CLUSTERS) that best match a free-text query
+        by BM25 over titles and abstracts.
+
+        Returns (row ids, scores), best first; empty when no query word occurs in the corpus.
+        """
+        key = ('ranked', cluster_name, tuple(query_tokens(query)), k)
+        with instrumentation.trace('ranked_search', cluster=cluster_name, k=k):
+            return self.cache.get_or_compute(key, lambda: self._ranked_search(query, cluster_name, k),
+                                             self.fingerprint)
+
+    def match_bits(self, keywords, location):
+        """
+        MatchBits of the keyword groups over every paper: which groups each paper matched,
+        and pairwise overlaps by bitwise AND and popcount. Groups are deduplicated by display name.
+        """
+        groups = list(dict(split_keyword_groups([k for k in keywords if k.strip()])).items())
+        key = ('bits', location, _groups_key(groups))
+        with instrumentation.trace('match_bits', location=location, groups=len(groups)):
+            return self.cache.get_or_compute(key, lambda: self._match_bits(groups, location), self.fingerprint)
+
+    def cooccurrence(self, bits, groups):
+        """
+        Papers matching every one of `groups` (indexes into bits.names), per year and per cluster.
+
+        Returns (years, year counts, cluster names, cluster counts) over the complete years
+        (see trend_years) and the clusters in snapshot order.
+        """
+        with instrumentation.trace('cooccurrence', groups=len(groups)):
+            mask = bits.mask(*groups)
+            instrumentation.count('rows_matched', np.count_nonzero(mask))
+            year_table = self.year_table()
+            keep = self.trend_years()
+            clusters = self.cluster_names()
+            cluster_counts = np.array([np.count_nonzero(mask[self.cluster_rows(name)]) for name in clusters])
+            return year_table.years[keep], year_table.counts(mask)[keep], clusters, cluster_counts
+
+    def trend_facets(self, keywords, location, facet):
+        """
+        Per-year match percentages of each keyword group within each research cluster
+        (facet 'cluster') or journal ('journal'), from the trend cube.
+
+        Returns (years, facet values, [(display_name, percentages)]) where percentages is a
+        facet value x year matrix over the complete years (see trend_years). Journals are
+        limited to the TOP_JOURNALS with the most matches over all groups.
+        """
+        groups = split_keyword_groups([k for k in keywords if k.strip()])
+        with instrumentation.trace('trend_facets', location=location, facet=facet, groups=len(groups)):
+            return self._trend_facets(groups, location, facet)
+
+    def export_papers(self, row_ids, columns, fmt, extra=None):
+        """
+        CSV or Parquet export ('csv' / 'parquet') of the `columns` (see export.EXPORT_COLUMNS)
+        of the papers `row_ids`, read from the mapped snapshot a chunk at a time. Returns an
+        iterator over the encoded bytes (export.encode); `extra` adds columns per chunk.
+        """
+        unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot export columns {', '.join(unknown)}")
+        instrumentation.count('rows_selected', len(row_ids))
+        table = self._table
+        if table is None:
+            # Datasets built from an in-memory frame (benchmarks) have no snapshot to read from
+            table = pa.Table.from_pandas(self.require(*columns)[list(columns)], preserve_index=False)
+        return encode(paper_chunks(table, row_ids, columns, extra), fmt)
+
+    def keyword_export(self, cluster_name, keywords, location, columns, fmt):
+        """
+        export_papers of the papers of a research cluster (or ALL_CLUSTERS) matching any
+        keyword group, with a 'keywords' column listing every group each paper matches.
+        """
+        with instrumentation.trace('export', kind='keywords', cluster=cluster_name, location=location):
+            bits = self.match_bits(keywords, location)
+            row_ids = np.arange(len(self.df))[self.cluster_rows(cluster_name)]
+            if bits.names:
+                row_ids = row_ids[bits.match_counts()[row_ids] > 0]
+            else:
+                row_ids = row_ids[:0]
+            return self.export_papers(row_ids, columns, fmt, lambda ids: {'keywords': [
+                ', '.join(bits.names[group] for group in groups) for groups in bits.paper_groups(ids)]})
+
+    def author_export(self, author_name, columns, fmt, exact=False):
+        """export_papers of the papers of an author (see author_rows)."""
+        with instrumentation.trace('export', kind='author'):
+            return self.export_papers(self._author_rows(author_name, exact), columns, fmt)
+
+    def trend_export(self, keywords, location, fmt, facet=None):
+        """
+        CSV or Parquet export of the trend series: one row per keyword group, year and, with a
+        facet, research cluster or journal (see trend_series and trend_facets).
+        """
+        with instrumentation.trace('export', kind='trends', location=location, facet=facet):
+            if facet is None:
+                years, series = self.trend_series(keywords, location)
+                values = [None]
+                series = [(display_name, percentages[np.newaxis]) for display_name, percentages in series]
+            else:
+                years, values, series = self.trend_facets(keywords, location, facet)
+            columns = {'group': pa.array([display_name for display_name, matrix in series for _ in range(matrix.size)],
+                                         pa.string())}
+            if facet is not None:
+                columns[FACETS[facet]] = pa.array([value for _ in series for value in values for _ in years], pa.string())
+            columns['year'] = pa.array(np.tile(np.asarray(years, dtype=np.int16), len(series) * len(values)))
+            columns['percentage'] = pa.array(np.concatenate([matrix.ravel() for _, matrix in series])
+                                             if series else np.empty(0), pa.float64())
+            return encode([pa.table(columns)], fmt)
+
+    def author_rows(self, author_name, exact=False):
+        """
+        Sorted row ids of the papers matching an author search string, or with `exact`, of the
+        papers listing `author_name` as it is listed in the data (e.g. an author_suggestions name).
+        """
+        with instrumentation.trace('author_rows', exact=bool(exact)):
+            return self._author_rows(author_name, exact)
+
+    def author_suggestions(self, query, k=AUTHOR_SUGGESTIONS):
+        """
+        The k listed author names most similar to `query`, best first, as [(name, papers)]:
+        accents, particles, name order, typos and partially typed names are tolerated.
+        """
+        with instrumentation.trace('author_suggestions', k=k):
+            suggestions = self.author_name_index().suggest(query, k)
+            instrumentation.count('rows_matched', len(suggestions))
+            return suggestions
+
+    def nearest_papers(self, row_id, k=10):
+        """
+        (row ids, distances) of the k papers nearest to paper `row_id` on the t-SNE map,
+        nearest first, the paper itself excluded.
+        """
+        with instrumentation.trace('nearest', k=k):
+            spatial_index = self.spatial_index()
+            x, y = spatial_index.x[row_id], spatial_index.y[row_id]
+            if not (np.isfinite(x) and np.isfinite(y)):
+                return np.empty(0, dtype=np.int32), np.empty(0)
+            with instrumentation.stage('lookup'):
+                rows, distances = spatial_index.nearest(x, y, k + 1)
+            keep = rows != row_id
+            rows, distances = rows[keep][:k], distances[keep][:k]
+            instrumentation.count('rows_matched', len(rows))
+            return rows, distances
+
+    def region_rows(self, shapes, within=None):
+        """
+        Row ids of the papers inside box and lasso selections on the t-SNE map, most central
+        first (by distance to the centre of the selected papers).
+
+        `shapes` are the `box` and `lasso` entries of a `st.plotly_chart` selection event
+        (dicts with data-space 'x' and 'y' lists); `within` limits the result to these row ids,
+        e.g. the selectable papers of a figure.
+        """
+        with instrumentation.trace('region', shapes=len(shapes)):
+            spatial_index = self.spatial_index()
+            with instrumentation.stage('lookup'):
+                parts = [spatial_index.within_rect(*shape['x'][:2], *shape['y'][:2]) if len(shape['x']) == 2
+                         else spatial_index.within_polygon(shape['x'], shape['y']) for shape in shapes]
+                rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+                if within is not None:
+                    rows = rows[np.isin(rows, within)]
+            x, y = spatial_index.x[rows], spatial_index.y[rows]
+            order = np.argsort(np.hypot(x - x.mean(), y - y.mean()), kind='stable') if len(rows) else []
+            instrumentation.count('rows_matched', len(rows))
+            return rows[order]
+
+    def cluster_figure(self, cluster_name, keywords, location, only_matches=False, viewport=None):
+        """
+        Embeddings Explorer figure: the papers of one research cluster (or ALL_CLUSTERS)
+        coloured by year and by the keyword groups they match.
+
+        Parameters:
+        - cluster_name: predicted_category to plot, or ALL_CLUSTERS
+        - keywords: List of keywords (can include OR relationships using | character)
+        - location: Where to search for keywords ('abstract' or 'title')
+        - only_matches: leave out papers that match no keyword group
+        - viewport: (x0, x1, y0, y1) region of the map to plot, None for the whole cluster
+        """
+        groups = split_keyword_groups(keywords)
+        viewport = _viewport_key(viewport)
+        key = ('explorer', cluster_name, location, bool(only_matches), _groups_key(groups), viewport)
+        with instrumentation.trace('explorer', cluster=cluster_name, location=location, groups=len(groups),
+                                   only_matches=bool(only_matches), zoomed=viewport is not None):
+            return self.cache.get_or_compute(
+                key, lambda: self._cluster_figure(cluster_name, groups, location, only_matches, viewport),
+                self.fingerprint)
+
+    def author_figure(self, author_name, show_other, viewport=None, exact=False):
+        """
+        Author Search figure highlighting the papers of `author_name` (see author_rows for
+        `exact`), optionally within a viewport.
+        """
+        viewport = _viewport_key(viewport)
+        query = ('name', fold_name(author_name)) if exact else parse_author_query(author_name)
+        key = ('author', query, bool(show_other), author_name.strip(), viewport)
+        with instrumentation.trace('author', show_other=bool(show_other), zoomed=viewport is not None):
+            return self.cache.get_or_compute(
+                key, lambda: self._author_figure(author_name, show_other, viewport, exact), self.fingerprint)
+
+    def trend_facet_figure(self, keywords, location, facet):
+        """Keyword Trend Analysis figure split into one panel per research cluster or journal; None without keywords."""
+        keywords = [k.strip() for k in keywords if k.strip()]
+        if not keywords:
+            return None
+
+        groups = split_keyword_groups(keywords)
+        key = ('trend_facets', location, facet, _groups_key(groups))
+        with instrumentation.trace('trends', location=location, groups=len(groups), facet=facet):
+            return self.cache.get_or_compute(key, lambda: self._trend_facet_figure(groups, location, facet),
+                                             self.fingerprint)
+
+    def ranked_figure(self, query, cluster_name=ALL_CLUSTERS, k=RANKED_RESULTS):
+        """t-SNE map of a research cluster with the papers of `ranked_search` highlighted by rank."""
+        key = ('ranked_figure', cluster_name, tuple(query_tokens(query)), k)
+        with instrumentation.trace('ranked_map', cluster=cluster_name, k=k):
+            return self.cache.get_or_compute(key, lambda: self._ranked_figure(query, cluster_name, k),
+                                             self.fingerprint)
+
+    def density_raster(self, cluster_name, viewport=None):
+        """
+        Density raster of the papers of a cluster (or ALL_CLUSTERS) on the t-SNE map, drawn as
+        the background of large maps. The whole-cluster raster is cached; a viewport raster
+        covers only the papers inside that region, at full resolution.
+        """
+        viewport = _viewport_key(viewport)
+        with instrumentation.trace('density', cluster=cluster_name, zoomed=viewport is not None):
+            if viewport is not None:
+                return self._density_raster(cluster_name, viewport)
+            return self.cache.get_or_compute(('density', cluster_name),
+                                             lambda: self._density_raster(cluster_name, None), self.fingerprint)
+
+    def overlap_figure(self, keywords, location):
+        """Keyword co-occurrence heatmap of the pairwise overlaps between keyword groups, None without keywords."""
+        bits = self.match_bits(keywords, location)
+        if not bits.names:
+            return None
+        with instrumentation.trace('overlap', location=location, groups=len(bits.names)):
+            with instrumentation.stage('overlap'):
+                overlap = bits.overlap()
+            with instrumentation.stage('figure'):
+                return overlap_figure(bits.names, overlap)
+
+    def cooccurrence_figure(self, keywords, location, groups):
+        """Per-year and per-cluster counts of the papers matching all keyword groups at `groups` (indexes)."""
+        bits = self.match_bits(keywords, location)
+        years, year_counts, clusters, cluster_counts = self.cooccurrence(bits, groups)
+        return cooccurrence_figure(' & '.join(bits.names[group] for group in groups),
+                                   years, year_counts, clusters, cluster_counts)
+
+    def trend_figure(self, keywords, location):
+        """
+        Keyword Trend Analysis figure: percentage of papers per year matching each keyword group.
+
+        Returns None when no keyword is given.
+        """
+        # Filter out empty keywords
+        keywords = [k.strip() for k in keywords if k.strip()]
+        if not keywords:
+            return None
+
+        groups = split_keyword_groups(keywords)
+        key = ('trends', location, _groups_key(groups))
+        with instrumentation.trace('trends', location=location, groups=len(groups)):
+            return self.cache.get_or_compute(key, lambda: self._trend_figure(groups, location), self.fingerprint)
+
+    def _cluster_figure(self, cluster_name, groups, location, only_matches, viewport, masks=None):
+        df = self.require('tsne_2D_x', 'tsne_2D_y', 'pub_year')
+        # Rows are stored grouped by cluster, so a cluster is a contiguous slice of every column
+        # (one slice per delta batch once batches are added); a viewport narrows it to row ids
+        rows = self._map_rows(cluster_name, viewport)
+        row_ids = np.arange(len(df))[rows]
+        instrumentation.count('rows_selected', len(row_ids))
+
+        # Keyword group of each paper as an index into group_names (-1 for 'No Keyword Match');
+        # with OR functionality answered from the token index, later groups win like before
+        group_names = list(dict.fromkeys(name for name, _ in groups))
+        group_codes = np.full(len(row_ids), -1, dtype=np.int16)
+        if masks is None:
+            masks = self.match_keyword_groups(location, [alternatives for _, alternatives in groups])
+        for (display_name, _), mask in zip(groups, masks):
+            group_codes[mask[rows]] = group_names.index(display_name)
+        instrumentation.count('rows_matched', np.count_nonzero(group_codes >= 0))
+
+        x = df['tsne_2D_x'].to_numpy()[rows]
+        y = df['tsne_2D_y'].to_numpy()[rows]
+        years = df['pub_year'].to_numpy()[rows]
+        # Too many unmatched papers to send as points: draw them as a density raster instead
+        background = None
+        if not only_matches and np.count_nonzero(group_codes < 0) > MAX_BACKGROUND_POINTS:
+            background = self.density_raster(cluster_name, viewport)
+        if only_matches or background is not None:
+            keep = group_codes >= 0
+            x, y, years, row_ids, group_codes = x[keep], y[keep], years[keep], row_ids[keep], group_codes[keep]
+
+        # WebGL figure built straight from the column arrays; points carry row ids only
+        with instrumentation.stage('figure'):
+            return explorer_figure(x, y, years, row_ids, group_codes, group_names, background, viewport)
+
+    def _author_figure(self, author_name, show_other, viewport, exact):
+        df = self.require('tsne_2D_x', 'tsne_2D_y')
+        row_ids = np.arange(len(df))[self._map_rows(ALL_CLUSTERS, viewport)]
+        highlight = np.zeros(len(df), dtype=bool)
+        highlight[self._author_rows(author_name, exact)] = True
+        highlight = highlight[row_ids]
+
+        background = None
+        if show_other and np.count_nonzero(~highlight) > MAX_BACKGROUND_POINTS:
+            background = self.density_raster(ALL_CLUSTERS, viewport)
+        if not show_other or background is not None:
+            row_ids, highlight = row_ids[highlight], highlight[highlight]
+
+        # Figure carries row ids only; details are looked up when a point is selected
+        with instrumentation.stage('figure'):
+            return author_figure(df['tsne_2D_x'].to_numpy()[row_ids], df['tsne_2D_y'].to_numpy()[row_ids], highlight,
+                                 row_ids, author_name, show_other, background, viewport)
+
+    def _density_raster(self, cluster_name, viewport):
+        df = self.require('tsne_2D_x', 'tsne_2D_y')
+        rows = self._map_rows(cluster_name, viewport)
+        with instrumentation.stage('raster'):
+            return density_raster(df['tsne_2D_x'].to_numpy()[rows], df['tsne_2D_y'].to_numpy()[rows], viewport)
+
+    def _map_rows(self, cluster_name, viewport):
+        # Rows of a cluster on the map; within a viewport, the sorted row ids inside it from the spatial grid
+        rows = self.cluster_rows(cluster_name)
+        if viewport is None:
+            return rows
+        with instrumentation.stage('viewport'):
+            return np.intersect1d(np.arange(len(self.df))[rows], self.spatial_index().within_rect(*viewport))
+
+    def _ranked_search(self, query, cluster_name, k):
+        ranked_index = self.ranked_index()
+        allowed = None
+        if cluster_name != ALL_CLUSTERS:
+            allowed = np.zeros(len(self.df), dtype=bool)
+            allowed[self.cluster_rows(cluster_name)] = True
+        with instrumentation.stage('top_k'):
+            rows, scores = ranked_index.search(query, k, allowed)
+        instrumentation.count('rows_matched', len(rows))
+        return rows, scores
+
+    def _ranked_figure(self, query, cluster_name, k):
+        df = self.require('tsne_2D_x', 'tsne_2D_y')
+        hits, _ = self.ranked_search(query, cluster_name, k)
+        others = np.arange(len(df))[self.cluster_rows(cluster_name)]
+        others = others[~np.isin(others, hits)]
+        background = None
+        if len(others) > MAX_BACKGROUND_POINTS:
+            background, others = self.density_raster(cluster_name), others[:0]
+        x, y = df['tsne_2D_x'].to_numpy(), df['tsne_2D_y'].to_numpy()
+        with instrumentation.stage('figure'):
+            return ranked_figure(x[others], y[others], x[hits], y[hits], hits, query, background)
+
+    def _match_bits(self, groups, location):
+        masks = self.match_keyword_groups(location, [alternatives for _, alternatives in groups])
+        with instrumentation.stage('pack'):
+            return MatchBits([display_name for display_name, _ in groups], masks)
+
+    def _author_rows(self, author_name, exact):
+        # Look up the author's papers in the prebuilt index (no scan, nothing written to the shared df)
+        author_index = self.author_name_index() if exact else self.author_index()
+        with instrumentation.stage('lookup'):
+            rows = author_index.lookup(author_name)
+        instrumentation.count('rows_matched', len(rows))
+        return rows
+
+    def _trend_figure(self, groups, location):
+        years, series = self._trend_series(groups, location)
+        with instrumentation.stage('figure'):
+            return trend_figure(years, series)
+
+    def _trend_series(self, groups, location):
+        instrumentation.count('rows_selected', len(self.df))
+        return self._year_series(groups, self._group_cell_counts(groups, location),
+                                 [self.trend_cells().totals] * len(groups))
+
+    def _year_series(self, groups, cell_counts, cell_totals):
+        # Each group's per-cell counts (from the trend cube) and paper totals summed per year,
+        # complete years only. The totals are every paper's, or for a partial result the
+        # papers verified so far.
+        keep_years = self.trend_years()
+        trend_cells = self.trend_cells()
+        series = [(display_name, percentages(trend_cells.by_year(counts), trend_cells.by_year(totals))[keep_years])
+                  for (display_name, _), counts, totals in zip(groups, cell_counts, cell_totals)]
+        return self.year_table().years[keep_years], series
+
+    def _trend_facets(self, groups, location, facet):
+        instrumentation.count('rows_selected', len(self.df))
+        return self._facet_series(groups, self._group_cell_counts(groups, location),
+                                  [self.trend_cells().totals] * len(groups), facet)
+
+    def _facet_series(self, groups, cell_counts, cell_totals, facet):
+        # Like _year_series, per (cluster or journal, year)
+        keep_years = self.trend_years()
+        trend_cells = self.trend_cells()
+        values = trend_cells.clusters if facet == 'cluster' else trend_cells.journals
+        counts = [trend_cells.by_facet(group_counts, facet)[:, keep_years] for group_counts in cell_counts]
+        totals = [trend_cells.by_facet(group_totals, facet)[:, keep_years] for group_totals in cell_totals]
+        if facet == 'cluster':
+            # Clusters in snapshot order
+            order = [values.index(name) for name in self.cluster_names() if name in values]
+        else:
+            matches = sum(counts).sum(axis=1) if counts else np.zeros(len(values))
+            order = [i for i in np.argsort(-matches, kind='stable')[:TOP_JOURNALS] if matches[i] > 0]
+        series = [(display_name, percentages(group_counts[order], group_totals[order]))
+                  for (display_name, _), group_counts, group_totals in zip(groups, counts, totals)]
+        return self.year_table().years[keep_years], [values[i] for i in order], series
+
+    def _trend_facet_figure(self, groups, location, facet):
+        years, values, series = self._trend_facets(groups, location, facet)
+        with instrumentation.stage('figure'):
+            return trend_facet_figure(years, values, series)
+
+    def _partial_trend_figure(self, groups, step, facet):
+        # Groups still being verified are counted over the rows scanned so far, as a share of those rows
+        trend_cells = self.trend_cells()
+        scanned_totals = trend_cells.counts(step.scanned)
+        cell_counts = [trend_cells.counts(mask if complete else mask & step.scanned)
+                       for mask, complete in zip(step.masks, step.complete)]
+        cell_totals = [trend_cells.totals if complete else scanned_totals for complete in step.complete]
+        if facet is None:
+            return trend_figure(*self._year_series(groups, cell_counts, cell_totals))
+        return trend_facet_figure(*self._facet_series(groups, cell_counts, cell_totals, facet))
+
+    def _progressive(self, key, groups, location, interval_s, partial_figure, final_figure):
+        # (done, figure) steps of a progressive query: partial figures from the match steps,
+        # skipped when the final figure is cached already, then the final figure
+        if self.cache.get(key, fingerprint=self.fingerprint) is None:
+            built = time.monotonic()
+            for step in self.match_keyword_groups_progressive(location, [alternatives for _, alternatives in groups]):
+                if step.done == 1:
+                    break
+                figure = None
+                if time.monotonic() - built >= interval_s:
+                    figure = partial_figure(step)
+                    built = time.monotonic()
+                yield step.done, figure
+        yield 1.0, final_figure()
+
+    def _group_cell_counts(self, groups, location):
+        # Papers matching each keyword group per trend cell. A group that is exactly one indexed
+        # token is read from the term cube; OR groups, substrings of several tokens and regexes
+        # (where summing token counts would count a paper twice) are counted from their match masks
+        text_index = self.text_index(location)
+        tokens = [text_index.exact_token(alternatives[0]) if len(alternatives) == 1 else None
+                  for _, alternatives in groups]
+        pending = [alternatives for (_, alternatives), token in zip(groups, tokens) if token is None]
+        masks = iter(self.match_keyword_groups(location, pending) if pending else [])
+        trend_cells = self.trend_cells()
+        term_cube = self.term_cube(location) if any(token is not None for token in tokens) else None
+
+        cell_counts = []
+        with instrumentation.stage('cube'):
+            for token in tokens:
+                cell_counts.append(term_cube.cell_counts(token) if token is not None else trend_cells.counts(next(masks)))
+                instrumentation.count('rows_matched', int(cell_counts[-1].sum()))
+        return cell_counts
+
+    def _extend_indexes(self, indexes, old_rows):
+        # Indexes built on the previous version, extended with the rows from old_rows on; the
+        # spatial grid, the BM25 index, the trend cube and the author name trigrams are rebuilt
+        # on first use instead, as their cell size, term statistics, cells and names depend on every paper
+        df = self.df
+        for key, index in list(indexes.items()):
+            if key in ('spatial', 'ranked', 'cells', 'author_names') or key[0] == 'cube':
+                continue
+            column = {'authors': 'authors', 'years': 'pub_year'}.get(key) or key[1]
+            with instrumentation.stage(f'extend_{column}'):
+                self._indexes[key] = index.extend(df[column].iloc[old_rows:])
+
+    def _index(self, key, operation, build, **fields):
+        # Built once per dataset; the lock keeps concurrent sessions from building it twice
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is None:
+                    with instrumentation.trace(operation, **fields):
+                        index = self._indexes[key] = build()
+        return index
+
+
+class LiveDataset:
+    """
+    The current version of a Dataset for a long-running process. `current()` checks the
+    snapshot store at most every `refresh_s` seconds and swaps in the refreshed Dataset;
+    queries already running keep the version they started on.
+    """
+
+    def __init__(self, dataset, refresh_s=DEFAULT_REFRESH_S):
+        self.dataset = dataset
+        self.refresh_s = refresh_s
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def current(self):
+        if time.monotonic() - self._checked >= self.refresh_s and self._lock.acquire(blocking=False):
+            # One caller refreshes; the others keep using the current version meanwhile
+            try:
+                self.dataset = self.dataset.refresh()
+            except Exception as e:
+                print(f"Keeping dataset version {self.dataset.fingerprint}; refresh failed: {e!r}", file=sys.stderr)
+            finally:
+                self._checked = time.monotonic()
+                self._lock.release()
+        return self.dataset
+
+
+def _open(paths, columns):
+    table = data_store.open_snapshots(paths)
+    df = data_store.to_frame(table if columns is None else table.select(list(columns)))
+    df.attrs['snapshot_paths'] = paths
+    return df, table
+
+
+def _viewport_key(viewport):
+    # Viewport bounds as a hashable cache key, rounded like the plotted coordinates
+    return None if viewport is None else tuple(round(float(bound), 3) for bound in viewport)
+
+
+def _groups_key(groups):
+    return tuple((display_name, canonical_group(alternatives)) for display_name, alternatives in groups)
@@ -1,14 +1,12 @@
 import sys
-print(f"Python version: {sys.version}")
-print(f"Python path: {sys.executable}")
 
 try:
     import streamlit as st
-    import pandas as pd
-    import plotly.express as px
-    from plotly.subplots import make_subplots
-    import plotly.graph_objects as go
-    import re
+    import instrumentation
+    from query_cache import QUERY_CACHE
+    import regex_pool
+    from regex_pool import QueryCancelled, QueryTimeout, ServerBusy
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
     #import smtplib
     #from email.mime.text import MIMEText
     #from email.mime.multipart import MIMEMultipart
@@ -16,398 +14,238 @@ except ImportError as e:
     print(f"Error importing required modules: {e}")
     sys.exit(1)
 
-# Load your dataframe
-@st.cache_data
-def load_data():
-    df = pd.read_excel('metabolomics_landscape_app_01MAR2024.xlsx')
-    return df
-
-df = load_data()
-
-def clusterByKeywords2(cluster_name, keywords, location, only_matches=False):
-    if cluster_name != 'All embeddings':
-        cluster_df = df[df['predicted_category'] == cluster_name]
-    else:
-        cluster_df = df
-
-    cluster_df['keyword_presence'] = 'No Keyword Match'
-
-    # Apply keyword filtering with OR functionality
-    for keyword_entry in keywords:
-        keyword_entry = keyword_entry.strip()
-        if not keyword_entry:
-            continue
-            
-        # Check if this is an OR group (contains | character)
-        if '|' in keyword_entry:
-            # Split into individual keywords for the OR relationship
-            or_keywords = [k.strip() for k in keyword_entry.split('|') if k.strip()]
-            display_name = f"{' | '.join(or_keywords)}"  # Use a readable name
-            
-            # Check if any of the OR keywords match
-            def matches_any_keyword(text):
-                if pd.isna(text):
-                    return False
-                # Check each keyword in the OR group
-                return any(bool(re.search(k, str(text), re.IGNORECASE)) for k in or_keywords)
-                
-            # Apply the OR matching function
-            matches_mask = cluster_df[location].apply(matches_any_keyword)
-            cluster_df.loc[matches_mask, 'keyword_presence'] = display_name
-        else:
-            # Original single keyword logic
-            cluster_df.loc[cluster_df[location].apply(lambda x: bool(re.search(keyword_entry, x, re.IGNORECASE))), 
-                          'keyword_presence'] = keyword_entry
-
-    if only_matches:
-        cluster_df = cluster_df[cluster_df['keyword_presence'] != 'No Keyword Match']
-
-    # Recalculate the min and max years from the filtered dataset
-    min_year = cluster_df['pub_year'].min()
-    max_year = cluster_df['pub_year'].max()
-
-    color_scale_time = [
-        (0, 'rgb(0, 0, 255)'),  # Blue for oldest
-        (0.5, 'rgb(255, 255, 0)'),  # Yellow for middle
-        (1, 'rgb(255, 0, 0)')   # Red for newest
-    ]
-
-    # Define a faint, transparent gray color for 'No Keyword Match'
-    no_match_color = 'rgba(200, 200, 200, 0.1)'  # Reduced opacity
-
-    # Modify the color assignment for 'None' keyword
-    cluster_df.loc[cluster_df['keyword_presence'] == 'None', 'keyword_presence'] = 'No Keyword Match'
-
-    # Create separate DataFrames for matched and unmatched entries
-    matched_df = cluster_df[cluster_df['keyword_presence'] != 'No Keyword Match']
-    unmatched_df = cluster_df[cluster_df['keyword_presence'] == 'No Keyword Match']
-
-    fig = make_subplots(
-        rows=2, cols=1, 
-        subplot_titles=("Colored by Year", "Colored by Keyword Presence"),
-        vertical_spacing=0.1
-    )
-
-    # Plot for Colored by Year
-    fig_time_matched = px.scatter(matched_df, x='tsne_2D_x', y='tsne_2D_y', color='pub_year',
-                                  color_continuous_scale=color_scale_time, opacity=1,
-                                  hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True, 'pub_year': True, 'authors': True},
-                                  range_color=[min_year, max_year])
-
-    fig_time_unmatched = px.scatter(unmatched_df, x='tsne_2D_x', y='tsne_2D_y',
-                                    color_discrete_sequence=[no_match_color],
-                                    opacity=0.3,
-                                    hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True})
-
-    # Customize hover text for matched entries in the time plot
-    fig_time_matched.update_traces(
-        hovertemplate="Title: %{customdata[0]}<br>Authors: %{customdata[2]}<br>Publication Year: %{customdata[1]}<extra></extra>"
-    )
-
-    # Customize hover text for unmatched entries in the time plot
-    fig_time_unmatched.update_traces(
-        hovertemplate="Title: %{customdata[0]}<extra></extra>"
-    )
-
-    for trace in fig_time_matched['data']:
-        trace.marker.size = 5  # Slightly larger default size=6
-        fig.add_trace(trace, row=1, col=1)
-
-    for trace in fig_time_unmatched['data']:
-        trace.marker.size = 3  # Smaller
-        trace.name = 'No Keyword Match'
-        fig.add_trace(trace, row=1, col=1)
-
-    # Plot for Colored by Keyword Presence
-    fig_keywords_matched = px.scatter(matched_df, 
-                                      x='tsne_2D_x', 
-                                      y='tsne_2D_y', 
-                                      color='keyword_presence',
-                                      color_discrete_sequence=px.colors.qualitative.Alphabet,
-                                      opacity=1,
-                                      hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True, 'keyword_presence': True, 'authors': True})
-
-    fig_keywords_unmatched = px.scatter(unmatched_df,
-                                        x='tsne_2D_x',
-                                        y='tsne_2D_y',
-                                        color_discrete_sequence=[no_match_color],
-                                        opacity=0.3,
-                                        hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True})
-
-    # Customize hover text for matched entries in the keyword plot
-    fig_keywords_matched.update_traces(
-        hovertemplate="Title: %{customdata[0]}<br>Authors: %{customdata[2]}<br>Keyword: %{customdata[1]}<extra></extra>"
-    )
-
-    # Customize hover text for unmatched entries in the keyword plot
-    fig_keywords_unmatched.update_traces(
-        hovertemplate="Title: %{customdata[0]}<extra></extra>"
-    )
-
-    for trace in fig_keywords_matched['data']:
-        trace.marker.size = 5  # Slightly larger default size=6
-        fig.add_trace(trace, row=2, col=1)
-
-    for trace in fig_keywords_unmatched['data']:
-        trace.marker.size = 3  # Smaller
-        trace.name = 'No Keyword Match'
-        fig.add_trace(trace, row=2, col=1)
-
-    fig.update_layout(
-        title="Embeddings Explorer",
-        plot_bgcolor='white',
-        height=700, width=1000,
-        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),
-        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
-        margin=dict(l=50, r=50, t=80, b=50),
-        coloraxis=dict(colorscale=color_scale_time, 
-                       colorbar=dict(title="Year", y=0.85, thickness=15, len=0.3),
-                       cmin=min_year, cmax=max_year),  # Set dynamic range for filtered subset
-        coloraxis2=dict(colorbar=dict(title="Keyword Presence", y=0.35, thickness=15, len=0.3)),
-    )
-
-    fig.update_xaxes(title='', showticklabels=False, showgrid=False, zeroline=False)
-    fig.update_yaxes(title='', showticklabels=False, showgrid=False, zeroline=False)
-
-    fig.update_xaxes(showline=True, linewidth=1, linecolor='lightgray', mirror=True)
-    fig.update_yaxes(showline=True, linewidth=1, linecolor='lightgray', mirror=True)
-
-    fig.update_annotations(font_size=18)
-
-    fig.update_layout(
-        legend=dict(
-            title=dict(text='Keywords'),
-            orientation="h",
-            yanchor="bottom",
-            y=-0.1,
-            xanchor="center",
-            x=0.5,
-            bgcolor="rgba(255,255,255,0.8)",
-            bordercolor="lightgray",
-            borderwidth=1
-        )
-    )
-
-    return fig
-
-
-def highlightAuthor(author_name, show_other):
-    # Split the author_name into parts based on whitespace
-    author_parts = author_name.split()
-    
-    # Determine last_name and first_initial based on the number of parts
-    if len(author_parts) > 1:
-        last_name = author_parts[-1].lower()  # Last part is the last name
-        first_initial = author_parts[0][0].lower()  # First character of first part is initial
-    else:
-        last_name = author_parts[0].lower()  # Only one part, assume it's the full name
-        first_initial = ''  # No first initial if only one part
-    
-    # Function to check if any author's last name and initial match the given criteria
-    def author_in_list(authors):
-        if not isinstance(authors, str):
-            return False
-        authors = authors.lower()
-        # Split authors into individual names and check each one
-        for author in authors.split(','):
-            author = author.strip()  # Remove any leading or trailing whitespace
-            author_parts = author.split()  # Split author name into parts
-            if len(author_parts) > 1:
-                author_last_name = author_parts[0].lower()  # First part is the last name
-                author_first_initial = author_parts[1][0].lower()  # First character of second part is initial
-                # Check if last_name and first_initial match
-                if last_name == author_last_name and (not first_initial or first_initial == author_first_initial):
-                    return True
-        return False
-
-    # Apply author_in_list function to create a new column 'highlight' in the DataFrame
-    df['highlight'] = df['authors'].apply(author_in_list)
-    
-    # Assign 'color' based on 'highlight' column (highlighted or not)
-    df['color'] = df['highlight'].apply(lambda x: author_name if x else 'other')
-
-    # Create a new figure
-    fig = go.Figure()
-
-    # If show_other is True, add scatter plot for non-highlighted points
-    if show_other:
-        other_df = df[~df['highlight']]  # DataFrame of non-highlighted points
-        fig.add_trace(go.Scattergl(  # Use Scattergl for better performance
-            x=other_df['tsne_2D_x'], 
-            y=other_df['tsne_2D_y'],
-            mode='markers',
-            marker=dict(color='rgba(160, 160, 160, 0.5)', size=3),  # Smaller size, no border
-            name='Other',
-            hoverinfo='none'  # No hover information for other points
-        ))
-
-    # Add scatter plot for highlighted points
-    highlight_df = df[df['highlight']]  # DataFrame of highlighted points
-    fig.add_trace(go.Scattergl(  # Use Scattergl for better performance
-        x=highlight_df['tsne_2D_x'], 
-        y=highlight_df['tsne_2D_y'],
-        mode='markers',
-        marker=dict(
-            color='rgb(0, 0, 225)',  # Blue
-            size=10,  # Keep original size
-            line=dict(width=2, color='rgb(0, 0, 100)')  # Keep original border
-        ),
-        name=author_name,
-        # Create hover text with title and journal information
-        text = highlight_df.apply(lambda row: f"Title: {row['title']}<br>Journal: {row['journal_title']}<br>Date of Publication: {row['pub_year']}", axis=1),
-        hoverinfo='text'
-    ))
-
-    # Update layout settings for the plot
-    fig.update_layout(
-        title=f"Papers by {author_name}",
-        plot_bgcolor='white',  # White background
-        height=600,  # Set plot height
-        width=1000,  # Set plot width
-        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),  # Title font settings
-        font=dict(size=14, family='Arial, sans-serif', color='#333333'),  # General font settings
-        margin=dict(l=50, r=50, t=80, b=50),  # Margins
-        showlegend=True,  # Show legend
-    )
-
-    # Remove axis labels, tick marks, and grid
-    fig.update_xaxes(title='', showticklabels=False, showgrid=False, zeroline=False)
-    fig.update_yaxes(title='', showticklabels=False, showgrid=False, zeroline=False)
-
-    # Add light gray border lines
-    fig.update_xaxes(showline=True, linewidth=1, linecolor='lightgray', mirror=True)
-    fig.update_yaxes(showline=True, linewidth=1, linecolor='lightgray', mirror=True)
-
-    return fig
-
-
-def analyze_keyword_trends(keywords, location):
+# The data, analysis and plotting modules (pandas, pyarrow, plotly) are imported by the pages
+# that use them, so the Home page renders without loading them or the dataset.
+
+# Load the dataset from the memory-mapped snapshot (converted from the workbook on first use).
+# cache_resource keeps one shared Dataset (frame and indexes) per process instead of unpickling a
+# copy for every run, so nothing below may write into it. Columns are converted on first use,
+# so each page pulls only the columns it needs.
+# Regex keywords are verified in a shared process pool with per-keyword time and CPU budgets
+# (MLA_REGEX_WORKERS=0 runs them in the script thread instead).
+# New delta batches in the store are swapped in every MLA_REFRESH_S seconds without a restart.
+@st.cache_resource
+def live_dataset():
+    import data_store
+    from analysis import Dataset, LiveDataset
+    return LiveDataset(Dataset.load(data_store.SOURCE_PATH, regex_workers=regex_pool.DEFAULT_WORKERS, columns=()))
+
+def load_dataset():
+    return live_dataset().current()
+
+def keyword_session():
+    # Tags regex pool tasks with this browser session, so a new query cancels its queued old ones
+    ctx = get_script_run_ctx()
+    return regex_pool.session(ctx.session_id if ctx is not None else None)
+
+def show_progress(steps):
+    # Draws the (done, figure) steps of a progressive query as a progress bar and the latest
+    # partial chart, then clears both and returns the final figure. Every update is a Streamlit
+    # interrupt point: when the user submits a new query, this run stops at the next step and
+    # the rest of the old scan is never started.
+    progress, chart = st.empty(), st.empty()
+    for done, fig in steps:
+        if done == 1:
+            progress.empty()
+            chart.empty()
+            return fig
+        progress.progress(done, text=f"Matching keywords: {done:.0%} of the candidate papers checked. "
+                                     "The chart shows the papers checked so far.")
+        if fig is not None:
+            chart.plotly_chart(fig, use_container_width=True)
+
+def clusterByKeywords2(cluster_name, keywords, location, only_matches=False, viewport=None, progressive=False):
+    # progressive: verify regex keywords in steps, showing partial maps meanwhile
+    with keyword_session():
+        dataset = load_dataset()
+        if progressive:
+            return show_progress(dataset.cluster_figure_progressive(cluster_name, keywords, location, only_matches,
+                                                                    viewport))
+        return dataset.cluster_figure(cluster_name, keywords, location, only_matches, viewport)
+
+
+def highlightAuthor(author_name, show_other, viewport=None, exact=False):
+    return load_dataset().author_figure(author_name, show_other, viewport, exact)
+
+def search_author(author_name, show_other, exact=False):
+    # Draws a new Author Search (zoom reset). A typed search becomes the query that name
+    # suggestions are made for; `exact` shows a suggested name's papers only
+    state = st.session_state.author_search_state
+    if not exact:
+        state['query'] = author_name
+        state['searches'] = state.get('searches', 0) + 1
+    state.update(author_name=author_name, show_other=show_other, exact=exact, search_clicked=True, viewport=None,
+                 current_fig=highlightAuthor(author_name, show_other, exact=exact))
+
+
+def analyze_keyword_trends(keywords, location, facet=None, progressive=False):
     """
     Analyze and visualize the frequency of keywords over time.
     
     Parameters:
     - keywords: List of keywords to track (can include OR relationships using | character)
     - location: Where to search for keywords ('abstract' or 'title')
+    - facet: None for the whole corpus, or 'cluster' / 'journal' for one panel per research cluster or journal
+    - progressive: scan the corpus in steps, showing partial trends and a progress bar meanwhile
     
     Returns:
     - Plotly figure showing keyword trends over time
     """
-    # Filter out empty keywords
-    keywords = [k.strip() for k in keywords if k.strip()]
-    
-    if not keywords:
+    with keyword_session():
+        if progressive:
+            return show_progress(load_dataset().trend_progressive(keywords, location, facet))
+        if facet is None:
+            return load_dataset().trend_figure(keywords, location)
+        return load_dataset().trend_facet_figure(keywords, location, facet)
+
+# Trend page facets: label -> Dataset.trend_facet_figure facet
+TREND_FACETS = {"Whole corpus": None, "Research cluster": 'cluster', "Journal": 'journal'}
+
+def keyword_cooccurrence(keywords, location):
+    """Pairwise overlap heatmap of the keyword groups and their match bitsets."""
+    with keyword_session():
+        dataset = load_dataset()
+        return dataset.overlap_figure(keywords, location), dataset.match_bits(keywords, location)
+
+# Paper details for points selected on a map, looked up server-side from their row ids
+DETAIL_COLUMNS = {'title': 'Title', 'authors': 'Authors', 'journal_title': 'Journal', 'pub_year': 'Year'}
+MAX_DETAIL_ROWS = 500
+
+NEAREST_PAPERS = 10
+
+def show_paper_details(row_ids, title="Selected papers", distances=None, matched=None):
+    if not len(row_ids):
+        return
+    st.subheader(f"{title} ({len(row_ids)})")
+    if len(row_ids) > MAX_DETAIL_ROWS:
+        st.caption(f"Showing the first {MAX_DETAIL_ROWS}")
+    import data_store
+    df = load_dataset().require(*DETAIL_COLUMNS)
+    details = df.take(row_ids[:MAX_DETAIL_ROWS])[list(DETAIL_COLUMNS)]
+    details['authors'] = data_store.authors_text(details['authors'])
+    details = details.rename(columns=DETAIL_COLUMNS)
+    if distances is not None:
+        details.insert(0, 'Distance', distances[:MAX_DETAIL_ROWS].round(2))
+    if matched is not None:
+        # Every keyword group a paper matched, where the map colours it by the last one only
+        details['Keywords'] = [', '.join(matched.names[group] for group in groups)
+                               for groups in matched.paper_groups(row_ids[:MAX_DETAIL_ROWS])]
+    st.dataframe(details, hide_index=True, use_container_width=True)
+
+def show_selection(event, fig, keywords=None):
+    # Box and lasso regions are answered from the spatial index, most central papers first;
+    # a single clicked paper also lists its nearest neighbours on the map. With the (keywords,
+    # location) of the map, the details list every keyword group each paper matched.
+    from figures import selectable_row_ids, selected_regions, selected_row_ids
+    regions = selected_regions(event)
+    row_ids = selected_row_ids(event)
+    matched = None
+    if keywords is not None and (regions or row_ids):
+        try:
+            with keyword_session():
+                matched = load_dataset().match_bits(*keywords)
+        except (ServerBusy, QueryTimeout, QueryCancelled):
+            pass
+    if regions:
+        show_paper_details(load_dataset().region_rows(regions, within=selectable_row_ids(fig)), matched=matched)
+        return
+    show_paper_details(row_ids, matched=matched)
+    if len(row_ids) == 1:
+        rows, distances = load_dataset().nearest_papers(row_ids[0], NEAREST_PAPERS)
+        show_paper_details(rows, "Nearest papers on the map", distances, matched)
+
+RESULTS_PER_PAGE = 10
+
+def show_ranked_search(query, cluster_name, page_name):
+    # Ranked results of the cluster as a paginated table next to the map that highlights them
+    dataset = load_dataset()
+    rows, scores = dataset.ranked_search(query, cluster_name)
+    if not len(rows):
+        st.info("No paper in this cluster contains a word of the query")
+        return
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        fig = dataset.ranked_figure(query, cluster_name)
+        event = render_chart(fig, page_name, key='ranked_chart', on_select="rerun", use_container_width=True)
+    with col2:
+        pages = -(-len(rows) // RESULTS_PER_PAGE)
+        page_number = st.number_input("Page", min_value=1, max_value=pages, value=1,
+                                      key=f'ranked_page:{cluster_name}:{query}') if pages > 1 else 1
+        start = (page_number - 1) * RESULTS_PER_PAGE
+        page_rows = rows[start:start + RESULTS_PER_PAGE]
+        results = dataset.require('title', 'pub_year').take(page_rows)[['title', 'pub_year']]
+        results = results.rename(columns={'title': 'Title', 'pub_year': 'Year'})
+        results.insert(0, 'Rank', range(start + 1, start + len(page_rows) + 1))
+        results.insert(1, 'Score', scores[start:start + RESULTS_PER_PAGE].round(2))
+        st.dataframe(results, hide_index=True, use_container_width=True)
+        st.caption(f"Results {start + 1}-{start + len(page_rows)} of {len(rows)}")
+    show_selection(event, fig)
+
+def zoom_controls(event, viewport, key):
+    # Plotly zooms only in the browser, on the points already sent; "Zoom to selection" rebuilds
+    # the map server-side with just the papers inside the selected region. Returns the viewport
+    # to show: the selection's bounds, None after a reset, or `viewport` unchanged.
+    from figures import selected_regions
+    regions = selected_regions(event)
+    col1, col2 = st.columns([1, 4])
+    if regions and col1.button("Zoom to selection", key=f'{key}_zoom'):
+        xs = [x for shape in regions for x in shape['x']]
+        ys = [y for shape in regions for y in shape['y']]
+        return (min(xs), max(xs), min(ys), max(ys))
+    if viewport is not None and col2.button("Reset zoom", key=f'{key}_reset'):
         return None
-    
-    # Get all unique years in the dataset, excluding 2024
-    all_years = sorted([year for year in df['pub_year'].unique() if year != 2024])
-    
-    # Calculate total papers per year (excluding 2024)
-    year_counts = df[df['pub_year'] != 2024]['pub_year'].value_counts().reindex(all_years, fill_value=0)
-    
-    # Create figure
-    fig = go.Figure()
-    
-    # Process each keyword or keyword group
-    for keyword_entry in keywords:
-        # Check if this is an OR group (contains | character)
-        if '|' in keyword_entry:
-            # Split into individual keywords for the OR relationship
-            or_keywords = [k.strip() for k in keyword_entry.split('|') if k.strip()]
-            display_name = f"{' | '.join(or_keywords)}"  # Use a readable name for the legend
-            
-            # Create regex patterns for each keyword in the OR group
-            patterns = [re.compile(k, re.IGNORECASE) for k in or_keywords]
-        else:
-            # Single keyword case (existing functionality)
-            display_name = keyword_entry
-            patterns = [re.compile(keyword_entry, re.IGNORECASE)]
-        
-        # Initialize a counts dictionary with zeros for all years
-        keyword_counts = {year: 0 for year in all_years}
-        
-        # Count papers containing the keyword(s) for each year
-        for year in all_years:
-            year_df = df[df['pub_year'] == year]
-            if not year_df.empty:
-                # Count papers matching ANY of the patterns in the OR group
-                def matches_any_pattern(text):
-                    if pd.isna(text):
-                        return False
-                    # Return True if any pattern matches
-                    return any(p.search(str(text)) for p in patterns)
-                
-                # Count matching papers
-                matches = year_df[location].apply(matches_any_pattern).sum()
-                
-                # Calculate percentage if there are papers this year
-                if year_counts[year] > 0:
-                    keyword_counts[year] = (matches / year_counts[year]) * 100
-        
-        # Create x and y lists ensuring all years are included
-        x_values = all_years
-        y_values = [keyword_counts[year] for year in all_years]
-        
-        # Add trace with explicit line connection
-        fig.add_trace(go.Scatter(
-            x=x_values,
-            y=y_values,
-            mode='lines+markers',
-            name=display_name,
-            line=dict(
-                shape='linear',  # Linear interpolation between points
-                dash='solid',    # Solid line
-                width=2          # Line width
-            ),
-            marker=dict(
-                size=8,          # Larger markers to highlight data points
-                symbol='circle'  # Circle markers
-            ),
-            connectgaps=True,    # Important: Connect gaps across zero/null values
-            hovertemplate='Year: %{x}<br>Percentage: %{y:.2f}%<extra></extra>'
-        ))
-    
-    # Update layout
-    fig.update_layout(
-        title="Keyword Trends Over Time",
-        xaxis_title="Year",
-        yaxis_title="Percentage of Papers (%)",
-        plot_bgcolor='white',
-        height=500,  # Increase height to accommodate legend
-        width=900,
-        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),
-        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
-        margin=dict(l=50, r=50, t=80, b=50),
-        legend=dict(
-            title=dict(text='Keywords'),
-            orientation="h",     # Horizontal orientation
-            yanchor="bottom",   # Anchor point at bottom
-            y=-0.5,            # Move legend down further (more negative value = lower position)
-            xanchor="center",   # Center horizontally
-            x=0.5,             # Center position
-            bgcolor="rgba(255,255,255,0.8)",
-            bordercolor="lightgray",
-            borderwidth=1
-        )
-    )
-    
-    # Show fewer x-axis labels and reduce grid line thickness
-    selected_years = all_years[::4]  # For example, every 5th year
-    fig.update_xaxes(
-        type='category',
-        tickmode='array',
-        tickvals=selected_years,
-        ticktext=[str(year) for year in selected_years],
-        showgrid=True,
-        gridwidth=0.1,  # Thinner grid lines
-        gridcolor='lightgray'
-    )
-    fig.update_yaxes(
-        showgrid=True,
-        gridwidth=0.1,  # Thinner grid lines
-        gridcolor='lightgray'
-    )
-    
-    return fig
+    return viewport
+
+EXPORT_FORMATS = {"CSV": 'csv', "Parquet": 'parquet'}
+
+def export_controls(key, file_name, export):
+    # Download of the papers behind a map: `export(columns, fmt)` encodes the chosen columns in
+    # chunks straight from the mapped snapshot; the chunks are gathered only when asked for,
+    # up to the export size budget (MLA_EXPORT_MAX_MB)
+    from export import DEFAULT_EXPORT_COLUMNS, EXPORT_COLUMNS, MEDIA_TYPES, ExportTooLarge, collect
+    with st.expander("Export papers"):
+        columns = st.multiselect("Columns", list(EXPORT_COLUMNS), default=list(DEFAULT_EXPORT_COLUMNS),
+                                 format_func=EXPORT_COLUMNS.get, key=f'{key}_export_columns')
+        fmt = EXPORT_FORMATS[st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key=f'{key}_export_format')]
+        if st.button("Prepare download", key=f'{key}_export'):
+            try:
+                with keyword_session():
+                    data = collect(export(columns, fmt))
+            except (ExportTooLarge, ServerBusy, QueryTimeout) as e:
+                st.error(str(e))
+                return
+            except QueryCancelled:
+                st.stop()
+            st.download_button(f"Download {file_name}.{fmt}", data, file_name=f'{file_name}.{fmt}',
+                               mime=MEDIA_TYPES[fmt], key=f'{key}_download')
+
+def trend_downloads(keywords, location, facet):
+    # The series behind the trend chart, small enough to encode in every format up front
+    from export import MEDIA_TYPES, collect
+    dataset = load_dataset()
+    for col, (label, fmt) in zip(st.columns([1, 1, 4]), EXPORT_FORMATS.items()):
+        col.download_button(f"Download {label}", collect(dataset.trend_export(keywords, location, fmt, facet)),
+                            file_name=f'keyword_trends.{fmt}', mime=MEDIA_TYPES[fmt], key=f'trend_download_{fmt}')
+
+def render_chart(fig, page_name, **kwargs):
+    # Times the st.plotly_chart call (serialization included); the payload size costs another
+    # serialization, so it is only measured when the panel or the timing log is on
+    with instrumentation.trace('render', page=page_name):
+        if show_perf_panel or instrumentation.PERF_LOG_PATH:
+            instrumentation.record(payload_bytes=instrumentation.payload_bytes(fig))
+        with instrumentation.stage('plotly_chart'):
+            return st.plotly_chart(fig, **kwargs)
+
+def show_perf_panel_contents():
+    import pandas as pd
+    traces = instrumentation.recent_traces()
+    st.sidebar.subheader("Performance")
+    st.sidebar.caption("Latency per operation in this process (ms)")
+    st.sidebar.dataframe(pd.DataFrame.from_dict(instrumentation.latency_summary(traces), orient='index').round(1))
+    st.sidebar.caption("Latest traces")
+    st.sidebar.dataframe(pd.json_normalize(traces[::-1][:20]), hide_index=True)
+    st.sidebar.caption("Query cache")
+    st.sidebar.json(QUERY_CACHE.stats())
 
 st.title("A _Map_ of :blue[_Metabolomics_] Research 📄")
 st.write("**_Aditya Simhadri_** and [**_Olatomiwa O. Bifarin_**](https://www.linkedin.com/in/obifarin/), [Fernández Lab](https://sites.gatech.edu/fernandez/), Georgia Tech")
@@ -415,9 +253,12 @@ st.write("**_Aditya Simhadri_** and [**_Olatomiwa O. Bifarin_**](https://www.lin
 # Create a navigation menu with more options
 page = st.sidebar.selectbox(
     "Choose a page", 
-    ["Home", "Embeddings Explorer", "Keyword Trend Analysis", "Author Search"]
+    ["Home", "Embeddings Explorer", "Keyword Trend Analysis", "Keyword Co-occurrence", "Author Search"]
 )
 
+# Opt-in debug panel with per-stage timings, row counts, payload sizes and cache statistics
+show_perf_panel = st.sidebar.checkbox("Show performance panel", value=False)
+
 if page == "Home":
     st.subheader("About the Study")
     st.write("""
@@ -439,6 +280,7 @@ if page == "Home":
     #st.video("https://www.youtube.com/watch?v=eHrCx2LhdCk")
 
 elif page == "Embeddings Explorer":
+    from analysis import ALL_CLUSTERS
     st.header("Embeddings :blue[_Explorer_] 🌐")
     with st.expander("How to use"):
         st.write("""
@@ -461,9 +303,18 @@ elif page == "Embeddings Explorer":
         - **Top plot**: Papers colored by publication year (blue → yellow → red from oldest to newest)
         - **Bottom plot**: Papers colored by keyword matches
         
-        **Note**: If a paper matches multiple keywords, it will be colored according to the last matching keyword in your list.
+        **Note**: If a paper matches multiple keywords, it will be colored according to the last matching keyword in your list;
+        the details of selected papers list every keyword they match, and the Keyword Co-occurrence page shows how keywords overlap.
+        
+        Click a point, or use box/lasso select, to list the details of the selected papers below the plot.
+        While a slow keyword search runs, a progress bar and a provisional map (papers not checked yet shown
+        without a match) are displayed. "Export papers" downloads the matching papers of the cluster, with the keywords
+        each one matches, as CSV or Parquet.
         
-        Hover over any point to see details about the corresponding paper.
+        **Ranked Search** lists the papers of the selected cluster that best match a free-text query (BM25 relevance
+        over titles and abstracts, title words weighted higher), page by page, next to a map highlighting them by rank.
+        "Zoom to selection" redraws the map with only the papers inside the selected region; on large
+        maps the papers without a match are shown as a gray density background until you zoom in.
         """)
     
     # Parameters section - moved from sidebar to main page
@@ -474,7 +325,7 @@ elif page == "Embeddings Explorer":
     
     with col1:
         cluster_name = st.selectbox("Select Research Cluster", 
-                                   options=["All embeddings"] + list(df['predicted_category'].unique()))
+                                   options=[ALL_CLUSTERS] + load_dataset().cluster_names())
         location = st.selectbox("Select Location to Search Keywords", 
                                options=["abstract", "title"])
     
@@ -482,14 +333,49 @@ elif page == "Embeddings Explorer":
         keywords = st.text_input("Enter Keywords (comma-separated)").split(',')
         only_matches = st.checkbox("Show only papers with keyword matches", value=False)
     
-    # Generate plot button
+    # Generate plot button; the figure is kept in session state so selections survive reruns
     if st.button("Generate Plot", type="primary"):
         if keywords and location:
-            fig = clusterByKeywords2(cluster_name, keywords, location, only_matches)
-            st.plotly_chart(fig)
+            try:
+                st.session_state.explorer_fig = clusterByKeywords2(cluster_name, keywords, location, only_matches,
+                                                                   progressive=True)
+                st.session_state.explorer_query = (cluster_name, keywords, location, only_matches)
+                st.session_state.explorer_viewport = None
+            except (ServerBusy, QueryTimeout) as e:
+                st.error(str(e))
+            except QueryCancelled:
+                st.stop()
         else:
             st.error("Please provide all inputs")
 
+    if st.session_state.get('explorer_fig') is not None:
+        event = render_chart(st.session_state.explorer_fig, page, key='explorer_chart', on_select="rerun")
+        viewport = zoom_controls(event, st.session_state.explorer_viewport, 'explorer')
+        if viewport != st.session_state.explorer_viewport:
+            try:
+                st.session_state.explorer_fig = clusterByKeywords2(*st.session_state.explorer_query, viewport=viewport)
+                st.session_state.explorer_viewport = viewport
+                st.rerun()
+            except (ServerBusy, QueryTimeout) as e:
+                st.error(str(e))
+            except QueryCancelled:
+                st.stop()
+        explorer_cluster, explorer_keywords, explorer_location, _ = st.session_state.explorer_query
+        show_selection(event, st.session_state.explorer_fig, (explorer_keywords, explorer_location))
+        export_controls('explorer', 'keyword_matches', lambda columns, fmt: load_dataset().keyword_export(
+            explorer_cluster, explorer_keywords, explorer_location, columns, fmt))
+
+    # Ranked search: the most relevant papers of the selected cluster, not just which ones match
+    st.subheader("Ranked Search")
+    ranked_query = st.text_input("Search titles and abstracts (results ranked by relevance)")
+    if st.button("Search Papers"):
+        if ranked_query.strip():
+            st.session_state.ranked_query = ranked_query
+        else:
+            st.error("Please enter a search query")
+    if st.session_state.get('ranked_query'):
+        show_ranked_search(st.session_state.ranked_query, cluster_name, page)
+
 elif page == "Keyword Trend Analysis":
     # Keyword Trend Analysis page
     st.header("Keyword :blue[_Trend Analysis_] 📈")
@@ -514,18 +400,80 @@ elif page == "Keyword Trend Analysis":
         - Compare interest in different concepts over time
         
         Hover over any point on the graph to see the exact percentage for that year.
+        
+        Regular expressions that need many abstracts checked show a progress bar and a provisional chart, computed
+        from the papers checked so far, until the search completes. Changing the inputs stops the running search.
+        The buttons below the chart download the plotted percentages as CSV or Parquet.
+        
+        Use "Split Trends By" to draw one panel per research cluster, or per journal (the journals with the most
+        matches), where each percentage is relative to that cluster's or journal's papers of the year.
         """)
     
     trend_keywords = st.text_input("Enter Keywords for Trend Analysis (comma-separated, use | for OR logic)").split(',')
     trend_location = st.selectbox("Select Location for Trend Analysis", options=["abstract", "title"])
+    trend_facet = st.selectbox("Split Trends By", options=list(TREND_FACETS))
     
     if st.button("Generate Trend Analysis"):
         if trend_keywords and any(k.strip() for k in trend_keywords):
-            trend_fig = analyze_keyword_trends(trend_keywords, trend_location)
-            st.plotly_chart(trend_fig)
+            try:
+                trend_fig = analyze_keyword_trends(trend_keywords, trend_location, TREND_FACETS[trend_facet],
+                                                   progressive=True)
+                render_chart(trend_fig, page)
+                trend_downloads(trend_keywords, trend_location, TREND_FACETS[trend_facet])
+            except (ServerBusy, QueryTimeout) as e:
+                st.error(str(e))
+            except QueryCancelled:
+                st.stop()
         else:
             st.error("Please enter at least one keyword for trend analysis")
 
+elif page == "Keyword Co-occurrence":
+    st.header("Keyword :blue[_Co-occurrence_] 🔗")
+    with st.expander("How to use"):
+        st.write("""
+        This tool shows how often keywords appear together in the same papers.
+        
+        **How to use:**
+        1. Enter two or more keywords of interest, separated by commas
+        2. Use the pipe symbol (|) between keywords for OR logic: "metabolite|metabolites" will match papers with either term
+        3. Select whether to search in paper abstracts or titles
+        4. Click "Analyze Co-occurrence" to create the visualization
+        
+        The heatmap shows, for every pair of keywords, how many papers match both (hover for the count); the
+        colour is the share of the rarer keyword's papers that also match the other one, and the diagonal is the
+        number of papers matching each keyword. Pick a pair below the heatmap to see the papers matching both
+        per year and per research cluster.
+        """)
+
+    cooccurrence_keywords = st.text_input("Enter Keywords for Co-occurrence (comma-separated, use | for OR logic)").split(',')
+    cooccurrence_location = st.selectbox("Select Location for Co-occurrence", options=["abstract", "title"])
+
+    # The query is kept in session state so choosing a pair below the heatmap keeps it
+    if st.button("Analyze Co-occurrence"):
+        if any(k.strip() for k in cooccurrence_keywords):
+            st.session_state.cooccurrence_query = (cooccurrence_keywords, cooccurrence_location)
+        else:
+            st.error("Please enter at least one keyword")
+
+    if st.session_state.get('cooccurrence_query') is not None:
+        try:
+            overlap_fig, bits = keyword_cooccurrence(*st.session_state.cooccurrence_query)
+        except (ServerBusy, QueryTimeout) as e:
+            st.error(str(e))
+            st.stop()
+        except QueryCancelled:
+            st.stop()
+        render_chart(overlap_fig, page)
+        st.caption(f"{int((bits.match_counts() >= 2).sum())} papers match two or more keywords")
+
+        col1, col2 = st.columns(2)
+        groups = range(len(bits.names))
+        first = col1.selectbox("First keyword", groups, format_func=bits.names.__getitem__)
+        second = col2.selectbox("Second keyword", groups, index=min(1, len(bits.names) - 1),
+                                format_func=bits.names.__getitem__)
+        render_chart(load_dataset().cooccurrence_figure(*st.session_state.cooccurrence_query, sorted({first, second})),
+                     page)
+
 elif page == "Author Search":
     # Author Search page
     st.header("Search by :blue[_Author_] 🧑‍🔬")
@@ -538,9 +486,14 @@ elif page == "Author Search":
         2. Optionally check "Show Other Embeddings" to display papers by other authors in gray
         3. Click "Search" to generate the visualization
          
-        The visualization displays papers authored by the specified researcher as larger blue dots, with hover information 
-        showing the paper's title, journal, and publication year. The search algorithm matches the author's last name and 
-        first initial against the author lists in our database.
+        The visualization displays papers authored by the specified researcher as larger blue dots. Click a dot, or use 
+        box/lasso select, to list the selected papers' titles, journals, and publication years below the plot. The search 
+        algorithm matches the author's last name and first initial against the author lists in our database, ignoring
+        accents and keeping particles such as "van der" with the last name.
+        
+        After a search, "Matching author names" lists the names in the database closest to what you typed, even when it
+        is incomplete, misspelled or in a different order, with their number of papers. Pick one to show only the papers
+        listing exactly that name. "Export papers" downloads the author's papers as CSV or Parquet.
         
         You can also try one of the pre-defined notable researchers in metabolomics by clicking their name buttons below the search field.
         """)
@@ -551,13 +504,17 @@ elif page == "Author Search":
             'author_name': "",
             'show_other': False,
             'search_clicked': False,
-            'current_fig': None
+            'current_fig': None,
+            'viewport': None,
+            'query': "",
+            'exact': False,
+            'searches': 0
         }
     
     # Create form to prevent auto-rerun on every input change
     with st.form(key='author_search_form'):
         author_input = st.text_input("Enter First and Last Name", 
-                                    value=st.session_state.author_search_state['author_name'])
+                                    value=st.session_state.author_search_state.get('query', ''))
         show_other = st.checkbox("Show Other Embeddings", 
                                 value=st.session_state.author_search_state['show_other'])
         
@@ -578,39 +535,50 @@ elif page == "Author Search":
     
     # Handle form submission
     if search_button:
-        if author_input:
-            st.session_state.author_search_state['author_name'] = author_input
-            st.session_state.author_search_state['show_other'] = show_other
-            st.session_state.author_search_state['search_clicked'] = True
-            fig = highlightAuthor(author_input, show_other)
-            st.session_state.author_search_state['current_fig'] = fig
+        if author_input.strip():
+            search_author(author_input, show_other)
         else:
             st.error("Please enter an author name")
     
     elif nicholson_button:
-        st.session_state.author_search_state['author_name'] = "Jeremy Nicholson"
-        st.session_state.author_search_state['show_other'] = show_other
-        st.session_state.author_search_state['search_clicked'] = True
-        fig = highlightAuthor("Jeremy Nicholson", show_other)
-        st.session_state.author_search_state['current_fig'] = fig
+        search_author("Jeremy Nicholson", show_other)
         
     elif fiehn_button:
-        st.session_state.author_search_state['author_name'] = "Oliver Fiehn"
-        st.session_state.author_search_state['show_other'] = show_other
-        st.session_state.author_search_state['search_clicked'] = True
-        fig = highlightAuthor("Oliver Fiehn", show_other)
-        st.session_state.author_search_state['current_fig'] = fig
+        search_author("Oliver Fiehn", show_other)
         
     elif fernie_button:
-        st.session_state.author_search_state['author_name'] = "Alisdair Fernie"
-        st.session_state.author_search_state['show_other'] = show_other
-        st.session_state.author_search_state['search_clicked'] = True
-        fig = highlightAuthor("Alisdair Fernie", show_other)
-        st.session_state.author_search_state['current_fig'] = fig
+        search_author("Alisdair Fernie", show_other)
+    
+    # Ranked fuzzy suggestions for the typed search, from the author name index; picking one
+    # redraws the map with that name's papers. The key resets the pick on every new search.
+    state = st.session_state.author_search_state
+    if state['search_clicked'] and state.get('query'):
+        dataset = load_dataset()
+        suggestions = dataset.author_suggestions(state['query'])
+        if not state.get('exact') and not len(dataset.author_rows(state['query'])):
+            st.info(f"No papers found for \"{state['query']}\"" +
+                    (". Pick one of the matching author names below." if suggestions else "."))
+        if suggestions:
+            labels = {name: f"{name} ({papers} papers)" for name, papers in suggestions}
+            picked = st.selectbox("Matching author names", list(labels), index=None, format_func=labels.get,
+                                  placeholder="Pick a name to show only its papers",
+                                  key=f"author_suggestion:{state.get('searches', 0)}")
+            if picked is not None and (picked != state['author_name'] or not state.get('exact')):
+                search_author(picked, state['show_other'], exact=True)
     
-    # Display the current figure if it exists
+    # Display the current figure if it exists, with details of any selected papers
     if st.session_state.author_search_state['search_clicked'] and st.session_state.author_search_state['current_fig'] is not None:
-        st.plotly_chart(st.session_state.author_search_state['current_fig'])
+        state = st.session_state.author_search_state
+        event = render_chart(state['current_fig'], page, key='author_chart', on_select="rerun")
+        viewport = zoom_controls(event, state.get('viewport'), 'author')
+        if viewport != state.get('viewport'):
+            state['current_fig'] = highlightAuthor(state['author_name'], state['show_other'], viewport,
+                                                   state.get('exact', False))
+            state['viewport'] = viewport
+            st.rerun()
+        show_selection(event, state['current_fig'])
+        export_controls('author', 'author_papers', lambda columns, fmt: load_dataset().author_export(
+            state['author_name'], columns, fmt, state.get('exact', False)))
 
 # Add the "Share Your Findings" section to all pages except Home
 if page != "Home":
@@ -626,11 +594,5 @@ if page != "Home":
     #     else:
     #         st.error("Please enter your findings before submitting")
 
-
-
-
-
-
-
-
-
+if show_perf_panel:
+    show_perf_panel_contents()
@@ -0,0 +1,221 @@
+"""
+Author index for the Author Search page.
+
+The snapshot stores each paper's authors as ids into one interned list of names
+("Fiehn Oliver", "Kind Tobias"; see data_store.apply_schema). Each distinct name is parsed
+once as last name followed by given names, and the index maps the normalized
+(last_name, first_initial) pair and the last name alone to the sorted row ids of the papers
+listing that author. A search is then a dictionary lookup instead of a scan of every paper.
+Names are folded first (Unicode-normalized, diacritics removed, lowercase), and particles
+such as "van der" stay part of the last name.
+
+AuthorNameIndex serves the fuzzy name suggestions of Author Search: each distinct folded
+name is split into character trigrams, a query is shortlisted by the trigrams it shares
+with each name, and the shortlist is ranked by string similarity, so partially typed names,
+typos and either name order still find the author.
+"""
+import difflib
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import data_store
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+# Lowercase words that begin a multi-word last name ("van der Berg", "de la Cruz")
+NAME_PARTICLES = frozenset({'da', 'das', 'de', 'del', 'della', 'der', 'des', 'di', 'do', 'dos', 'du',
+                            'la', 'le', 'ten', 'ter', 'van', 'von', 'zu'})
+
+# Names ranked by string similarity after the trigram shortlist
+_SHORTLIST = 50
+
+
+def fold_name(name):
+    """Lowercase `name` without diacritics and with single spaces: "Müller  Anna" -> "muller anna"."""
+    decomposed = unicodedata.normalize('NFKD', name)
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+
+def split_listed_name(folded):
+    """
+    Split a folded name as listed in the data, last name first ("van der berg maria"), into
+    ('van der berg', ['maria']). Leading particles join the last name when a given name follows.
+    """
+    words = folded.split()
+    i = 0
+    while i < len(words) - 2 and words[i] in NAME_PARTICLES:
+        i += 1
+    return ' '.join(words[:i + 1]), words[i + 1:]
+
+
+def parse_author_query(author_name):
+    """
+    Split a search like "Oliver Fiehn" into ('fiehn', 'o').
+
+    The last word, with any particles before it ("Maria van der Berg"), is the last name and
+    the first character of the first word is the initial; a single word is a last name with
+    no initial. Both are folded like fold_name; a name that folds to nothing (only spaces or
+    combining marks) gives ('', ''), which matches no paper.
+    """
+    author_parts = fold_name(author_name).split()
+    if not author_parts:
+        return '', ''
+    if len(author_parts) > 1:
+        j = len(author_parts) - 1
+        while j > 1 and author_parts[j - 1] in NAME_PARTICLES:
+            j -= 1
+        return ' '.join(author_parts[j:]), author_parts[0][0]
+    return author_parts[0], ''
+
+
+class AuthorIndex:
+    """(last_name, first_initial) and last_name -> sorted row ids of the papers by that author."""
+
+    def __init__(self, authors):
+        """`authors`: the interned authors column, or plain comma-separated author strings."""
+        authors = pd.Series(authors).reset_index(drop=True)
+        if not isinstance(authors.dtype, pd.ArrowDtype):
+            authors = pd.Series(pd.arrays.ArrowExtensionArray(data_store._intern_authors(authors)))
+        self.size = len(authors)
+
+        offsets, name_ids, names = data_store.author_lists(authors)
+        # Parse each distinct name once, then spread the parts over the papers listing it
+        parts = [split_listed_name(fold_name(name)) for name in names]
+        # Names without a given name carry no initial and were never matched; skip them
+        parsed = np.array([len(given) > 0 for _, given in parts], dtype=bool)
+        last_names = np.array([last_name for last_name, _ in parts], dtype=object)
+        first_initials = np.array([given[0][0] if given else '' for _, given in parts], dtype=object)
+
+        entry_rows = np.repeat(np.arange(self.size, dtype=np.int32), np.diff(offsets))
+        keep = parsed[name_ids]
+        entry_rows, entry_names = entry_rows[keep], name_ids[keep]
+        names = pd.DataFrame({
+            'last_name': last_names[entry_names],
+            'first_initial': first_initials[entry_names],
+            'row': entry_rows,
+        }).drop_duplicates()
+        names = names.sort_values(['last_name', 'first_initial', 'row'], ignore_index=True)
+        rows = names['row'].to_numpy(np.int32)
+
+        self.by_name = {key: rows[positions]
+                        for key, positions in names.groupby(['last_name', 'first_initial'], sort=False).indices.items()}
+        self.by_last_name = {key: np.unique(rows[positions])
+                             for key, positions in names.groupby('last_name', sort=False).indices.items()}
+
+    def extend(self, authors):
+        """
+        A new index over these rows followed by `authors` (a delta batch). Only the new rows'
+        names are parsed; their rows are appended to the existing lists. This index is unchanged.
+        """
+        delta = AuthorIndex(authors)
+        extended = object.__new__(AuthorIndex)
+        extended.size = self.size + delta.size
+        extended.by_name = _append_rows(self.by_name, delta.by_name, self.size)
+        extended.by_last_name = _append_rows(self.by_last_name, delta.by_last_name, self.size)
+        return extended
+
+    def lookup(self, author_name):
+        """Sorted row ids of the papers matching an author search string."""
+        last_name, first_initial = parse_author_query(author_name)
+        if first_initial:
+            return self.by_name.get((last_name, first_initial), _EMPTY)
+        return self.by_last_name.get(last_name, _EMPTY)
+
+
+class AuthorNameIndex:
+    """Trigram index over the distinct folded author names, with the sorted row ids of each name's papers."""
+
+    def __init__(self, authors):
+        """`authors`: the interned authors column, or plain comma-separated author strings."""
+        authors = pd.Series(authors).reset_index(drop=True)
+        if not isinstance(authors.dtype, pd.ArrowDtype):
+            authors = pd.Series(pd.arrays.ArrowExtensionArray(data_store._intern_authors(authors)))
+        self.size = len(authors)
+
+        offsets, name_ids, names = data_store.author_lists(authors)
+        # Spellings that fold to the same key ("Müller Anna", "Muller Anna") are one name,
+        # shown as its most frequent spelling
+        key_of_name, keys = pd.factorize(pd.Series([fold_name(name) for name in names], dtype=object))
+        self.keys = list(keys)
+        self.key_ids = {key: i for i, key in enumerate(self.keys)}
+        spellings = np.bincount(name_ids, minlength=len(names))
+        order = np.lexsort((-spellings, key_of_name))
+        first = np.unique(key_of_name[order], return_index=True)[1]
+        self.names = list(names[order[first]])
+
+        entry_rows = np.repeat(np.arange(self.size, dtype=np.int64), np.diff(offsets))
+        pairs = np.unique(key_of_name[name_ids].astype(np.int64) * max(self.size, 1) + entry_rows)
+        self.rows = (pairs % max(self.size, 1)).astype(np.int32)
+        self.indptr = np.searchsorted(pairs // max(self.size, 1), np.arange(len(self.keys) + 1))
+        self.papers = np.diff(self.indptr)
+
+        # Trigram -> ids of the names containing it (CSR: `gram_indptr` into `gram_names`)
+        gram_ids, gram_keys = {}, []
+        self.gram_counts = np.zeros(len(self.keys), dtype=np.int32)
+        for i, key in enumerate(self.keys):
+            grams = _trigrams(key)
+            self.gram_counts[i] = len(grams)
+            gram_keys += [gram_ids.setdefault(gram, len(gram_ids)) * len(self.keys) + i for gram in grams]
+        gram_keys = np.sort(np.asarray(gram_keys, dtype=np.int64))
+        self.gram_ids = gram_ids
+        self.gram_names = (gram_keys % max(len(self.keys), 1)).astype(np.int32)
+        self.gram_indptr = np.searchsorted(gram_keys // max(len(self.keys), 1), np.arange(len(gram_ids) + 1))
+
+    def suggest(self, query, k):
+        """
+        The k listed names most similar to `query`, best first, as [(name, papers)].
+
+        Names sharing the most trigrams with the query are shortlisted, then ranked by how
+        closely the query matches the name (in either name order) or its beginning, for
+        partially typed names; ties go to the name with more papers.
+        """
+        folded = fold_name(query)
+        grams = [self.gram_ids[gram] for gram in _trigrams(folded) if gram in self.gram_ids]
+        if len(folded) < 2 or not grams:
+            return []
+        hits = np.concatenate([self.gram_names[self.gram_indptr[g]:self.gram_indptr[g + 1]] for g in grams])
+        shared = np.bincount(hits, minlength=len(self.keys))
+        candidates = np.flatnonzero(shared)
+        dice = 2 * shared[candidates] / (len(_trigrams(folded)) + self.gram_counts[candidates])
+        if len(candidates) > _SHORTLIST:
+            top = np.argpartition(-dice, _SHORTLIST)[:_SHORTLIST]
+            candidates, dice = candidates[top], dice[top]
+        shortlist = candidates[np.lexsort((-self.papers[candidates], -dice))]
+
+        scores = [_similarity(folded, self.keys[i]) for i in shortlist]
+        best = sorted(range(len(shortlist)), key=lambda j: (-scores[j], -self.papers[shortlist[j]]))[:k]
+        return [(self.names[shortlist[j]], int(self.papers[shortlist[j]])) for j in best]
+
+    def lookup(self, name):
+        """Sorted row ids of the papers listing `name` (as listed, e.g. a suggestion; compared folded)."""
+        i = self.key_ids.get(fold_name(name))
+        if i is None:
+            return _EMPTY
+        return self.rows[self.indptr[i]:self.indptr[i + 1]]
+
+
+def _trigrams(folded):
+    # Distinct trigrams of each word, padded so word starts weigh more ("  f", " fi", "fie", ...)
+    return {padded[i:i + 3] for word in folded.split() for padded in [f'  {word} '] for i in range(len(padded) - 2)}
+
+
+def _similarity(folded_query, key):
+    # Best difflib ratio of the query against the name in listed order ("fiehn oliver") and
+    # given-names-first order ("oliver fiehn"), in full or cut to the query's length
+    last_name, given = split_listed_name(key)
+    score = 0.0
+    for form in {key, ' '.join(given + [last_name])}:
+        for target in {form, form[:len(folded_query)]}:
+            score = max(score, difflib.SequenceMatcher(None, folded_query, target).ratio())
+    return score
+
+
+def _append_rows(postings, delta_postings, offset):
+    # Delta rows follow every existing row, so appending keeps each list sorted
+    merged = dict(postings)
+    for key, rows in delta_postings.items():
+        rows = rows + np.int32(offset)
+        merged[key] = np.concatenate([merged[key], rows]) if key in merged else rows
+    return merged
@@ -0,0 +1,226 @@
+"""
+Batch mode for bulk keyword-trend and author queries.
+
+Reads one query per line (blank lines and lines starting with # are skipped) and writes the
+results to CSV or Parquet, chosen by the output file extension:
+
+- trends: each line is a keyword query in the app's syntax (groups separated by commas,
+  alternatives within a group by |); writes one row per query, keyword group and year with
+  the matching papers, the year's papers and the percentage the Trend page plots.
+- authors: each line is an author name as typed into Author Search; writes one row per
+  author and matching paper with its title, journal and year.
+
+Queries are evaluated in batches against one loaded Dataset: the keyword groups of a batch
+are deduplicated and matched together, so all their regex keywords share one chunked scan in
+the regex worker pool, and each batch is written as soon as it completes. A throughput
+report is printed at the end.
+
+Usage:
+    python batch.py trends queries.txt trends.csv --location abstract
+    python batch.py authors authors.txt hits.parquet
+"""
+import argparse
+import re
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet
+
+import data_store
+import instrumentation
+import regex_pool
+import trends
+from analysis import Dataset
+from query_cache import canonical_group
+from regex_pool import QueryTimeout, ServerBusy
+from text_index import split_keyword_groups
+
+DEFAULT_BATCH_SIZE = 64
+
+TREND_SCHEMA = pa.schema([
+    ('query_id', pa.int32()),
+    ('query', pa.string()),
+    ('group', pa.string()),
+    ('year', pa.int16()),
+    ('matches', pa.int32()),
+    ('papers', pa.int32()),
+    ('percentage', pa.float64()),
+])
+
+AUTHOR_SCHEMA = pa.schema([
+    ('query_id', pa.int32()),
+    ('author', pa.string()),
+    ('row', pa.int32()),
+    ('title', pa.string()),
+    ('journal_title', pa.string()),
+    ('pub_year', pa.int16()),
+])
+
+
+class ResultWriter:
+    """Appends record batches to a CSV or Parquet file, one write per completed query batch."""
+
+    def __init__(self, path, schema):
+        self.schema = schema
+        self.rows = 0
+        if path.endswith('.parquet'):
+            self._writer = pa.parquet.ParquetWriter(path, schema)
+        elif path.endswith('.csv'):
+            self._writer = pa.csv.CSVWriter(path, schema)
+        else:
+            raise ValueError(f"Output must be a .csv or .parquet file: {path}")
+
+    def write(self, columns):
+        table = pa.table(columns, schema=self.schema)
+        if table.num_rows:
+            self._writer.write_table(table)
+            self.rows += table.num_rows
+
+    def close(self):
+        self._writer.close()
+
+
+def read_queries(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def run_trends(dataset, queries, location, writer, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Evaluate keyword-trend queries in batches; returns the ids of queries that failed."""
+    year_table = dataset.year_table()
+    keep = dataset.trend_years()
+    years, totals = year_table.years[keep], year_table.totals[keep]
+    failed = []
+
+    for start in range(0, len(queries), batch_size):
+        batch = [(query_id, split_keyword_groups(queries[query_id].split(',')))
+                 for query_id in range(start, min(start + batch_size, len(queries)))]
+        with instrumentation.trace('batch_trends', location=location, queries=len(batch)):
+            # Distinct groups of the whole batch, matched in one pass
+            distinct = {}
+            for _, groups in batch:
+                for _, alternatives in groups:
+                    distinct.setdefault(canonical_group(alternatives), alternatives)
+            counts = _group_counts(dataset, location, distinct, year_table, keep)
+
+            columns = {name: [] for name in TREND_SCHEMA.names}
+            for query_id, groups in batch:
+                if any(canonical_group(alternatives) not in counts for _, alternatives in groups):
+                    failed.append(query_id)
+                    continue
+                for display_name, alternatives in groups:
+                    matches = counts[canonical_group(alternatives)]
+                    percentages = trends.percentages(matches, totals)
+                    columns['query_id'].extend([query_id] * len(years))
+                    columns['query'].extend([queries[query_id]] * len(years))
+                    columns['group'].extend([display_name] * len(years))
+                    columns['year'].extend(years.tolist())
+                    columns['matches'].extend(matches.tolist())
+                    columns['papers'].extend(totals.tolist())
+                    columns['percentage'].extend(percentages.tolist())
+            with instrumentation.stage('write'):
+                writer.write(columns)
+        if progress:
+            progress(min(start + batch_size, len(queries)))
+    return failed
+
+
+def run_authors(dataset, queries, writer, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Evaluate author queries in batches; returns the ids of queries without hits."""
+    author_index = dataset.author_index()
+    df = dataset.df
+    missing = []
+
+    for start in range(0, len(queries), batch_size):
+        query_ids = range(start, min(start + batch_size, len(queries)))
+        with instrumentation.trace('batch_authors', queries=len(query_ids)):
+            with instrumentation.stage('lookup'):
+                hits = [author_index.lookup(queries[query_id]) for query_id in query_ids]
+            missing.extend(query_id for query_id, rows in zip(query_ids, hits) if not len(rows))
+            rows = np.concatenate(hits).astype(np.int32) if hits else np.empty(0, dtype=np.int32)
+            instrumentation.count('rows_matched', len(rows))
+
+            # Paper details for all hits of the batch in one take per column
+            papers = df.take(rows)
+            with instrumentation.stage('write'):
+                writer.write({
+                    'query_id': np.repeat(np.asarray(query_ids, dtype=np.int32), [len(h) for h in hits]),
+                    'author': np.repeat(np.asarray([queries[i] for i in query_ids], dtype=object),
+                                        [len(h) for h in hits]),
+                    'row': rows,
+                    'title': _string_array(papers['title']),
+                    'journal_title': _string_array(papers['journal_title']),
+                    'pub_year': papers['pub_year'].to_numpy(),
+                })
+        if progress:
+            progress(query_ids.stop)
+    return missing
+
+
+def _group_counts(dataset, location, distinct, year_table, keep):
+    # Per-year match counts of each distinct group; a bad pattern fails only its own query
+    keys = list(distinct)
+    try:
+        masks = dataset.match_keyword_groups(location, [distinct[key] for key in keys])
+    except (re.error, QueryTimeout):
+        masks = []
+        for key in keys:
+            try:
+                masks.extend(dataset.match_keyword_groups(location, [distinct[key]]))
+            except (re.error, QueryTimeout) as e:
+                print(f"Skipping keyword group {' | '.join(distinct[key])!r}: {e}", file=sys.stderr)
+                masks.append(None)
+    return {key: year_table.counts(mask)[keep] for key, mask in zip(keys, masks) if mask is not None}
+
+
+def _string_array(values):
+    return pa.array(values, from_pandas=True).cast(pa.string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run keyword-trend or author queries in bulk")
+    parser.add_argument('mode', choices=['trends', 'authors'])
+    parser.add_argument('queries', help="Text file with one query per line")
+    parser.add_argument('output', help="Result file, .csv or .parquet")
+    parser.add_argument('--location', choices=['abstract', 'title'], default='abstract',
+                        help="Text searched by keyword-trend queries")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Queries evaluated per pass")
+    parser.add_argument('--source', default=data_store.SOURCE_PATH)
+    parser.add_argument('--store-dir', default=data_store.STORE_DIR)
+    parser.add_argument('--regex-workers', type=int, default=regex_pool.DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    queries = read_queries(args.queries)
+    start = time.perf_counter()
+    dataset = Dataset.load(args.source, args.store_dir, regex_workers=args.regex_workers)
+    load_s = time.perf_counter() - start
+
+    def progress(done):
+        elapsed = time.perf_counter() - start - load_s
+        print(f"\r{done}/{len(queries)} queries, {done / max(elapsed, 1e-9):.1f}/s", end='', file=sys.stderr)
+
+    writer = ResultWriter(args.output, TREND_SCHEMA if args.mode == 'trends' else AUTHOR_SCHEMA)
+    try:
+        if args.mode == 'trends':
+            skipped = run_trends(dataset, queries, args.location, writer, args.batch_size, progress)
+            note = f"{len(skipped)} failed"
+        else:
+            skipped = run_authors(dataset, queries, writer, args.batch_size, progress)
+            note = f"{len(skipped)} without hits"
+    except ServerBusy as e:
+        sys.exit(f"\n{e}")
+    finally:
+        writer.close()
+
+    query_s = time.perf_counter() - start - load_s
+    print(file=sys.stderr)
+    print(f"{len(queries)} {args.mode} queries ({note}) -> {writer.rows} rows in {args.output}")
+    print(f"load {load_s:.2f} s, queries {query_s:.2f} s: {len(queries) / max(query_s, 1e-9):.1f} queries/s, "
+          f"{len(dataset.df) * len(queries) / max(query_s, 1e-9):,.0f} paper-queries/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare Embeddings Explorer figure builders: the original plotly.express + subplot copy
+against figures.explorer_figure. Reports build time and JSON payload size.
+
+Usage: python -m benchmarks.bench_explorer_figure --rows 10000 100000
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from plotly.subplots import make_subplots
+
+from benchmarks.synthetic import make_corpus
+from figures import COLOR_SCALE_TIME, NO_MATCH_COLOR, explorer_figure
+
+KEYWORD_GROUPS = ['breast', 'Faecalibacterium', 'lipidomics | LC-MS', 'deep']
+
+
+def legacy_explorer_figure(cluster_df):
+    """The figure assembly clusterByKeywords2 used before the Scattergl builder."""
+    min_year = cluster_df['pub_year'].min()
+    max_year = cluster_df['pub_year'].max()
+    matched_df = cluster_df[cluster_df['keyword_presence'] != 'No Keyword Match']
+    unmatched_df = cluster_df[cluster_df['keyword_presence'] == 'No Keyword Match']
+
+    fig = make_subplots(rows=2, cols=1, subplot_titles=("Colored by Year", "Colored by Keyword Presence"),
+                        vertical_spacing=0.1)
+    panels = [
+        (px.scatter(matched_df, x='tsne_2D_x', y='tsne_2D_y', color='pub_year',
+                    color_continuous_scale=COLOR_SCALE_TIME, opacity=1,
+                    hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True, 'pub_year': True, 'authors': True},
+                    range_color=[min_year, max_year]), 5, 1),
+        (px.scatter(unmatched_df, x='tsne_2D_x', y='tsne_2D_y', color_discrete_sequence=[NO_MATCH_COLOR], opacity=0.3,
+                    hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True}), 3, 1),
+        (px.scatter(matched_df, x='tsne_2D_x', y='tsne_2D_y', color='keyword_presence',
+                    color_discrete_sequence=px.colors.qualitative.Alphabet, opacity=1,
+                    hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True, 'keyword_presence': True, 'authors': True}), 5, 2),
+        (px.scatter(unmatched_df, x='tsne_2D_x', y='tsne_2D_y', color_discrete_sequence=[NO_MATCH_COLOR], opacity=0.3,
+                    hover_data={'tsne_2D_x': False, 'tsne_2D_y': False, 'title': True}), 3, 2),
+    ]
+    for panel, size, row in panels:
+        for trace in panel['data']:
+            trace.marker.size = size
+            fig.add_trace(trace, row=row, col=1)
+    fig.update_layout(title="Embeddings Explorer", plot_bgcolor='white', height=700, width=1000,
+                      coloraxis=dict(colorscale=COLOR_SCALE_TIME, cmin=min_year, cmax=max_year))
+    return fig
+
+
+def assign_keywords(df):
+    presence = np.full(len(df), 'No Keyword Match', dtype=object)
+    for group in KEYWORD_GROUPS:
+        pattern = '|'.join(k.strip() for k in group.split('|'))
+        presence[df['abstract'].str.contains(pattern, case=False, regex=True).to_numpy()] = group
+    return presence
+
+
+def measure(build, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fig = build()
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    payload = len(fig.to_json())
+    return statistics.median(timings), payload, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'builder':>8} {'build s':>9} {'to_json s':>10} {'payload MB':>11}")
+    for n_rows in args.rows:
+        df = make_corpus(n_rows, abstract_words=60)
+        df['keyword_presence'] = assign_keywords(df)
+        group_names = list(dict.fromkeys(KEYWORD_GROUPS))
+        codes = pd.Categorical(df['keyword_presence'], categories=group_names).codes
+
+        builders = {
+            'legacy': lambda: legacy_explorer_figure(df),
+            'webgl': lambda: explorer_figure(df['tsne_2D_x'].to_numpy(), df['tsne_2D_y'].to_numpy(),
+                                             df['pub_year'].to_numpy(), np.arange(len(df)), codes, group_names),
+        }
+        for name, build in builders.items():
+            build_s, payload, json_s = measure(build, args.repeats)
+            print(f"{n_rows:>8} {name:>8} {build_s:>9.3f} {json_s:>10.3f} {payload / 1e6:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
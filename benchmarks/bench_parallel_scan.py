@@ -0,0 +1,62 @@
+"""
+Measure regex scan throughput of regex_pool.RegexPool against the number of worker processes.
+
+A synthetic corpus is written as an Arrow snapshot to a temporary directory; each pool size
+then scans every abstract for a set of regex keywords the token index cannot narrow down,
+in one chunked pass. Reports median scan time, rows per second and speedup over one worker.
+
+Usage: python -m benchmarks.bench_parallel_scan --rows 100000 --workers 1 2 4 8 16
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+
+import data_store
+from benchmarks.synthetic import make_corpus
+from regex_pool import RegexPool
+
+KEYWORDS = [r'metabol\w+s', r'deep.*learning', r'\b(LC|GC)-MS\b', r'[0-9]+\s*ppm', r'(breast|colon)\s+cancer']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    table = data_store.apply_schema(make_corpus(args.rows))
+    every_row = np.arange(args.rows, dtype=np.int32)
+    keyword_rows = {keyword: every_row for keyword in KEYWORDS}
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        path = os.path.join(store_dir, 'synthetic.arrow')
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        print(f"{args.rows} rows, {len(KEYWORDS)} keywords, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'scan s':>8} {'rows/s':>12} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            pool = RegexPool(path, workers=workers, max_pending=1, timeout_s=3600)
+            # Untimed first pass starts the worker processes
+            pool.scan('abstract', keyword_rows)
+            timings = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                pool.scan('abstract', keyword_rows)
+                timings.append(time.perf_counter() - start)
+            pool.shutdown()
+
+            scan_s = statistics.median(timings)
+            baseline = baseline or scan_s
+            print(f"{workers:>8} {scan_s:>8.2f} {args.rows / scan_s:>12,.0f} {baseline / scan_s:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
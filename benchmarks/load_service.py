@@ -0,0 +1,92 @@
+"""
+Load-test the query service (service.py) with a mixed workload of concurrent requests.
+
+Keeps `--concurrency` requests in flight until `--requests` have completed, drawing each from
+a mix of /match, /trends and /authors queries (common and rare keywords, OR groups, regexes,
+preset authors). Reports throughput, latency percentiles per endpoint and errors by status.
+
+Usage:
+    python service.py --port 8000 &
+    python -m benchmarks.load_service --url http://127.0.0.1:8000 --concurrency 16 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+# (endpoint, body); weights follow how often the app pages are used
+MIX = [
+    (6, '/match', {'keywords': ['metabolomics'], 'location': 'abstract'}),
+    (4, '/match', {'keywords': ['breast cancer', 'colon', 'Faecalibacterium'], 'location': 'abstract'}),
+    (3, '/match', {'keywords': ['NMR|TOCSY', 'LC-MS|GC-MS|mass spectrometry'], 'location': 'abstract'}),
+    (2, '/match', {'keywords': [r'metabol\w+s', 'deep.*learning'], 'location': 'abstract', 'format': 'mask'}),
+    (2, '/match', {'keywords': ['lipidomics', 'plasma|serum'], 'location': 'title'}),
+    (4, '/trends', {'keywords': ['lipidomics', 'NMR', 'microbiome'], 'location': 'abstract'}),
+    (2, '/trends', {'keywords': ['Mass spectrometry|MS|LC-MS', 'deep learning|neural networks'], 'location': 'abstract'}),
+    (4, '/authors', {'author': 'Oliver Fiehn'}),
+    (2, '/authors', {'author': 'Jeremy Nicholson', 'details': True}),
+    (2, '/authors', {'author': 'Fernie'}),
+]
+
+
+async def run_load(url, concurrency, n_requests, seed=0, timeout_s=60):
+    client = AsyncHTTPClient(max_clients=concurrency)
+    rng = random.Random(seed)
+    weights = [w for w, _, _ in MIX]
+    plan = rng.choices([(endpoint, body) for _, endpoint, body in MIX], weights=weights, k=n_requests)
+    latencies = defaultdict(list)
+    statuses = Counter()
+    queue = iter(plan)
+
+    async def worker():
+        for endpoint, body in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.fetch(url + endpoint, method='POST', body=json.dumps(body),
+                                              headers={'Content-Type': 'application/json'},
+                                              request_timeout=timeout_s)
+                status = response.code
+            except HTTPClientError as e:
+                status = e.code
+            except OSError:
+                status = 'connection error'
+            latencies[endpoint].append((time.perf_counter() - start) * 1000)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed, latencies, statuses
+
+
+def report(elapsed, latencies, statuses):
+    total = sum(statuses.values())
+    print(f"{total} requests in {elapsed:.2f} s: {total / elapsed:.1f} req/s")
+    print(f"{'endpoint':<10} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    every = [ms for values in latencies.values() for ms in values]
+    for endpoint, values in sorted(latencies.items()) + [('all', every)]:
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(f"{endpoint:<10} {len(values):>6} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {max(values):>9.1f}")
+    print("status: " + ', '.join(f"{status} x{n}" for status, n in sorted(statuses.items(), key=str)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+
+    report(*asyncio.run(run_load(args.url.rstrip('/'), args.concurrency, args.requests, args.seed, args.timeout)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Benchmark the Explorer, Trend and Author analyses on synthetic corpora of growing size.
+
+Each corpus goes through the same compact schema as the snapshot and is wrapped in an
+analysis.Dataset with a private query cache. Index builds are measured once per corpus;
+every workload is then timed cold (cache cleared before each repeat) and warm (repeated
+query answered from the cache), with peak traced memory of one cold run and the JSON
+payload of its figure. Results are written as JSON so runs can be compared, and
+`--baseline` fails the run when a workload regresses past the thresholds.
+
+Usage:
+    python -m benchmarks.suite --rows 10000 100000 --output results.json
+    python -m benchmarks.suite --rows 10000 100000 --baseline results.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+
+import data_store
+from analysis import ALL_CLUSTERS, Dataset
+from benchmarks.synthetic import CLUSTERS, make_corpus
+from query_cache import QueryCache
+
+# (name, analysis, arguments); keyword sets mix common and rare terms, OR groups and regexes
+WORKLOADS = [
+    ('explorer_keyword', 'explorer', (ALL_CLUSTERS, ['metabolomics'], 'abstract')),
+    ('explorer_multi', 'explorer', (ALL_CLUSTERS, ['breast cancer', 'colon', 'Faecalibacterium'], 'abstract')),
+    ('explorer_or_groups', 'explorer', (ALL_CLUSTERS, ['NMR|TOCSY', 'LC-MS|GC-MS|mass spectrometry'], 'abstract')),
+    ('explorer_regex', 'explorer', (ALL_CLUSTERS, [r'metabol\w+s', 'deep.*learning'], 'abstract')),
+    ('explorer_cluster_only_matches', 'explorer', (CLUSTERS[0], ['cancer', 'biomarker|biomarkers'], 'abstract', True)),
+    ('explorer_title', 'explorer', (ALL_CLUSTERS, ['lipidomics', 'plasma|serum'], 'title')),
+    ('trends_keywords', 'trends', (['lipidomics', 'NMR', 'microbiome'], 'abstract')),
+    ('trends_or_groups', 'trends', (['Mass spectrometry|MS|LC-MS', 'NMR|TOCSY', 'deep learning|neural networks'], 'abstract')),
+    ('author_full_name', 'author', ('Oliver Fiehn', False)),
+    ('author_with_others', 'author', ('Jeremy Nicholson', True)),
+    ('author_last_name', 'author', ('Fernie', False)),
+]
+
+# A workload regresses when it is slower / larger by more than these ratios and an absolute floor
+DEFAULT_THRESHOLDS = {'latency': 1.25, 'memory': 1.25, 'payload': 1.10, 'min_latency_delta_ms': 5.0}
+
+
+def build_dataset(n_rows, seed=0, abstract_words=180):
+    """Synthetic corpus in the snapshot's compact schema, with a private query cache."""
+    table = data_store.apply_schema(make_corpus(n_rows, seed=seed, abstract_words=abstract_words))
+    return Dataset(data_store.to_frame(table), cache=QueryCache())
+
+
+def run_analysis(dataset, analysis, args):
+    if analysis == 'explorer':
+        return dataset.cluster_figure(*args)
+    if analysis == 'trends':
+        return dataset.trend_figure(*args)
+    return dataset.author_figure(*args)
+
+
+def measure_setup(dataset):
+    """Index build times and the traced peak of building them, in one pass."""
+    timings = {}
+    tracemalloc.start()
+    for name, build in [('text_index_abstract', lambda: dataset.text_index('abstract')),
+                        ('text_index_title', lambda: dataset.text_index('title')),
+                        ('author_index', dataset.author_index),
+                        ('year_table', dataset.year_table)]:
+        start = time.perf_counter()
+        build()
+        timings[name] = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def measure_workload(dataset, analysis, args, repeats):
+    cold = []
+    for _ in range(repeats):
+        dataset.cache.clear()
+        start = time.perf_counter()
+        fig = run_analysis(dataset, analysis, args)
+        cold.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    run_analysis(dataset, analysis, args)
+    warm = (time.perf_counter() - start) * 1000
+
+    # Memory is traced in a separate cold run; tracing slows allocation-heavy code down
+    dataset.cache.clear()
+    tracemalloc.start()
+    run_analysis(dataset, analysis, args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'cold_ms': statistics.median(cold),
+        'warm_ms': warm,
+        'peak_mb': peak / 2**20,
+        'payload_bytes': len(fig.to_json()),
+    }
+
+
+def run_suite(row_counts, repeats=3, seed=0, abstract_words=180, workloads=None):
+    results = []
+    selected = [w for w in WORKLOADS if workloads is None or w[0] in workloads]
+    for n_rows in row_counts:
+        start = time.perf_counter()
+        dataset = build_dataset(n_rows, seed, abstract_words)
+        generate_ms = (time.perf_counter() - start) * 1000
+        setup, setup_peak = measure_setup(dataset)
+        results.append({'rows': n_rows, 'workload': 'setup', 'analysis': 'setup',
+                        'cold_ms': sum(setup.values()), 'peak_mb': setup_peak / 2**20,
+                        'generate_ms': generate_ms, **{f'{name}_ms': ms for name, ms in setup.items()}})
+        print(f"{n_rows:>9} {'setup':<30} {sum(setup.values()):>10.1f} ms  peak {setup_peak / 2**20:8.1f} MB",
+              flush=True)
+
+        for name, analysis, args in selected:
+            measured = measure_workload(dataset, analysis, args, repeats)
+            results.append({'rows': n_rows, 'workload': name, 'analysis': analysis, **measured})
+            print(f"{n_rows:>9} {name:<30} {measured['cold_ms']:>10.1f} ms  peak {measured['peak_mb']:8.1f} MB"
+                  f"  warm {measured['warm_ms']:7.2f} ms  payload {measured['payload_bytes'] / 1e6:7.2f} MB",
+                  flush=True)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+    }
+
+
+def compare(results, baseline, thresholds=DEFAULT_THRESHOLDS):
+    """Return a list of human-readable regressions of `results` against `baseline`."""
+    previous = {(r['rows'], r['workload']): r for r in baseline}
+    regressions = []
+    for current in results:
+        before = previous.get((current['rows'], current['workload']))
+        if before is None:
+            continue
+        label = f"{current['workload']} @ {current['rows']} rows"
+        delta_ms = current['cold_ms'] - before['cold_ms']
+        if current['cold_ms'] > before['cold_ms'] * thresholds['latency'] and delta_ms > thresholds['min_latency_delta_ms']:
+            regressions.append(f"{label}: latency {before['cold_ms']:.1f} -> {current['cold_ms']:.1f} ms")
+        if current['peak_mb'] > max(before['peak_mb'], 1.0) * thresholds['memory']:
+            regressions.append(f"{label}: peak memory {before['peak_mb']:.1f} -> {current['peak_mb']:.1f} MB")
+        if 'payload_bytes' in current and current['payload_bytes'] > before['payload_bytes'] * thresholds['payload']:
+            regressions.append(f"{label}: payload {before['payload_bytes']} -> {current['payload_bytes']} bytes")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help="Corpus sizes in papers")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--abstract-words', type=int, default=180)
+    parser.add_argument('--workloads', nargs='+', choices=[w[0] for w in WORKLOADS])
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Fail if results regress against this results file")
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_THRESHOLDS['latency'])
+    parser.add_argument('--max-memory-growth', type=float, default=DEFAULT_THRESHOLDS['memory'])
+    parser.add_argument('--max-payload-growth', type=float, default=DEFAULT_THRESHOLDS['payload'])
+    parser.add_argument('--min-latency-delta-ms', type=float, default=DEFAULT_THRESHOLDS['min_latency_delta_ms'])
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'workload':<30} {'cold':>13}", flush=True)
+    results = run_suite(args.rows, args.repeats, args.seed, args.abstract_words, args.workloads)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(),
+                       'config': {'repeats': args.repeats, 'seed': args.seed, 'abstract_words': args.abstract_words},
+                       'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        thresholds = {'latency': args.max_slowdown, 'memory': args.max_memory_growth,
+                      'payload': args.max_payload_growth, 'min_latency_delta_ms': args.min_latency_delta_ms}
+        regressions = compare(results, baseline, thresholds)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == '__main__':
+    main()
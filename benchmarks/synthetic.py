@@ -0,0 +1,82 @@
+"""
+Synthetic corpora with the schema of the app dataset, for benchmarks.
+
+Abstracts and titles draw words from a Zipf-weighted vocabulary mixed with common
+metabolomics terms, papers sit in Gaussian blobs per research cluster, and author lists
+draw from a pool of names so prolific authors appear on many papers.
+"""
+import numpy as np
+import pandas as pd
+
+DOMAIN_TERMS = [
+    'metabolomics', 'metabolite', 'metabolites', 'lipidomics', 'NMR', 'MS', 'mass', 'spectrometry',
+    'LC-MS', 'GC-MS', 'TOCSY', 'breast', 'colon', 'cancer', 'deep', 'learning', 'neural', 'networks',
+    'Faecalibacterium', 'microbiome', 'plasma', 'serum', 'urine', 'biomarker', 'biomarkers', 'pathway',
+    'untargeted', 'targeted', 'profiling', 'plant', 'diabetes', 'obesity', 'isotope', 'flux',
+]
+CLUSTERS = [
+    'Cancer Metabolomics', 'Plant Metabolomics', 'NMR Spectroscopy', 'Gut Microbiome',
+    'Lipidomics', 'Mass Spectrometry Methods', 'Clinical Biomarkers', 'Metabolic Flux',
+    'Toxicology', 'Nutrition', 'Machine Learning', 'Food Science',
+]
+_SYLLABLES = ['ba', 'co', 'di', 'fe', 'ga', 'hi', 'ko', 'lu', 'mi', 'no', 'pa', 'ri', 'sa', 'to', 'vu', 'ze']
+
+
+def make_corpus(n_rows, seed=0, abstract_words=180, title_words=12, vocab_size=20000):
+    """Return a DataFrame with n_rows synthetic papers in the app's column layout."""
+    rng = np.random.default_rng(seed)
+
+    # Domain terms are spread over the frequency ranks so keywords range from common to rare
+    vocab = [_word(rng) for _ in range(vocab_size)]
+    for i, term in enumerate(DOMAIN_TERMS):
+        vocab.insert(int(3 * 1.3 ** i), term)
+    vocab = np.array(vocab, dtype=object)
+    weights = 1.0 / np.arange(1, len(vocab) + 1) ** 1.05
+    weights /= weights.sum()
+
+    cluster_ids = rng.integers(0, len(CLUSTERS), n_rows)
+    centres = rng.uniform(-80, 80, (len(CLUSTERS), 2))
+    coords = centres[cluster_ids] + rng.normal(0, 12, (n_rows, 2))
+
+    # Publication volume grows over time
+    years = np.arange(1998, 2025)
+    year_weights = np.linspace(1, 12, len(years))
+    year_weights[-1] = 2  # Partial final year
+    pub_year = rng.choice(years, n_rows, p=year_weights / year_weights.sum())
+
+    n_authors = max(n_rows // 3, 10)
+    last_names = np.array([_word(rng, 2, 4).capitalize() for _ in range(n_authors)], dtype=object)
+    last_names[:3] = ['Nicholson', 'Fiehn', 'Fernie']
+    given = np.array([_word(rng, 2, 3).capitalize() for _ in range(n_authors)], dtype=object)
+    given[:3] = ['Jeremy K', 'Oliver', 'Alisdair R']
+    author_weights = 1.0 / np.arange(1, n_authors + 1) ** 0.8
+    author_weights /= author_weights.sum()
+
+    journals = np.array([f"J {_word(rng, 2, 3).capitalize()} {_word(rng, 2, 3).capitalize()}"
+                         for _ in range(200)], dtype=object)
+
+    def texts(n_words):
+        words = vocab[rng.choice(len(vocab), (n_rows, n_words), p=weights)]
+        return [' '.join(row) + '.' for row in words]
+
+    # Up to 8 authors per paper, drawn in bulk; repeats within a paper are dropped
+    names = last_names + ' ' + given
+    author_draws = rng.choice(n_authors, (n_rows, 8), p=author_weights)
+    author_counts = rng.integers(1, 9, n_rows)
+    authors = [', '.join(dict.fromkeys(names[draws[:count]]))
+               for draws, count in zip(author_draws, author_counts)]
+
+    return pd.DataFrame({
+        'tsne_2D_x': coords[:, 0],
+        'tsne_2D_y': coords[:, 1],
+        'predicted_category': np.array(CLUSTERS, dtype=object)[cluster_ids],
+        'abstract': texts(abstract_words),
+        'title': texts(title_words),
+        'authors': authors,
+        'pub_year': pub_year,
+        'journal_title': rng.choice(journals, n_rows),
+    })
+
+
+def _word(rng, low=2, high=5):
+    return ''.join(rng.choice(_SYLLABLES, rng.integers(low, high + 1)))
@@ -0,0 +1,404 @@
+"""
+Columnar snapshot store for the metabolomics landscape dataset.
+
+The app ships its corpus as an Excel workbook. Parsing it with openpyxl on every
+cold start is slow and peaks at several times the final DataFrame size, so the
+workbook is converted once into an uncompressed Arrow IPC file that every worker
+memory-maps. The file name carries the content fingerprint of the workbook, which
+means a changed workbook is rebuilt automatically and workers on the same host
+share the page-cached pages of one file.
+
+The snapshot is written with a compact schema (see `apply_schema`): clusters and journals
+are dictionary-encoded and load as categoricals, years are int16, t-SNE coordinates float32,
+abstracts and titles stay Arrow-backed strings that point into the mapped file, and each
+paper's authors are stored as ids into one interned list of names with per-paper offsets.
+Rows are grouped by research cluster and an offset table in the schema metadata gives each
+cluster's row range, so selecting a cluster is a contiguous slice (see `cluster_rows`).
+
+Newer papers are added as delta batches instead of a new workbook: files with the workbook's
+columns (.xlsx or .csv) in the delta directory (`MLA_DELTA_DIR`, default `deltas/`). Each
+batch is converted into its own snapshot like the workbook, and `open_snapshots` appends them
+to the base snapshot without copying, shifting their cluster ranges; a cluster then spans one
+range per batch. A date in a source's file name (e.g. `_01MAR2024`) is recorded as its
+collection date, which bounds the complete publication years.
+
+Run `python data_store.py` to convert ahead of deployment, and
+`python data_store.py --report` to compare the memory footprint with the plain pandas frame.
+"""
+import argparse
+import contextlib
+import datetime
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+SOURCE_PATH = 'metabolomics_landscape_app_01MAR2024.xlsx'
+STORE_DIR = os.environ.get('MLA_DATA_STORE', '.data_store')
+DELTA_DIR = os.environ.get('MLA_DELTA_DIR', 'deltas')
+DELTA_EXTENSIONS = ('.xlsx', '.csv')
+
+COORD_COLUMNS = ('tsne_2D_x', 'tsne_2D_y')
+CATEGORY_COLUMNS = ('predicted_category', 'journal_title')
+AUTHORS_COLUMN = 'authors'
+CLUSTER_COLUMN = 'predicted_category'
+
+# Bumped whenever apply_schema changes, so snapshots written by older code are rebuilt
+SCHEMA_VERSION = 4
+
+# Collection date in a source file name, as in metabolomics_landscape_app_01MAR2024.xlsx
+_NAME_DATE = re.compile(r'(\d{2}[A-Za-z]{3}\d{4})')
+
+
+def source_fingerprint(source_path, store_dir=STORE_DIR):
+    """
+    Return the SHA-256 of the source file, reusing the cached digest next to the
+    store when the file size and modification time are unchanged.
+    """
+    stat = os.stat(source_path)
+    sidecar = _sidecar_path(source_path, store_dir)
+    try:
+        with open(sidecar) as fh:
+            cached = json.load(fh)
+        if cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(source_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    fingerprint = digest.hexdigest()
+
+    with _atomic_output(sidecar) as tmp:
+        with open(tmp, 'w') as fh:
+            json.dump({
+                'source': os.path.basename(source_path),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': fingerprint,
+            }, fh)
+    return fingerprint
+
+
+def convert_snapshot(source_path=SOURCE_PATH, store_dir=STORE_DIR, fingerprint=None):
+    """
+    Parse the source workbook once and write it as an Arrow IPC file.
+
+    Returns the path of the written file. Older snapshots of the same source are
+    removed after the new one is in place.
+    """
+    if fingerprint is None:
+        fingerprint = source_fingerprint(source_path, store_dir)
+
+    table = apply_schema(_read_source(source_path))
+    metadata = {
+        **table.schema.metadata,
+        b'source': os.path.basename(source_path).encode(),
+        b'sha256': fingerprint.encode(),
+    }
+    collected = collection_date(source_path)
+    if collected is not None:
+        metadata[b'collected'] = collected.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    path = _snapshot_path(source_path, store_dir, fingerprint)
+    with _atomic_output(path) as tmp:
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    for stale in _snapshot_files(source_path, store_dir):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+def load_snapshot(source_path=SOURCE_PATH, store_dir=STORE_DIR, columns=None):
+    """
+    Load the dataset from the memory-mapped Arrow snapshot, converting the source
+    workbook first if no snapshot matches its current fingerprint.
+
+    If the workbook is not deployed, the newest snapshot in the store is used. With
+    `columns`, only those columns are converted to pandas.
+    """
+    path = snapshot_path(source_path, store_dir)
+    table = open_snapshot(path)
+    df = to_frame(table if columns is None else table.select(list(columns)))
+    # Worker processes map the same file (see regex_pool)
+    df.attrs['snapshot_path'] = path
+    return df
+
+
+def snapshot_path(source_path=SOURCE_PATH, store_dir=STORE_DIR):
+    """Absolute path of the snapshot for `source_path`, converting the workbook if needed."""
+    if os.path.exists(source_path):
+        fingerprint = source_fingerprint(source_path, store_dir)
+        path = _snapshot_path(source_path, store_dir, fingerprint)
+        if not os.path.exists(path):
+            path = convert_snapshot(source_path, store_dir, fingerprint)
+    else:
+        snapshots = _snapshot_files(source_path, store_dir, SCHEMA_VERSION)
+        if not snapshots:
+            raise FileNotFoundError(f"No dataset found at {source_path} or in {store_dir}")
+        path = max(snapshots, key=os.path.getmtime)
+    return os.path.abspath(path)
+
+
+def open_snapshot(path):
+    """The snapshot as an Arrow table over the memory-mapped file; nothing is read until used."""
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def delta_sources(delta_dir=DELTA_DIR):
+    """Delta batch files in `delta_dir`, in name order (the order they are appended in)."""
+    if not os.path.isdir(delta_dir):
+        return []
+    return sorted(os.path.join(delta_dir, name) for name in os.listdir(delta_dir)
+                  if name.lower().endswith(DELTA_EXTENSIONS) and not name.startswith(('.', '~$')))
+
+
+def snapshot_paths(source_path=SOURCE_PATH, store_dir=STORE_DIR, delta_dir=DELTA_DIR):
+    """Snapshot paths of the base workbook followed by those of its delta batches, converting as needed."""
+    return [snapshot_path(source_path, store_dir)] + [snapshot_path(delta, store_dir)
+                                                      for delta in delta_sources(delta_dir)]
+
+
+def open_snapshots(paths):
+    """
+    The base snapshot with its delta batches appended, as one table over the mapped files.
+
+    Delta columns are cast to the base schema (missing ones are null), cluster ranges are
+    shifted by the rows before them, the fingerprint covers every file and the collection
+    date is the latest one.
+    """
+    tables = [open_snapshot(path) for path in paths]
+    base = tables[0]
+    if len(tables) == 1:
+        return base
+
+    offsets, fingerprints, dates = [], [], []
+    start = 0
+    for table in tables:
+        metadata = table.schema.metadata
+        offsets += [[name, first + start, stop + start]
+                    for name, first, stop in json.loads(metadata[b'cluster_offsets'])]
+        fingerprints.append(metadata.get(b'sha256', b'').decode())
+        if b'collected' in metadata:
+            dates.append(metadata[b'collected'].decode())
+        start += table.num_rows
+
+    metadata = {
+        **base.schema.metadata,
+        b'cluster_offsets': json.dumps(offsets).encode(),
+        b'sha256': hashlib.sha256(' '.join(fingerprints).encode()).hexdigest().encode(),
+        b'deltas': str(len(tables) - 1).encode(),
+    }
+    if dates:
+        metadata[b'collected'] = max(dates).encode()
+    merged = pa.concat_tables([base] + [_conform(table, base.schema) for table in tables[1:]])
+    return merged.replace_schema_metadata(metadata)
+
+
+def collection_date(source_path):
+    """ISO collection date from a `DDMONYYYY` token in the file name, or None."""
+    match = _NAME_DATE.search(os.path.basename(source_path))
+    if match is None:
+        return None
+    try:
+        return datetime.datetime.strptime(match.group(1), '%d%b%Y').date().isoformat()
+    except ValueError:
+        return None
+
+
+def cluster_rows(df, cluster_name):
+    """
+    Rows of one research cluster in a loaded snapshot: a slice when the cluster is one
+    contiguous range (always without delta batches), else an array of row ids. Unknown
+    clusters give an empty slice.
+    """
+    ranges = df.attrs['cluster_offsets'].get(cluster_name, [(0, 0)])
+    if len(ranges) == 1:
+        return slice(*ranges[0])
+    return np.concatenate([np.arange(start, stop) for start, stop in ranges])
+
+
+def apply_schema(df):
+    """
+    Convert a frame in the workbook's layout into an Arrow table with the compact schema,
+    its rows grouped by cluster and the cluster offset table stored as schema metadata.
+    """
+    df, offsets = _group_by_cluster(df.reset_index(drop=True))
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if col in COORD_COLUMNS:
+            columns[col] = pa.array(values.to_numpy(np.float32))
+        elif col == 'pub_year':
+            columns[col] = pa.array(values, type=pa.int16(), from_pandas=True)
+        elif col == AUTHORS_COLUMN:
+            columns[col] = _intern_authors(values)
+        elif values.dtype == object or isinstance(values.dtype, pd.StringDtype):
+            # Excel cells in text columns can come back as numbers; Arrow needs one type per column
+            values = values.where(values.isna(), values.astype(str))
+            if col in CATEGORY_COLUMNS:
+                columns[col] = pa.array(values, type=pa.string(), from_pandas=True).dictionary_encode()
+            else:
+                columns[col] = pa.array(values, type=pa.large_string(), from_pandas=True)
+        else:
+            columns[col] = pa.array(values, from_pandas=True)
+    return pa.table(columns).replace_schema_metadata({b'cluster_offsets': json.dumps(offsets).encode()})
+
+
+def _group_by_cluster(df):
+    # Stable sort on the order clusters first appear in, so the cluster list and the order of
+    # papers within a cluster stay as in the workbook; papers without a cluster go last
+    codes, clusters = pd.factorize(df[CLUSTER_COLUMN])
+    codes = np.where(codes < 0, len(clusters), codes)
+    df = df.take(np.argsort(codes, kind='stable')).reset_index(drop=True)
+    stops = np.cumsum(np.bincount(codes, minlength=len(clusters) + 1))
+    starts = stops - np.bincount(codes, minlength=len(clusters) + 1)
+    offsets = [[str(name), int(start), int(stop)] for name, start, stop in zip(clusters, starts, stops)]
+    return df, offsets
+
+
+def to_frame(table):
+    """
+    Convert a snapshot table to pandas without copying the text: strings become Arrow-backed
+    string columns and the interned authors stay an Arrow list column. The fingerprint, collection
+    date and cluster offset table (cluster -> list of row ranges) are carried over into `df.attrs`.
+    """
+    def types_mapper(arrow_type):
+        if arrow_type == pa.large_string():
+            return pd.StringDtype('pyarrow')
+        if pa.types.is_list(arrow_type):
+            return pd.ArrowDtype(arrow_type)
+        return None
+
+    df = table.to_pandas(types_mapper=types_mapper, split_blocks=True)
+    metadata = table.schema.metadata
+    # Snapshots carry the workbook fingerprint; tables built in memory (benchmarks) have none
+    df.attrs['fingerprint'] = metadata[b'sha256'].decode() if b'sha256' in metadata else None
+    df.attrs['collected'] = metadata[b'collected'].decode() if b'collected' in metadata else None
+    cluster_offsets = {}
+    for name, start, stop in json.loads(metadata[b'cluster_offsets']):
+        cluster_offsets.setdefault(name, []).append((start, stop))
+    df.attrs['cluster_offsets'] = cluster_offsets
+    return df
+
+
+def author_lists(authors):
+    """
+    Return (offsets, name_ids, names) for an interned authors column: the authors of row i are
+    names[name_ids[offsets[i]:offsets[i + 1]]]. Missing author lists are empty.
+    """
+    lists = authors.array.__arrow_array__().combine_chunks()
+    if isinstance(lists, pa.ChunkedArray):
+        lists = lists.chunk(0)
+    offsets = lists.offsets.to_numpy()
+    name_ids = lists.values.indices.to_numpy()
+    names = np.array(lists.values.dictionary.to_pylist(), dtype=object)
+    return offsets, name_ids, names
+
+
+def authors_text(authors):
+    """Comma-separated author strings for display, one per row of an interned authors column."""
+    lists = authors.array.__arrow_array__().to_pylist()
+    return pd.Series([', '.join(names) if names is not None else None for names in lists],
+                     index=authors.index, dtype=object)
+
+
+def _read_source(source_path):
+    if source_path.lower().endswith('.csv'):
+        return pd.read_csv(source_path)
+    return pd.read_excel(source_path)
+
+
+def _conform(table, schema):
+    # A delta batch with the base's columns and types, in the base's order
+    columns = [table.column(field.name).cast(field.type) if field.name in table.column_names
+               else pa.nulls(table.num_rows, field.type) for field in schema]
+    return pa.table(columns, schema=schema)
+
+
+def _intern_authors(authors):
+    # "Fiehn Oliver, Kind Tobias" -> list of ids into one dictionary of distinct names
+    entries = authors.reset_index(drop=True).str.split(',').explode().str.strip()
+    entries = entries[entries.notna() & (entries != '')]
+    codes, names = pd.factorize(entries)
+    counts = np.bincount(entries.index.to_numpy(), minlength=len(authors))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+    values = pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()),
+                                            pa.array(np.asarray(names, dtype=object), pa.large_string()))
+    return pa.ListArray.from_arrays(pa.array(offsets), values, mask=pa.array(authors.isna().to_numpy()))
+
+
+def memory_report(source_path=SOURCE_PATH, store_dir=STORE_DIR):
+    """Per-column memory of the plain pandas frame against the compact snapshot frame."""
+    plain = pd.read_excel(source_path)
+    compact = load_snapshot(source_path, store_dir)
+    report = pd.DataFrame({
+        'plain_mb': plain.memory_usage(deep=True, index=False) / 2**20,
+        'compact_mb': compact.memory_usage(deep=True, index=False) / 2**20,
+        'compact_dtype': compact.dtypes.astype(str),
+    })
+    report.loc['total', ['plain_mb', 'compact_mb']] = report[['plain_mb', 'compact_mb']].sum()
+    return report
+
+
+def _snapshot_path(source_path, store_dir, fingerprint):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(store_dir, f"{stem}.{fingerprint}.v{SCHEMA_VERSION}.arrow")
+
+
+def _snapshot_files(source_path, store_dir, schema_version=None):
+    # Snapshots of this source (of any schema version unless given), matched exactly so that
+    # "foo.xlsx" does not pick up the snapshot of a batch named "foo.2024.csv"
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    version = r'\d+' if schema_version is None else str(schema_version)
+    name = re.compile(rf"{re.escape(stem)}\.[0-9a-f]{{64}}\.v{version}\.arrow")
+    return [path for path in glob.glob(os.path.join(glob.escape(store_dir), f"{glob.escape(stem)}.*.arrow"))
+            if name.fullmatch(os.path.basename(path))]
+
+
+def _sidecar_path(source_path, store_dir):
+    # Keyed by the full file name: "foo.xlsx" and "foo.csv" have separate digests
+    return os.path.join(store_dir, f"{os.path.basename(source_path)}.fingerprint.json")
+
+
+@contextlib.contextmanager
+def _atomic_output(path):
+    # Several workers may convert at once; os.replace keeps readers from seeing a partial file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert the dataset workbook into the Arrow snapshot store.")
+    parser.add_argument('source', nargs='?', default=SOURCE_PATH)
+    parser.add_argument('--store-dir', default=STORE_DIR)
+    parser.add_argument('--delta-dir', default=DELTA_DIR, help="Also convert the delta batches in this directory")
+    parser.add_argument('--report', action='store_true', help="Print the before/after memory footprint")
+    args = parser.parse_args()
+    if args.report:
+        print(memory_report(args.source, args.store_dir).round(2).to_string())
+    else:
+        print(convert_snapshot(args.source, args.store_dir))
+        for delta in delta_sources(args.delta_dir):
+            print(snapshot_path(delta, args.store_dir))
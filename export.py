@@ -0,0 +1,133 @@
+"""
+Chunked CSV / Parquet export of papers and trend series.
+
+An export reads the selected rows straight from the memory-mapped snapshot table, a chunk
+of EXPORT_CHUNK_ROWS rows at a time, and encodes each chunk as soon as it is read, so no
+second copy of the selected columns is ever built: the interned authors become one
+comma-separated string per paper and dictionary columns (cluster, journal) plain strings,
+chunk by chunk. `encode` yields the encoded bytes after each chunk, for a response that
+streams them (the query service's /export) or for `collect`, which gathers them for a
+download up to a size budget.
+"""
+import io
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+import pyarrow.parquet
+
+# Paper columns that can be exported, with their display names
+EXPORT_COLUMNS = {
+    'title': 'Title',
+    'authors': 'Authors',
+    'journal_title': 'Journal',
+    'pub_year': 'Year',
+    'predicted_category': 'Research cluster',
+    'abstract': 'Abstract',
+}
+DEFAULT_EXPORT_COLUMNS = ('title', 'authors', 'journal_title', 'pub_year')
+
+FORMATS = ('csv', 'parquet')
+MEDIA_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+EXPORT_CHUNK_ROWS = int(os.environ.get('MLA_EXPORT_CHUNK_ROWS', 5000))
+
+# Largest export gathered in memory for a download (see collect)
+MAX_DOWNLOAD_BYTES = int(float(os.environ.get('MLA_EXPORT_MAX_MB', 100)) * 2**20)
+
+
+class ExportTooLarge(RuntimeError):
+    """Raised by `collect` when an export exceeds its size budget."""
+
+
+def paper_chunks(table, row_ids, columns, extra=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    The `columns` of the papers `row_ids` of a snapshot table, as Arrow tables of at most
+    `chunk_rows` rows each, with a leading 'row' column (the paper's row id).
+
+    `extra(chunk_row_ids)`, if given, returns more columns for each chunk, e.g. the keyword
+    groups each paper matched. Without rows there is one empty table, so the file still
+    gets its header.
+    """
+    table = table.select(list(columns))
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    for start in range(0, max(len(row_ids), 1), chunk_rows):
+        ids = row_ids[start:start + chunk_rows]
+        chunk = table.take(ids)
+        arrays = {'row': pa.array(ids, pa.int32())}
+        arrays.update({column: _plain(chunk.column(column)) for column in columns})
+        if extra is not None:
+            arrays.update({name: pa.array(values, pa.string()) for name, values in extra(ids).items()})
+        yield pa.table(arrays)
+
+
+def encode(chunks, fmt):
+    """
+    Encode an iterable of Arrow tables with one schema as a single CSV or Parquet file,
+    yielding the bytes written after each table (and the Parquet footer at the end).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Export format must be one of {', '.join(FORMATS)}: {fmt}")
+    sink = _Pending()
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                writer = (pa.parquet.ParquetWriter(sink, chunk.schema) if fmt == 'parquet'
+                          else pa.csv.CSVWriter(sink, chunk.schema))
+            writer.write_table(chunk)
+            yield sink.take()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.take()
+
+
+def collect(encoded, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Join the chunks of `encode` into one bytes object, raising ExportTooLarge past `max_bytes`."""
+    parts, size = [], 0
+    for part in encoded:
+        size += len(part)
+        if size > max_bytes:
+            raise ExportTooLarge(f"The export is larger than {max_bytes / 2**20:g} MB. Select fewer papers or "
+                                 "columns (abstracts are the largest), or use the query service's /export.")
+        parts.append(part)
+    return b''.join(parts)
+
+
+def _plain(column):
+    # Interned author lists -> "Fiehn Oliver, Kind Tobias"; dictionary columns -> their values
+    if pa.types.is_list(column.type):
+        return pc.binary_join(column.cast(pa.list_(pa.large_string())), pa.scalar(', ', pa.large_string()))
+    if pa.types.is_dictionary(column.type):
+        return column.cast(column.type.value_type)
+    return column
+
+
+class _Pending(io.RawIOBase):
+    # Write-only file that hands out what was written since the last `take`, while reporting
+    # every byte ever written as its position (Parquet footers record column chunk offsets)
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
@@ -0,0 +1,575 @@
+"""
+Figure builders for the t-SNE map pages.
+
+Traces are emitted as WebGL `Scattergl` directly from NumPy arrays, without building
+intermediate plotly.express figures. The unmatched background layer is sliced and rounded
+once and the same arrays back the background trace of both panels. Above a size limit the
+background is drawn as a density raster instead (`density_raster`), so only matched and
+highlighted papers travel as individual points, and a figure can be limited to a viewport
+(the papers inside a zoomed-in region).
+
+Figures carry no titles or authors. Matched and highlighted points carry only their row id
+in `customdata`; the page looks the details up server-side from the selection event of
+`st.plotly_chart(..., on_select="rerun")` (see `selected_row_ids`, and `selected_regions`
+for box and lasso selections answered from the spatial index).
+"""
+from typing import NamedTuple
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+from plotly.subplots import make_subplots
+
+COLOR_SCALE_TIME = [
+    (0, 'rgb(0, 0, 255)'),  # Blue for oldest
+    (0.5, 'rgb(255, 255, 0)'),  # Yellow for middle
+    (1, 'rgb(255, 0, 0)')   # Red for newest
+]
+
+# Faint, transparent gray for papers without a keyword match
+NO_MATCH_COLOR = 'rgba(200, 200, 200, 0.1)'
+
+# t-SNE coordinates are plotted at this many decimals; full float64 precision only bloats the JSON
+COORD_DECIMALS = 3
+
+# Density raster resolution (bins along the longer side) and its gray scale, faint to dense
+DENSITY_BINS = 160
+DENSITY_COLOR_SCALE = [(0, 'rgba(200, 200, 200, 0.25)'), (1, 'rgba(110, 110, 110, 0.8)')]
+
+
+class DensityRaster(NamedTuple):
+    """Paper counts on a regular grid: bin centres `x`, `y` and log-scaled counts `z[y, x]` (NaN if empty)."""
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+
+
+def density_raster(x, y, bounds=None, bins=DENSITY_BINS):
+    """
+    Bin papers at (x, y) into square cells over `bounds` (x0, x1, y0, y1; default: their extent).
+
+    Counts are log-scaled so dense cluster cores do not wash out sparse regions, and empty
+    cells are NaN so they stay transparent.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = x[valid], y[valid]
+    if bounds is None:
+        bounds = (x.min(), x.max(), y.min(), y.max()) if len(x) else (0.0, 1.0, 0.0, 1.0)
+    x0, x1, y0, y1 = bounds
+    cell = max(x1 - x0, y1 - y0, 1e-9) / bins
+    x_edges = x0 + cell * np.arange(int(np.ceil((x1 - x0) / cell)) + 2)
+    y_edges = y0 + cell * np.arange(int(np.ceil((y1 - y0) / cell)) + 2)
+    counts, _, _ = np.histogram2d(x, y, bins=(x_edges, y_edges))
+    with np.errstate(divide='ignore'):
+        z = np.where(counts > 0, np.log1p(counts), np.nan).T
+    return DensityRaster(np.round((x_edges[:-1] + x_edges[1:]) / 2, COORD_DECIMALS),
+                         np.round((y_edges[:-1] + y_edges[1:]) / 2, COORD_DECIMALS),
+                         np.round(z, 2))
+
+
+def explorer_figure(x, y, years, row_ids, group_codes, group_names, background=None, viewport=None):
+    """
+    Build the two-panel Embeddings Explorer figure.
+
+    Parameters:
+    - x, y: t-SNE coordinates of the plotted papers
+    - years: publication years of the plotted papers
+    - row_ids: dataset row ids of the plotted papers, sent as customdata of matched points
+    - group_codes: index into group_names of the keyword group a paper is coloured by, -1 if unmatched
+    - group_names: display names of the keyword groups
+    - background: DensityRaster drawn behind both panels instead of unmatched points
+    - viewport: (x0, x1, y0, y1) axis ranges of a zoomed-in view
+
+    Returns:
+    - Plotly figure with papers coloured by year (top) and by keyword group (bottom)
+    """
+    x = np.round(np.asarray(x, dtype=np.float64), COORD_DECIMALS)
+    y = np.round(np.asarray(y, dtype=np.float64), COORD_DECIMALS)
+    years = np.asarray(years)
+    group_codes = np.asarray(group_codes)
+    matched = group_codes >= 0
+
+    # Year range of the plotted papers
+    min_year = years.min() if len(years) else None
+    max_year = years.max() if len(years) else None
+
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=("Colored by Year", "Colored by Keyword Presence"),
+        vertical_spacing=0.1
+    )
+
+    # Background layer: sliced once, shared by both panels
+    background_x, background_y = x[~matched], y[~matched]
+    if background is not None:
+        for row in (1, 2):
+            fig.add_trace(_density_trace(background), row=row, col=1)
+    elif len(background_x):
+        for row in (1, 2):
+            fig.add_trace(go.Scattergl(
+                x=background_x,
+                y=background_y,
+                mode='markers',
+                marker=dict(color=NO_MATCH_COLOR, opacity=0.3, size=3),
+                name='No Keyword Match',
+                showlegend=False,
+                hoverinfo='skip'
+            ), row=row, col=1)
+
+    # Colored by Year
+    ids_matched = np.asarray(row_ids)[matched]
+    if matched.any():
+        fig.add_trace(go.Scattergl(
+            x=x[matched],
+            y=y[matched],
+            mode='markers',
+            marker=dict(color=years[matched], coloraxis='coloraxis', opacity=1, size=5),
+            customdata=ids_matched,
+            hovertemplate="Publication Year: %{marker.color}<extra></extra>",
+            name='',
+            showlegend=False
+        ), row=1, col=1)
+
+    # Colored by Keyword Presence, one trace per keyword group that matched something
+    colors = iter(qualitative.Alphabet * (len(group_names) // len(qualitative.Alphabet) + 1))
+    codes_matched = group_codes[matched]
+    for code, display_name in enumerate(group_names):
+        in_group = codes_matched == code
+        if not in_group.any():
+            continue
+        fig.add_trace(go.Scattergl(
+            x=x[matched][in_group],
+            y=y[matched][in_group],
+            mode='markers',
+            marker=dict(color=next(colors), opacity=1, size=5),
+            customdata=ids_matched[in_group],
+            hovertemplate="Keyword: %{fullData.name}<extra></extra>",
+            name=display_name,
+            legendgroup=display_name
+        ), row=2, col=1)
+
+    fig.update_layout(
+        title="Embeddings Explorer",
+        plot_bgcolor='white',
+        height=700, width=1000,
+        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),
+        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
+        margin=dict(l=50, r=50, t=80, b=50),
+        coloraxis=dict(colorscale=COLOR_SCALE_TIME,
+                       colorbar=dict(title="Year", y=0.85, thickness=15, len=0.3),
+                       cmin=min_year, cmax=max_year),  # Set dynamic range for filtered subset
+    )
+
+    _style_map_axes(fig, viewport)
+    fig.update_annotations(font_size=18)
+
+    fig.update_layout(
+        legend=dict(
+            title=dict(text='Keywords'),
+            orientation="h",
+            yanchor="bottom",
+            y=-0.1,
+            xanchor="center",
+            x=0.5,
+            bgcolor="rgba(255,255,255,0.8)",
+            bordercolor="lightgray",
+            borderwidth=1
+        )
+    )
+
+    return fig
+
+
+def author_figure(x, y, highlight, row_ids, author_name, show_other, background=None, viewport=None):
+    """
+    Build the Author Search figure.
+
+    Parameters:
+    - x, y: t-SNE coordinates of every paper
+    - highlight: boolean mask of the author's papers
+    - row_ids: dataset row ids, sent as customdata of highlighted points
+    - author_name: name shown in the title and legend
+    - show_other: whether to draw the remaining papers in gray
+    - background: DensityRaster drawn for the remaining papers instead of gray points
+    - viewport: (x0, x1, y0, y1) axis ranges of a zoomed-in view
+
+    Returns:
+    - Plotly figure with the author's papers as blue dots
+    """
+    x = np.round(np.asarray(x, dtype=np.float64), COORD_DECIMALS)
+    y = np.round(np.asarray(y, dtype=np.float64), COORD_DECIMALS)
+
+    fig = go.Figure()
+
+    # If show_other is True, add scatter plot (or density raster) for non-highlighted points
+    if show_other and background is not None:
+        fig.add_trace(_density_trace(background, name='Other'))
+    elif show_other:
+        fig.add_trace(go.Scattergl(
+            x=x[~highlight],
+            y=y[~highlight],
+            mode='markers',
+            marker=dict(color='rgba(160, 160, 160, 0.5)', size=3),  # Smaller size, no border
+            name='Other',
+            hoverinfo='skip'  # No hover information for other points
+        ))
+
+    # Add scatter plot for highlighted points
+    fig.add_trace(go.Scattergl(
+        x=x[highlight],
+        y=y[highlight],
+        mode='markers',
+        marker=dict(
+            color='rgb(0, 0, 225)',  # Blue
+            size=10,
+            line=dict(width=2, color='rgb(0, 0, 100)')
+        ),
+        name=author_name,
+        customdata=np.asarray(row_ids)[highlight],
+        hovertemplate="Click or select for paper details<extra></extra>"
+    ))
+
+    fig.update_layout(
+        title=f"Papers by {author_name}",
+        plot_bgcolor='white',
+        height=600,
+        width=1000,
+        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),
+        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
+        margin=dict(l=50, r=50, t=80, b=50),
+        showlegend=True,
+    )
+    _style_map_axes(fig, viewport)
+
+    return fig
+
+
+def ranked_figure(x, y, hit_x, hit_y, hit_rows, query, background=None):
+    """
+    Build the ranked search map.
+
+    Parameters:
+    - x, y: t-SNE coordinates of the other papers of the cluster, drawn in gray
+    - hit_x, hit_y: t-SNE coordinates of the search results, best first
+    - hit_rows: dataset row ids of the results, sent as customdata
+    - query: the search query, shown in the title
+    - background: DensityRaster drawn instead of the other papers
+
+    Returns:
+    - Plotly figure with the results coloured by rank
+    """
+    fig = go.Figure()
+    if background is not None:
+        fig.add_trace(_density_trace(background, name='Other'))
+    elif len(x):
+        fig.add_trace(go.Scattergl(
+            x=np.round(np.asarray(x, dtype=np.float64), COORD_DECIMALS),
+            y=np.round(np.asarray(y, dtype=np.float64), COORD_DECIMALS),
+            mode='markers',
+            marker=dict(color='rgba(160, 160, 160, 0.5)', size=3),
+            name='Other',
+            hoverinfo='skip'
+        ))
+
+    ranks = np.arange(1, len(hit_rows) + 1)
+    fig.add_trace(go.Scattergl(
+        x=np.round(np.asarray(hit_x, dtype=np.float64), COORD_DECIMALS),
+        y=np.round(np.asarray(hit_y, dtype=np.float64), COORD_DECIMALS),
+        mode='markers',
+        marker=dict(color=ranks, colorscale='Viridis', size=9,
+                    line=dict(width=1, color='rgb(60, 60, 60)'),
+                    colorbar=dict(title="Rank", thickness=15)),
+        name='Results',
+        customdata=np.asarray(hit_rows),
+        hovertemplate="Rank %{marker.color}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        title=f"Best matches for \"{query}\"",
+        plot_bgcolor='white',
+        height=600,
+        title_font=dict(size=20, family='Arial, sans-serif', color='#333333'),
+        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
+        margin=dict(l=50, r=50, t=80, b=50),
+        showlegend=False,
+    )
+    _style_map_axes(fig)
+
+    return fig
+
+
+def trend_figure(years, series):
+    """
+    Build the Keyword Trend Analysis figure.
+
+    Parameters:
+    - years: the years on the x axis
+    - series: (display_name, percentages) per keyword group, one percentage per year
+
+    Returns:
+    - Plotly figure with one line per keyword group
+    """
+    years = [int(year) for year in years]
+
+    # Create figure
+    fig = go.Figure()
+
+    for display_name, percentages in series:
+        # Create x and y lists ensuring all years are included
+        x_values = years
+        y_values = list(percentages)
+    
+        # Add trace with explicit line connection
+        fig.add_trace(go.Scatter(
+            x=x_values,
+            y=y_values,
+            mode='lines+markers',
+            name=display_name,
+            line=dict(
+                shape='linear',  # Linear interpolation between points
+                dash='solid',    # Solid line
+                width=2          # Line width
+            ),
+            marker=dict(
+                size=8,          # Larger markers to highlight data points
+                symbol='circle'  # Circle markers
+            ),
+            connectgaps=True,    # Important: Connect gaps across zero/null values
+            hovertemplate='Year: %{x}<br>Percentage: %{y:.2f}%<extra></extra>'
+        ))
+
+    # Update layout
+    fig.update_layout(
+        title="Keyword Trends Over Time",
+        xaxis_title="Year",
+        yaxis_title="Percentage of Papers (%)",
+        plot_bgcolor='white',
+        height=500,  # Increase height to accommodate legend
+        width=900,
+        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),
+        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
+        margin=dict(l=50, r=50, t=80, b=50),
+        legend=dict(
+            title=dict(text='Keywords'),
+            orientation="h",     # Horizontal orientation
+            yanchor="bottom",   # Anchor point at bottom
+            y=-0.5,            # Move legend down further (more negative value = lower position)
+            xanchor="center",   # Center horizontally
+            x=0.5,             # Center position
+            bgcolor="rgba(255,255,255,0.8)",
+            bordercolor="lightgray",
+            borderwidth=1
+        )
+    )
+
+    # Show fewer x-axis labels and reduce grid line thickness
+    selected_years = years[::4]  # For example, every 5th year
+    fig.update_xaxes(
+        type='category',
+        tickmode='array',
+        tickvals=selected_years,
+        ticktext=[str(year) for year in selected_years],
+        showgrid=True,
+        gridwidth=0.1,  # Thinner grid lines
+        gridcolor='lightgray'
+    )
+    fig.update_yaxes(
+        showgrid=True,
+        gridwidth=0.1,  # Thinner grid lines
+        gridcolor='lightgray'
+    )
+
+    return fig
+
+
+def trend_facet_figure(years, facets, series):
+    """
+    Build the Keyword Trend Analysis figure split by research cluster or journal.
+
+    Parameters:
+    - years: the years on the x axes
+    - facets: names of the clusters or journals, one panel each
+    - series: (display_name, percentages) per keyword group, percentages a facet x year matrix
+
+    Returns:
+    - Plotly figure with one panel per facet and one line per keyword group, same colour in every panel
+    """
+    years = [int(year) for year in years]
+    cols = 2
+    rows = max(1, -(-len(facets) // cols))
+    titles = [name if len(name) <= 45 else name[:42] + '...' for name in map(str, facets)]
+    fig = make_subplots(rows=rows, cols=cols, subplot_titles=titles, shared_xaxes=True,
+                        vertical_spacing=min(0.08, 0.3 / rows), horizontal_spacing=0.08)
+
+    colors = qualitative.Plotly * (len(series) // len(qualitative.Plotly) + 1)
+    for (display_name, percentages), color in zip(series, colors):
+        for i in range(len(facets)):
+            fig.add_trace(go.Scatter(
+                x=years,
+                y=list(percentages[i]),
+                mode='lines+markers',
+                name=display_name,
+                legendgroup=display_name,
+                showlegend=i == 0,
+                line=dict(color=color, width=2),
+                marker=dict(size=5),
+                hovertemplate='Year: %{x}<br>Percentage: %{y:.2f}%<extra></extra>'
+            ), row=i // cols + 1, col=i % cols + 1)
+
+    fig.update_layout(
+        title="Keyword Trends Over Time",
+        plot_bgcolor='white',
+        height=150 + 260 * rows,
+        width=1000,
+        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),
+        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
+        margin=dict(l=50, r=50, t=80, b=50),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5),
+    )
+    fig.update_annotations(font_size=14)
+    fig.update_xaxes(showgrid=True, gridwidth=0.1, gridcolor='lightgray')
+    fig.update_yaxes(showgrid=True, gridwidth=0.1, gridcolor='lightgray', ticksuffix='%')
+    return fig
+
+
+def overlap_figure(names, overlap):
+    """
+    Build the keyword co-occurrence heatmap.
+
+    Parameters:
+    - names: display names of the keyword groups
+    - overlap: matrix of the number of papers matching both groups (group counts on the diagonal)
+
+    Returns:
+    - Plotly heatmap of the pairwise overlaps, coloured by the share of the smaller group
+    """
+    overlap = np.asarray(overlap)
+    counts = np.diag(overlap)
+    # Overlap relative to the smaller group, so a rare keyword always contained in a common one reads as 100%
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(overlap > 0, overlap / np.minimum.outer(counts, counts) * 100, 0.0)
+
+    fig = go.Figure(go.Heatmap(
+        x=names,
+        y=names,
+        z=np.round(share, 1),
+        customdata=overlap,
+        colorscale='Blues',
+        zmin=0, zmax=100,
+        colorbar=dict(title="% of smaller", thickness=15),
+        texttemplate='%{customdata}' if len(names) <= 15 else None,
+        hovertemplate="%{y} & %{x}<br>Papers: %{customdata}<br>Share of smaller group: %{z:.1f}%<extra></extra>"
+    ))
+
+    fig.update_layout(
+        title="Keyword Co-occurrence",
+        plot_bgcolor='white',
+        height=max(450, 28 * len(names) + 200),
+        width=max(600, 28 * len(names) + 350),
+        title_font=dict(size=24, family='Arial, sans-serif', color='#333333'),
+        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
+        margin=dict(l=50, r=50, t=80, b=50),
+    )
+    fig.update_yaxes(autorange='reversed')
+    return fig
+
+
+def cooccurrence_figure(title, years, year_counts, clusters, cluster_counts):
+    """
+    Build the per-year and per-cluster breakdown of the papers matching a set of keyword groups.
+
+    Parameters:
+    - title: names of the keyword groups
+    - years, year_counts: matching papers per publication year
+    - clusters, cluster_counts: matching papers per research cluster
+
+    Returns:
+    - Plotly figure with a line over years (left) and bars per cluster (right)
+    """
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=("Papers per Year", "Papers per Cluster"),
+        horizontal_spacing=0.12
+    )
+    fig.add_trace(go.Scatter(
+        x=[int(year) for year in years],
+        y=np.asarray(year_counts).tolist(),
+        mode='lines+markers',
+        marker=dict(size=8),
+        hovertemplate='Year: %{x}<br>Papers: %{y}<extra></extra>',
+        showlegend=False
+    ), row=1, col=1)
+    fig.add_trace(go.Bar(
+        x=np.asarray(cluster_counts).tolist(),
+        y=list(clusters),
+        orientation='h',
+        hovertemplate='%{y}<br>Papers: %{x}<extra></extra>',
+        showlegend=False
+    ), row=1, col=2)
+
+    fig.update_layout(
+        title=title,
+        plot_bgcolor='white',
+        height=500, width=1000,
+        title_font=dict(size=20, family='Arial, sans-serif', color='#333333'),
+        font=dict(size=14, family='Arial, sans-serif', color='#333333'),
+        margin=dict(l=50, r=50, t=80, b=50),
+    )
+    fig.update_xaxes(showgrid=True, gridwidth=0.1, gridcolor='lightgray')
+    fig.update_yaxes(showgrid=True, gridwidth=0.1, gridcolor='lightgray')
+    fig.update_yaxes(autorange='reversed', row=1, col=2)
+    return fig
+
+
+def selected_row_ids(event):
+    """
+    Row ids of the points selected in a `st.plotly_chart` selection event, in selection order.
+
+    Points without a row id (background layers) are ignored, and a paper selected in both
+    Explorer panels is returned once.
+    """
+    if not event:
+        return []
+    points = event.get('selection', {}).get('points', [])
+    ids = (point['customdata'] for point in points if point.get('customdata') is not None)
+    return list(dict.fromkeys(int(row_id[0] if isinstance(row_id, list) else row_id) for row_id in ids))
+
+
+def selected_regions(event):
+    """Box and lasso selections of a `st.plotly_chart` selection event, as dicts with data-space 'x' and 'y'."""
+    if not event:
+        return []
+    selection = event.get('selection', {})
+    return [shape for shape in selection.get('box', []) + selection.get('lasso', []) if shape.get('x')]
+
+
+def selectable_row_ids(fig):
+    """Row ids of the points of a figure that carry one (matched or highlighted papers)."""
+    ids = [np.asarray(trace.customdata).ravel() for trace in fig.data if trace.customdata is not None]
+    return np.unique(np.concatenate(ids)).astype(np.int64) if ids else np.empty(0, dtype=np.int64)
+
+
+def _density_trace(raster, name='No Keyword Match'):
+    # Not selectable and not hoverable; the matched points drawn on top carry the row ids
+    return go.Heatmap(
+        x=raster.x,
+        y=raster.y,
+        z=raster.z,
+        colorscale=DENSITY_COLOR_SCALE,
+        showscale=False,
+        hoverinfo='skip',
+        name=name,
+    )
+
+
+def _style_map_axes(fig, viewport=None):
+    # Remove axis labels, tick marks and grid; add light gray border lines
+    fig.update_xaxes(title='', showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_yaxes(title='', showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_xaxes(showline=True, linewidth=1, linecolor='lightgray', mirror=True)
+    fig.update_yaxes(showline=True, linewidth=1, linecolor='lightgray', mirror=True)
+    if viewport is not None:
+        fig.update_xaxes(range=list(viewport[:2]))
+        fig.update_yaxes(range=list(viewport[2:]))
@@ -0,0 +1,133 @@
+"""
+Lightweight per-request instrumentation.
+
+Each user-facing operation (loading the data, building an Explorer, Trend or Author figure,
+rendering a chart) runs inside `trace(operation, ...)`. Code below it times named stages
+with `stage(name)` and adds counters such as rows scanned and matched with `count(name, n)`;
+both are no-ops outside a trace, so library modules can call them unconditionally.
+
+Finished traces are kept in a bounded in-process buffer for the sidebar debug panel and,
+when `MLA_PERF_LOG` names a file, appended to it as JSON lines so latency percentiles can
+be built from production traffic.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+PERF_LOG_PATH = os.environ.get('MLA_PERF_LOG')
+RECENT_TRACES = int(os.environ.get('MLA_PERF_RECENT', 500))
+
+_current = contextvars.ContextVar('mla_trace', default=None)
+_recent = deque(maxlen=RECENT_TRACES)
+_log_lock = threading.Lock()
+
+
+class Trace:
+    """Timings and counters of one operation."""
+
+    def __init__(self, operation, **fields):
+        self.operation = operation
+        self.fields = fields
+        self.stages = {}
+        self.counters = {}
+        self.started = time.time()
+        self.total_s = None
+
+    def as_dict(self):
+        return {
+            'ts': round(self.started, 3),
+            'operation': self.operation,
+            'total_ms': round(self.total_s * 1000, 3) if self.total_s is not None else None,
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            **self.counters,
+            **self.fields,
+        }
+
+
+@contextlib.contextmanager
+def trace(operation, **fields):
+    """
+    Record one operation. Traces nest: an inner trace (e.g. a cached loader called from a
+    page function) is recorded on its own and does not add to the outer trace's stages.
+    """
+    current = Trace(operation, **fields)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.total_s = time.perf_counter() - start
+        _current.reset(token)
+        _finish(current)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Add the wall time of the block to stage `name` of the current trace, if any."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.stages[name] = current.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def count(name, n=1):
+    """Add `n` to counter `name` of the current trace, if any."""
+    current = _current.get()
+    if current is not None:
+        current.counters[name] = current.counters.get(name, 0) + int(n)
+
+
+def record(**fields):
+    """Set fields (labels or measured values) on the current trace, if any."""
+    current = _current.get()
+    if current is not None:
+        current.fields.update(fields)
+
+
+def payload_bytes(fig):
+    """Size of a figure's JSON as sent to the browser (serializes the figure once more)."""
+    return len(fig.to_json(validate=False).encode())
+
+
+def recent_traces(operation=None):
+    """Finished traces of this process, oldest first."""
+    traces = list(_recent)
+    if operation is not None:
+        traces = [t for t in traces if t['operation'] == operation]
+    return traces
+
+
+def latency_summary(traces):
+    """Count and p50/p95/max total latency in ms per operation."""
+    totals = {}
+    for t in traces:
+        totals.setdefault(t['operation'], []).append(t['total_ms'])
+    return {
+        operation: {
+            'count': len(values),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'max_ms': float(np.max(values)),
+        }
+        for operation, values in totals.items()
+    }
+
+
+def _finish(current):
+    entry = current.as_dict()
+    _recent.append(entry)
+    if PERF_LOG_PATH:
+        line = json.dumps(entry, default=str)
+        with _log_lock, open(PERF_LOG_PATH, 'a', encoding='utf-8') as log:
+            log.write(line + '\n')
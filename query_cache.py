@@ -0,0 +1,162 @@
+"""
+Process-wide LRU cache for query results (keyword match masks and built figures).
+
+Streamlit reruns the page script for every interaction and every session, so identical
+queries (the preset author buttons, common keyword sets) used to be recomputed from scratch.
+Results are cached here under a canonicalized query key, bounded by an estimate of their
+memory footprint, and dropped as a whole when the dataset fingerprint changes.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import instrumentation
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get('MLA_QUERY_CACHE_MB', 256)) * 2**20)
+
+_MISSING = object()
+
+# Layout, template and trace attributes that are not arrays
+_FIGURE_OVERHEAD_BYTES = 64 * 1024
+
+
+def canonical_keyword(keyword):
+    """
+    Trim a keyword and case-fold it when that cannot change what it matches.
+
+    Matching is case-insensitive, but case carries meaning in regex escapes (\\d vs \\D) and
+    inline flag groups, and non-ASCII lowercasing can change string length, so only ASCII
+    keywords without either are folded.
+    """
+    keyword = keyword.strip()
+    if keyword.isascii() and '\\' not in keyword and '(?' not in keyword:
+        return keyword.lower()
+    return keyword
+
+
+def canonical_group(alternatives):
+    """Key for an OR group: the order of alternatives does not affect the match."""
+    return tuple(sorted({canonical_keyword(k) for k in alternatives}))
+
+
+def estimate_nbytes(value):
+    """Rough resident size of a cached value: arrays by buffer size, figures by their trace arrays."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(v) for v in value)
+    if hasattr(value, 'data') and hasattr(value, 'layout'):
+        total = _FIGURE_OVERHEAD_BYTES
+        for trace in value.data:
+            for attr in ('x', 'y', 'z', 'customdata', 'text'):
+                total += _array_nbytes(getattr(trace, attr, None))
+            marker = getattr(trace, 'marker', None)
+            if marker is not None:
+                total += _array_nbytes(marker.color)
+        return total
+    return 1024
+
+
+def _array_nbytes(values):
+    if values is None or isinstance(values, str):
+        return 0
+    if isinstance(values, np.ndarray):
+        return values.nbytes
+    try:
+        return 8 * len(values)
+    except TypeError:
+        return 0
+
+
+class QueryCache:
+    """Thread-safe LRU mapping from query keys to results, bounded by estimated bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def bind(self, fingerprint):
+        """Attach the cache to a dataset version; results of any other version are dropped."""
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self._entries.clear()
+                self._nbytes = 0
+                self.fingerprint = fingerprint
+
+    def get(self, key, default=None, fingerprint=None):
+        """
+        Return the cached result for `key`, or `default` on a miss. If `fingerprint` is given
+        and the cache is bound to another dataset version, every lookup misses.
+        """
+        with self._lock:
+            if key in self._entries and (fingerprint is None or fingerprint == self.fingerprint):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                instrumentation.count('cache_hits')
+                return self._entries[key][0]
+            self.misses += 1
+            instrumentation.count('cache_misses')
+            return default
+
+    def put(self, key, value, fingerprint=None):
+        """
+        Store `value` under `key`. If `fingerprint` is given and the cache has been bound to
+        another dataset version since the value was computed, it is not stored.
+        """
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            if nbytes > self.max_bytes or (fingerprint is not None and fingerprint != self.fingerprint):
+                return
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, fingerprint=None):
+        """
+        Return the cached result for `key`, calling `compute()` and storing it on a miss.
+        `fingerprint` is the dataset version the result belongs to (default: the bound one).
+        """
+        if fingerprint is None:
+            fingerprint = self.fingerprint
+        value = self.get(key, _MISSING, fingerprint)
+        if value is not _MISSING:
+            return value
+        # Compute outside the lock; concurrent misses on one key may both compute
+        value = compute()
+        self.put(key, value, fingerprint)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by every session of this process; Streamlit re-runs app.py but keeps imported modules
+QUERY_CACHE = QueryCache()
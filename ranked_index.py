@@ -0,0 +1,146 @@
+"""
+BM25 term-statistics index for ranked full-text search over titles and abstracts.
+
+The keyword index (text_index.py) answers "does this paper match"; this one answers "which
+papers match best". Titles and abstracts are tokenized like the keyword index (lowercase
+`\\w+` tokens) and combined BM25F-style: a title occurrence counts TITLE_WEIGHT times, and
+the paper length is the weighted token count. Every (token, paper) posting stores its BM25
+score contribution ("impact"), precomputed from the term frequency, the paper length and the
+token's idf, so a query only adds impacts.
+
+Postings are stored per token in row order (CSR layout: `indptr` into `rows`/`impacts`), for
+looking up a paper's impact by binary search, and `by_impact` lists the same postings per
+token from the highest impact down. A query is answered with the threshold algorithm: it
+reads the query tokens' postings from the top in growing blocks, scores each newly seen
+paper exactly, keeps the best k, and stops as soon as the k-th best score exceeds the sum of
+the impacts at the current depth, the most any unseen paper could score. Queries on common
+words so stop long before the whole corpus is scored.
+"""
+import numpy as np
+import pandas as pd
+
+from text_index import IGNORECASE_FOLD, TOKEN_PATTERN
+
+# BM25 term-frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+# A title occurrence counts as this many abstract occurrences
+TITLE_WEIGHT = 2.0
+
+_BUILD_CHUNK_ROWS = 20000
+
+# Postings read per query token in the first round of a search; doubled every round
+_FIRST_BLOCK = 256
+
+
+def query_tokens(query):
+    """Distinct tokens of a search query, in the order they appear."""
+    return list(dict.fromkeys(TOKEN_PATTERN.findall(query.translate(IGNORECASE_FOLD).lower())))
+
+
+class RankedIndex:
+    """Token -> BM25 impacts of the papers containing it, over titles and abstracts."""
+
+    def __init__(self, titles, abstracts):
+        titles = pd.Series(titles).reset_index(drop=True)
+        abstracts = pd.Series(abstracts).reset_index(drop=True)
+        self.size = len(titles)
+
+        token_ids = {}
+        keys, weights = [], []
+        for start in range(0, self.size, _BUILD_CHUNK_ROWS):
+            chunk_keys, chunk_weights = [], []
+            for texts, weight in ((titles, TITLE_WEIGHT), (abstracts, 1.0)):
+                field_keys = _token_keys(texts.iloc[start:start + _BUILD_CHUNK_ROWS], start, token_ids, self.size)
+                chunk_keys.append(field_keys)
+                chunk_weights.append(np.full(len(field_keys), weight))
+            # Weighted term frequency per (token, row); rows do not cross chunks
+            chunk_keys, inverse = np.unique(np.concatenate(chunk_keys), return_inverse=True)
+            keys.append(chunk_keys)
+            weights.append(np.bincount(inverse, weights=np.concatenate(chunk_weights)))
+
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        frequencies = np.concatenate(weights) if weights else np.empty(0)
+        order = np.argsort(keys, kind='stable')
+        keys, frequencies = keys[order], frequencies[order]
+        tokens = keys // max(self.size, 1)
+        self.rows = (keys % max(self.size, 1)).astype(np.int32)
+        self.indptr = np.searchsorted(tokens, np.arange(len(token_ids) + 1))
+        self.vocab = token_ids
+
+        lengths = np.bincount(self.rows, weights=frequencies, minlength=self.size)
+        average_length = lengths.mean() if self.size else 1.0
+        papers = np.diff(self.indptr)
+        self.idf = np.log1p((self.size - papers + 0.5) / (papers + 0.5))
+        norm = K1 * (1 - B + B * lengths[self.rows] / max(average_length, 1e-9))
+        self.impacts = (self.idf[tokens] * frequencies * (K1 + 1) / (frequencies + norm)).astype(np.float32)
+
+        # Postings of each token from the highest impact down (ties by row), within the token's range
+        self.by_impact = np.lexsort((self.rows, -self.impacts, tokens)).astype(np.int32)
+
+    def search(self, query, k, allowed=None):
+        """
+        (row ids, scores) of the k best papers for `query` by BM25, best first (ties by row id).
+
+        `allowed`, a boolean mask over rows, limits the results, e.g. to one research cluster.
+        """
+        ranges = [(self.indptr[t], self.indptr[t + 1])
+                  for t in (self.vocab.get(token) for token in query_tokens(query)) if t is not None]
+        if k <= 0 or not ranges:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        seen = np.zeros(self.size, dtype=bool)
+        top_rows, top_scores = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        depth, block = 0, _FIRST_BLOCK
+        while True:
+            # Next block of every token's postings, highest impacts first
+            new_rows = np.concatenate([self.rows[self.by_impact[start + depth:min(start + depth + block, stop)]]
+                                       for start, stop in ranges])
+            new_rows = np.unique(new_rows)
+            new_rows = new_rows[~seen[new_rows]]
+            seen[new_rows] = True
+            if allowed is not None:
+                new_rows = new_rows[allowed[new_rows]]
+
+            # Exact scores of the new papers, by binary search in each token's row-ordered postings
+            scores = np.zeros(len(new_rows), dtype=np.float32)
+            for start, stop in ranges:
+                positions = start + np.searchsorted(self.rows[start:stop], new_rows)
+                found = positions < stop
+                found[found] = self.rows[positions[found]] == new_rows[found]
+                scores[found] += self.impacts[positions[found]]
+            top_rows, top_scores = _best(np.concatenate([top_rows, new_rows]),
+                                         np.concatenate([top_scores, scores]), k)
+
+            depth += block
+            block *= 2
+            # An unseen paper scores at most the next impact of every token; strictly above that,
+            # no unseen paper can tie the k-th either
+            bound = sum(self.impacts[self.by_impact[start + depth]] for start, stop in ranges if start + depth < stop)
+            if all(start + depth >= stop for start, stop in ranges) or (len(top_rows) == k and top_scores[-1] > bound):
+                return top_rows, top_scores
+
+
+def _token_keys(texts, row_offset, token_ids, size):
+    # token_id * size + row for every token occurrence (repeats kept: they are the term frequency)
+    tokens = texts.str.translate(IGNORECASE_FOLD).str.lower().str.findall(TOKEN_PATTERN.pattern)
+    exploded = tokens.explode().dropna()
+    if exploded.empty:
+        return np.empty(0, dtype=np.int64)
+    for token in pd.unique(exploded.to_numpy()):
+        token_ids.setdefault(token, len(token_ids))
+    codes = exploded.map(token_ids).to_numpy(np.int64)
+    rows = exploded.index.to_numpy(np.int64) - texts.index[0] + row_offset
+    return codes * size + rows
+
+
+def _best(rows, scores, k):
+    # The k highest scores, best first, ties broken by row id
+    if len(rows) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        # Rows tied with the k-th score may be cut arbitrarily by argpartition; take them all and trim after sorting
+        keep = np.flatnonzero(scores >= scores[keep].min())
+        rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
@@ -0,0 +1,362 @@
+"""
+Shared process pool for the regex part of keyword matching.
+
+Keywords are user-supplied regular expressions. The token index narrows every keyword to
+candidate rows, but patterns it cannot narrow (or that backtrack catastrophically) still have
+to be run over many abstracts, and doing that in the Streamlit script thread holds the GIL
+for every other session. `RegexPool` runs those verifications in a bounded pool of worker
+processes instead:
+
+- Workers memory-map the same Arrow snapshot files as the app (the base snapshot and its delta
+  batches) and receive only the patterns, the column name and the candidate row ids;
+  compiled patterns are cached per worker. `use_snapshots` moves the pool to a newer version.
+- A query's regex keywords are scanned together (`scan`): the candidate row range is split
+  into chunks spread over the workers, each chunk is read once for all keywords, and the
+  per-chunk bitmasks are merged in the app process.
+- Each query has a wall-clock budget, and each task a CPU budget enforced with RLIMIT_CPU
+  where available. A query over either budget fails with `QueryTimeout`; its chunks still
+  running are stopped by terminating the workers, and later tasks start on a fresh pool.
+- At most `max_pending` scans (queries, each of any number of chunks) may be queued or
+  running; beyond that `ServerBusy` is raised at once instead of queueing without bound.
+  A scan's chunks may occupy every worker, but only until it ends or is stopped.
+- Tasks are tagged with the submitting session (see `session`); a new query from the same
+  session cancels that session's earlier tasks. Tasks still waiting for a worker are
+  dropped; running ones are stopped the same way as timed-out ones.
+"""
+import atexit
+import contextlib
+import contextvars
+import functools
+import multiprocessing
+import os
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; only the wall-clock budget applies there
+    resource = None
+
+DEFAULT_WORKERS = int(os.environ.get('MLA_REGEX_WORKERS', os.cpu_count() or 1))
+DEFAULT_MAX_PENDING = int(os.environ.get('MLA_REGEX_MAX_PENDING', 4 * DEFAULT_WORKERS))
+DEFAULT_TIMEOUT_S = float(os.environ.get('MLA_REGEX_TIMEOUT_S', 10))
+
+_BUSY_MESSAGE = "The server is busy with other keyword searches. Please try again in a moment."
+_POLL_S = 0.05
+
+# Scans are split into this many chunks per worker, for load balancing, but no smaller than
+# _MIN_CHUNK_ROWS rows so per-task overhead stays small
+_CHUNKS_PER_WORKER = 4
+_MIN_CHUNK_ROWS = 2000
+
+_session = contextvars.ContextVar('mla_regex_session', default=None)
+
+
+class ServerBusy(RuntimeError):
+    """Raised when the regex pool already has its maximum number of pending scans."""
+
+
+class QueryTimeout(RuntimeError):
+    """Raised when a keyword exceeds its time or CPU budget."""
+
+
+class QueryCancelled(RuntimeError):
+    """Raised in a superseded query when the same session submitted a new one."""
+
+
+@contextlib.contextmanager
+def session(session_id):
+    """Tag pool tasks submitted inside the block with `session_id`, for cancellation."""
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+class _BrokenPool(Exception):
+    # A worker died (CPU budget exceeded or crashed); carries the executor to replace
+    def __init__(self, executor):
+        super().__init__()
+        self.executor = executor
+
+
+class RegexPool:
+    """Bounded process pool that verifies regex keywords against rows of a snapshot."""
+
+    def __init__(self, snapshot_paths, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 timeout_s=DEFAULT_TIMEOUT_S, cpu_budget_s=None):
+        """`snapshot_paths`: the snapshot file, or the base snapshot followed by its delta batches."""
+        self.snapshot_paths = _as_paths(snapshot_paths)
+        self.workers = workers
+        self.timeout_s = timeout_s
+        self.cpu_budget_s = cpu_budget_s if cpu_budget_s is not None else timeout_s
+        # One slot per scan, however many chunks it is split into
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Tasks wait here, not in the executor's queue, so they can still be cancelled
+        self._idle_workers = threading.Semaphore(workers)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._executor = None
+        self._workers = weakref.WeakKeyDictionary()
+        atexit.register(self.shutdown)
+
+    def scan(self, location, keyword_rows):
+        """
+        Verify several keywords in one data-parallel pass over the `location` column.
+
+        `keyword_rows` maps each keyword to its sorted candidate row ids. The row range is
+        split into chunks that workers read straight from the mapped snapshot; each chunk is
+        scanned once for all keywords and returns one bitmask per keyword, so neither the
+        texts nor per-row results are pickled. Returns keyword -> matching row ids.
+        """
+        session_id = _session.get()
+        self._cancel_previous(session_id)
+        if not self._slots.acquire(blocking=False):
+            raise ServerBusy(_BUSY_MESSAGE)
+        cancelled = threading.Event()
+        self._track(session_id, cancelled)
+        try:
+            keyword_rows = {keyword: np.asarray(rows, dtype=np.int32) for keyword, rows in keyword_rows.items()}
+            deadline = time.monotonic() + self.timeout_s
+            names = ', '.join(repr(keyword) for keyword in keyword_rows)
+            timeout = QueryTimeout(f"Searching for {names} took longer than {self.timeout_s:g} s. "
+                                   "Try a more specific pattern.")
+            # A broken pool may have been broken by another session's task; retry once on a fresh one
+            for _ in range(2):
+                try:
+                    return self._scan(location, keyword_rows, cancelled, deadline, timeout)
+                except _BrokenPool as e:
+                    self._reset(e.executor)
+            raise timeout
+        finally:
+            self._untrack(session_id, cancelled)
+            self._slots.release()
+
+    def _scan(self, location, keyword_rows, cancelled, deadline, timeout):
+        chunks = []
+        executor = None
+        try:
+            for start, stop, tasks in _chunk_tasks(keyword_rows, self.workers * _CHUNKS_PER_WORKER):
+                # Waiting behind other searches is "busy"; behind our own earlier chunks it is a timeout
+                self._wait(lambda t: self._idle_workers.acquire(timeout=t), cancelled, deadline,
+                           on_deadline=timeout if chunks else ServerBusy(_BUSY_MESSAGE))
+                executor, future = self._submit(_scan_chunk, location, start, stop, tasks, self.cpu_budget_s)
+                chunks.append((start, tasks, executor, future))
+            for _, _, _, future in chunks:
+                self._wait(lambda t: _done(future, t), cancelled, deadline, on_deadline=timeout)
+        except BaseException as e:
+            if isinstance(e, BrokenProcessPool):
+                for _, _, _, future in chunks:
+                    future.cancel()
+                raise _BrokenPool(executor) from e
+            # Chunks that already started cannot be cancelled: stop the workers running them
+            # rather than leave them busy until their CPU budget (or, without one, the end)
+            running = {executor for _, _, executor, future in chunks if not future.cancel() and not future.done()}
+            for executor in running:
+                self._reset(executor)
+            raise
+
+        matches = {keyword: [] for keyword in keyword_rows}
+        for start, tasks, _, future in chunks:
+            for (keyword, _), packed in zip(tasks, future.result()):
+                matches[keyword].append(np.flatnonzero(np.unpackbits(packed).astype(bool)).astype(np.int32) + start)
+        return {keyword: np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+                for keyword, parts in matches.items()}
+
+    def use_snapshots(self, snapshot_paths):
+        """
+        Serve a newer dataset version. New tasks go to fresh workers mapping `snapshot_paths`;
+        the current workers finish their tasks and exit. Delta batches only append rows, so
+        tasks of a query that started on the old version stay valid on the new one.
+        """
+        with self._lock:
+            self.snapshot_paths = _as_paths(snapshot_paths)
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _wait(attempt, cancelled, deadline, on_deadline):
+        # Poll so a newer query from the same session can interrupt the wait
+        while not attempt(_POLL_S):
+            if cancelled.is_set():
+                raise QueryCancelled("Replaced by a newer query")
+            if time.monotonic() > deadline:
+                raise on_deadline
+
+    def _submit(self, fn, *args):
+        executor = None
+        try:
+            with self._lock:
+                if self._executor is None:
+                    # spawn, not fork: the app process runs server threads that must not be forked
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker, initargs=(self.snapshot_paths,))
+                    # The executor's live pid -> process map, which it drops once shut down
+                    self._workers[self._executor] = self._executor._processes
+                executor = self._executor
+                future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._idle_workers.release()
+            raise
+        # The worker is busy until the task ends, even if nobody waits for it any more
+        future.add_done_callback(lambda _: self._idle_workers.release())
+        return executor, future
+
+    def _reset(self, executor):
+        # Drop `executor` (a broken one, or one running abandoned tasks) and terminate its
+        # workers; the next task starts a fresh pool. Tasks of other queries still running on
+        # it fail with BrokenProcessPool, which `scan` retries once
+        with self._lock:
+            if executor is None:
+                executor = self._executor
+            if executor is None:
+                return
+            if executor is self._executor:
+                self._executor = None
+            processes = list(self._workers.pop(executor, {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def _cancel_previous(self, session_id):
+        if session_id is None:
+            return
+        with self._lock:
+            previous = self._sessions.pop(session_id, set())
+        for cancelled in previous:
+            cancelled.set()
+
+    def _track(self, session_id, cancelled):
+        if session_id is not None:
+            with self._lock:
+                self._sessions.setdefault(session_id, set()).add(cancelled)
+
+    def _untrack(self, session_id, cancelled):
+        with self._lock:
+            events = self._sessions.get(session_id)
+            if events is not None:
+                events.discard(cancelled)
+                if not events:
+                    del self._sessions[session_id]
+
+
+def _as_paths(snapshot_paths):
+    return (snapshot_paths,) if isinstance(snapshot_paths, str) else tuple(snapshot_paths)
+
+
+def _done(future, timeout):
+    try:
+        error = future.exception(timeout=timeout)
+    except FutureTimeoutError:
+        return False
+    except CancelledError:
+        return True
+    if isinstance(error, BrokenProcessPool):
+        raise error
+    return True
+
+
+def _chunk_tasks(keyword_rows, n_chunks):
+    """
+    Split the span of all candidate rows into about `n_chunks` row ranges and yield
+    (start, stop, tasks) per range, where tasks lists (keyword, local_rows) for every keyword
+    with candidates in the range; local_rows is None when every row of the range is a candidate.
+    """
+    spans = [(rows[0], rows[-1] + 1) for rows in keyword_rows.values() if len(rows)]
+    if not spans:
+        return
+    low, high = min(s[0] for s in spans), max(s[1] for s in spans)
+    size = max(_MIN_CHUNK_ROWS, -(-(high - low) // n_chunks))
+    for start in range(low, high, size):
+        stop = min(start + size, high)
+        tasks = []
+        for keyword, rows in keyword_rows.items():
+            lo, hi = np.searchsorted(rows, [start, stop])
+            if hi == lo:
+                continue
+            local = None if hi - lo == stop - start else (rows[lo:hi] - start).astype(np.int32)
+            tasks.append((keyword, local))
+        if tasks:
+            yield int(start), int(stop), tasks
+
+
+# Worker process state: the memory-mapped snapshot files, opened once per worker, and the
+# text columns assembled from them
+_tables = []
+_columns = {}
+
+
+def _init_worker(snapshot_paths):
+    import pyarrow as pa
+    _tables[:] = [pa.ipc.open_file(pa.memory_map(path, 'r')).read_all() for path in snapshot_paths]
+
+
+def _column(location):
+    # The column over the base snapshot and its delta batches, in row order
+    column = _columns.get(location)
+    if column is None:
+        import pyarrow as pa
+        column_type = _tables[0].schema.field(location).type
+        chunks = []
+        for table in _tables:
+            if location in table.column_names:
+                chunks += [chunk.cast(column_type) for chunk in table.column(location).chunks]
+            else:
+                chunks.append(pa.nulls(table.num_rows, column_type))
+        column = _columns[location] = pa.chunked_array(chunks, type=column_type)
+    return column
+
+
+@functools.lru_cache(maxsize=256)
+def _compiled(keyword):
+    return re.compile(keyword, re.IGNORECASE)
+
+
+def _scan_chunk(location, start, stop, tasks, cpu_budget_s):
+    if resource is not None and cpu_budget_s:
+        # Soft limit relative to the CPU this worker has used so far; SIGXCPU ends the worker
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        spent = used.ru_utime + used.ru_stime
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        limit = int(spent + cpu_budget_s) + 1
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+    column = _column(location)
+    n_rows = stop - start
+    hits = np.zeros((len(tasks), n_rows), dtype=bool)
+
+    # Keywords that need the whole chunk share one pass over its texts
+    whole = [(i, _compiled(keyword)) for i, (keyword, local) in enumerate(tasks) if local is None]
+    if whole:
+        for j, text in enumerate(column.slice(start, n_rows).to_pylist()):
+            if text is not None:
+                for i, pattern in whole:
+                    if pattern.search(text) is not None:
+                        hits[i, j] = True
+
+    for i, (keyword, local) in enumerate(tasks):
+        if local is None:
+            continue
+        pattern = _compiled(keyword)
+        texts = column.take(local + start).to_pylist()
+        hits[i, local] = [text is not None and pattern.search(text) is not None for text in texts]
+
+    return [np.packbits(row) for row in hits]
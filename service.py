@@ -0,0 +1,267 @@
+"""
+Headless JSON query service over the same engines as the Streamlit app.
+
+One process loads the snapshot and its indexes once and serves its current version
+(analysis.LiveDataset, so delta batches are picked up without a restart):
+
+- GET  /health    current dataset size and fingerprint, query cache statistics
+- POST /match     {"keywords": [...], "location": "abstract", "cluster": "...", "format": "ids"|"mask"}
+                  row ids (or a base64 bit-packed mask) matching each keyword group
+- POST /trends    {"keywords": [...], "location": "abstract"}
+                  per-year match percentages of each keyword group
+- POST /authors   {"author": "Oliver Fiehn", "details": false}
+                  row ids (and optionally titles, journals, years) of the author's papers
+- POST /export    {"keywords": [...], "location": "abstract", "cluster": "..."} or {"author": "..."},
+                  with "columns": [...] and "format": "csv"|"parquet"
+                  the matching papers as a file, streamed in chunks as they are encoded
+
+Keywords follow the app's syntax: one entry per group, alternatives separated by |.
+Requests are parsed on the event loop and the CPU work runs on a thread pool, with regex
+scans going to the shared regex process pool; busy and timed-out searches map to 503/504.
+
+Run with `python service.py --port 8000`; `python -m benchmarks.load_service` load-tests it.
+"""
+import argparse
+import base64
+import functools
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tornado.ioloop
+import tornado.web
+
+import data_store
+import export
+import instrumentation
+import regex_pool
+from analysis import ALL_CLUSTERS, Dataset, LiveDataset
+from author_index import fold_name
+from regex_pool import QueryTimeout, ServerBusy
+
+LOCATIONS = ('abstract', 'title')
+DETAIL_COLUMNS = ('title', 'journal_title', 'pub_year')
+MAX_DETAIL_ROWS = 500
+DEFAULT_THREADS = int(os.environ.get('MLA_SERVICE_THREADS', os.cpu_count() or 1))
+
+
+class RequestError(tornado.web.HTTPError):
+    """A malformed request; reported to the client as 400 with `message`."""
+
+    def __init__(self, message):
+        super().__init__(400, reason=message)
+
+
+class BaseHandler(tornado.web.RequestHandler):
+
+    def initialize(self, live, executor):
+        self.live = live
+        self.executor = executor
+
+    async def prepare(self):
+        # Each request runs on the version current when it arrived; checking for a new one may
+        # load delta batches, so it runs off the event loop too
+        self.dataset = await tornado.ioloop.IOLoop.current().run_in_executor(self.executor, self.live.current)
+
+    def set_default_headers(self):
+        self.set_header('Content-Type', 'application/json')
+
+    def body_json(self):
+        try:
+            body = json.loads(self.request.body or b'{}')
+        except ValueError:
+            raise RequestError("Request body must be JSON") from None
+        if not isinstance(body, dict):
+            raise RequestError("Request body must be a JSON object")
+        return body
+
+    async def run(self, fn, *args):
+        result = await self.call(fn, *args)
+        if result is not None:
+            self.finish(json.dumps(result))
+
+    async def call(self, fn, *args):
+        # CPU work runs off the event loop so slow queries do not block other connections;
+        # a failed query is answered with its status and returns None
+        try:
+            return await tornado.ioloop.IOLoop.current().run_in_executor(self.executor, fn, *args)
+        except ServerBusy as e:
+            self.fail(503, str(e))
+        except QueryTimeout as e:
+            self.fail(504, str(e))
+        except re.error as e:
+            self.fail(400, f"Invalid keyword pattern: {e}")
+
+    def fail(self, status, message):
+        self.set_status(status)
+        self.finish(json.dumps({'error': message}))
+
+    def write_error(self, status_code, **kwargs):
+        self.finish(json.dumps({'error': self._reason}))
+
+
+class HealthHandler(BaseHandler):
+
+    def get(self):
+        self.finish(json.dumps({
+            'status': 'ok',
+            'rows': len(self.dataset.df),
+            'fingerprint': self.dataset.fingerprint,
+            'cache': self.dataset.cache.stats(),
+        }))
+
+
+class MatchHandler(BaseHandler):
+
+    async def post(self):
+        body = self.body_json()
+        keywords = _keywords(body)
+        location = _location(body)
+        cluster = body.get('cluster') or ALL_CLUSTERS
+        output = body.get('format', 'ids')
+        if output not in ('ids', 'mask'):
+            raise RequestError("format must be 'ids' or 'mask'")
+        await self.run(self.match, keywords, location, cluster, output)
+
+    def match(self, keywords, location, cluster, output):
+        groups = []
+        for display_name, ids in self.dataset.keyword_matches(keywords, location, cluster):
+            group = {'group': display_name, 'count': int(len(ids))}
+            if output == 'ids':
+                group['ids'] = ids.tolist()
+            else:
+                mask = np.zeros(len(self.dataset.df), dtype=bool)
+                mask[ids] = True
+                group['mask'] = base64.b64encode(np.packbits(mask).tobytes()).decode()
+            groups.append(group)
+        return {'rows': len(self.dataset.df), 'cluster': cluster, 'location': location, 'groups': groups}
+
+
+class TrendsHandler(BaseHandler):
+
+    async def post(self):
+        body = self.body_json()
+        await self.run(self.trends, _keywords(body), _location(body))
+
+    def trends(self, keywords, location):
+        years, series = self.dataset.trend_series(keywords, location)
+        return {
+            'years': [int(year) for year in years],
+            'series': [{'group': display_name, 'percentages': [float(p) for p in percentages]}
+                       for display_name, percentages in series],
+        }
+
+
+class AuthorsHandler(BaseHandler):
+
+    async def post(self):
+        body = self.body_json()
+        author = body.get('author')
+        if not isinstance(author, str) or not fold_name(author):
+            raise RequestError("author must be a non-empty name")
+        await self.run(self.authors, author, bool(body.get('details', False)))
+
+    def authors(self, author, details):
+        rows = self.dataset.author_rows(author)
+        result = {'author': author, 'count': int(len(rows)), 'ids': rows.tolist()}
+        if details:
+            papers = self.dataset.df.take(rows[:MAX_DETAIL_ROWS])[list(DETAIL_COLUMNS)]
+            result['papers'] = json.loads(papers.to_json(orient='records'))
+        return result
+
+
+class ExportHandler(BaseHandler):
+
+    async def post(self):
+        body = self.body_json()
+        fmt = body.get('format', 'csv')
+        if fmt not in export.FORMATS:
+            raise RequestError(f"format must be one of {', '.join(export.FORMATS)}")
+        columns = body.get('columns', list(export.DEFAULT_EXPORT_COLUMNS))
+        if not isinstance(columns, list) or not all(column in export.EXPORT_COLUMNS for column in columns):
+            raise RequestError(f"columns must be a list of {', '.join(export.EXPORT_COLUMNS)}")
+        if 'author' in body:
+            author = body['author']
+            if not isinstance(author, str) or not fold_name(author):
+                raise RequestError("author must be a non-empty name")
+            start = functools.partial(self.dataset.author_export, author, columns, fmt)
+        else:
+            start = functools.partial(self.dataset.keyword_export, body.get('cluster') or ALL_CLUSTERS,
+                                      _keywords(body), _location(body), columns, fmt)
+
+        # Matching runs first, so its errors still get a JSON status; then every chunk is
+        # encoded off the event loop and flushed before the next one is read
+        encoded = await self.call(start)
+        if encoded is None:
+            return
+        self.set_header('Content-Type', export.MEDIA_TYPES[fmt])
+        self.set_header('Content-Disposition', f'attachment; filename="papers.{fmt}"')
+        loop = tornado.ioloop.IOLoop.current()
+        while True:
+            chunk = await loop.run_in_executor(self.executor, next, encoded, None)
+            if chunk is None:
+                break
+            self.write(chunk)
+            await self.flush()
+        self.finish()
+
+
+def make_app(live, threads=DEFAULT_THREADS):
+    """The service application over `live`, an analysis.LiveDataset."""
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='mla-query')
+    args = {'live': live, 'executor': executor}
+    return tornado.web.Application([
+        (r'/health', HealthHandler, args),
+        (r'/match', MatchHandler, args),
+        (r'/trends', TrendsHandler, args),
+        (r'/authors', AuthorsHandler, args),
+        (r'/export', ExportHandler, args),
+    ])
+
+
+def _keywords(body):
+    keywords = body.get('keywords')
+    if isinstance(keywords, str):
+        keywords = keywords.split(',')
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        raise RequestError("keywords must be a list of strings or a comma-separated string")
+    if not any(k.strip() for k in keywords):
+        raise RequestError("keywords must contain at least one keyword")
+    return keywords
+
+
+def _location(body):
+    location = body.get('location', 'abstract')
+    if location not in LOCATIONS:
+        raise RequestError(f"location must be one of {', '.join(LOCATIONS)}")
+    return location
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve keyword, trend and author queries as JSON")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--source', default=data_store.SOURCE_PATH)
+    parser.add_argument('--store-dir', default=data_store.STORE_DIR)
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS)
+    parser.add_argument('--regex-workers', type=int, default=regex_pool.DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    dataset = Dataset.load(args.source, args.store_dir, regex_workers=args.regex_workers)
+    # Build the indexes before accepting traffic
+    for location in LOCATIONS:
+        dataset.text_index(location)
+        dataset.term_cube(location)
+    dataset.author_index()
+    dataset.year_table()
+
+    make_app(LiveDataset(dataset), args.threads).listen(args.port, args.address)
+    print(f"Serving {len(dataset.df)} papers on http://{args.address}:{args.port}"
+          + (f" (timings in {instrumentation.PERF_LOG_PATH})" if instrumentation.PERF_LOG_PATH else ""))
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
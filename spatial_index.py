@@ -0,0 +1,106 @@
+"""
+Uniform-grid spatial index over the 2D t-SNE embedding.
+
+The map pages need "which papers are in this box/lasso region" and "which papers are nearest
+to this one". Both used to be a scan over every coordinate. The index buckets papers into a
+grid of square cells sized for a handful of papers each, with the row ids stored cell by cell
+(CSR layout: `cell_start` into `rows`). A region query reads only the cells overlapping the
+region's bounding box, one contiguous run of cells per grid row, before the exact test; a
+nearest-neighbour query widens a square of cells around the point until it holds enough
+papers, then answers exactly from the box that covers the k-th distance.
+
+Papers without coordinates are left out.
+"""
+import math
+
+import numpy as np
+
+# Average number of papers per grid cell
+_PAPERS_PER_CELL = 8
+
+
+class SpatialIndex:
+    """Grid cell -> row ids of the papers at those t-SNE coordinates."""
+
+    def __init__(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.size = len(x)
+        valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        self.x, self.y = x, y
+
+        if len(valid):
+            self.x0, self.y0 = x[valid].min(), y[valid].min()
+            width, height = x[valid].max() - self.x0, y[valid].max() - self.y0
+        else:
+            self.x0 = self.y0 = width = height = 0.0
+        area = max(width * height, 1e-12)
+        self.cell = max(math.sqrt(area * _PAPERS_PER_CELL / max(len(valid), 1)), 1e-9)
+        self.nx = int(width // self.cell) + 1
+        self.ny = int(height // self.cell) + 1
+
+        cells = self._cell_x(x[valid]) + self.nx * self._cell_y(y[valid])
+        order = np.argsort(cells, kind='stable')
+        self.rows = valid[order].astype(np.int32)
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.nx * self.ny + 1))
+
+    def within_rect(self, x0, x1, y0, y1):
+        """Sorted row ids of the papers inside the rectangle (bounds included, in any order)."""
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        rows = self._cell_rows(x0, x1, y0, y1)
+        inside = (self.x[rows] >= x0) & (self.x[rows] <= x1) & (self.y[rows] >= y0) & (self.y[rows] <= y1)
+        return np.sort(rows[inside])
+
+    def within_polygon(self, xs, ys):
+        """Sorted row ids of the papers inside a lasso polygon (even-odd rule)."""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if len(xs) < 3:
+            return np.empty(0, dtype=np.int32)
+        rows = self._cell_rows(xs.min(), xs.max(), ys.min(), ys.max())
+        px, py = self.x[rows], self.y[rows]
+        inside = np.zeros(len(rows), dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for xi, yi, xj, yj in zip(xs, ys, np.roll(xs, 1), np.roll(ys, 1)):
+                crosses = (yi > py) != (yj > py)
+                inside ^= crosses & (px < (xj - xi) * (py - yi) / (yj - yi) + xi)
+        return np.sort(rows[inside])
+
+    def nearest(self, x, y, k):
+        """(row ids, distances) of the k papers nearest to (x, y), nearest first."""
+        if k <= 0 or not len(self.rows):
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        # Widen a square of cells around the point until it holds at least k papers
+        radius = self.cell
+        while True:
+            rows = self._cell_rows(x - radius, x + radius, y - radius, y + radius)
+            covers_grid = (x - radius <= self.x0 and y - radius <= self.y0
+                           and x + radius >= self.x0 + self.nx * self.cell
+                           and y + radius >= self.y0 + self.ny * self.cell)
+            if len(rows) >= k or covers_grid:
+                break
+            radius *= 2
+        # The k-th distance among those bounds the answer; the box around it holds every closer paper
+        distances = np.hypot(self.x[rows] - x, self.y[rows] - y)
+        kth = np.partition(distances, min(k, len(rows)) - 1)[min(k, len(rows)) - 1]
+        rows = self._cell_rows(x - kth, x + kth, y - kth, y + kth)
+        distances = np.hypot(self.x[rows] - x, self.y[rows] - y)
+        order = np.lexsort((rows, distances))[:k]
+        return rows[order], distances[order]
+
+    def _cell_rows(self, x0, x1, y0, y1):
+        # Row ids in the cells overlapping the box: one contiguous run of cells per grid row
+        ix0, ix1 = self._cell_x(np.array([x0, x1]))
+        iy0, iy1 = self._cell_y(np.array([y0, y1]))
+        starts = self.cell_start[np.arange(iy0, iy1 + 1) * self.nx + ix0]
+        stops = self.cell_start[np.arange(iy0, iy1 + 1) * self.nx + ix1 + 1]
+        if len(starts) == 1:
+            return self.rows[starts[0]:stops[0]]
+        return np.concatenate([self.rows[start:stop] for start, stop in zip(starts, stops)])
+
+    def _cell_x(self, x):
+        return np.clip(((x - self.x0) // self.cell).astype(np.int64), 0, self.nx - 1)
+
+    def _cell_y(self, y):
+        return np.clip(((y - self.y0) // self.cell).astype(np.int64), 0, self.ny - 1)
@@ -0,0 +1,35 @@
+"""Differential checks of TextIndex matching against a full `re.search` scan."""
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from text_index import TextIndex
+
+TEXTS = pd.Series([
+    'ABC of metabolomics', 'the abc method', 'xABCy', 'Abcess 2024', 'café and café',
+    'tab\there', 'line\nbreak', 'smile \U0001F600 now', 'no match', None, 'aa aa', 'abab', 'A1 B2',
+])
+
+PATTERNS = [
+    # plain keywords and escapes the literal prefilter already handled
+    'ABC', 'abc method', r'\d{4}', r'\bABC\b', r'A\d', r'tab\there', 'café',
+    # hex, unicode, named and octal character escapes
+    r'\x41BC', r'\x41', r'A\x42C', r'\x41+BC', r'\x0abreak', r'\U00000041BC', r'\U0001F600 now',
+    r'\N{LATIN CAPITAL LETTER A}BC', r'\N{COMBINING ACUTE ACCENT}',
+    r'\101BC', r'\101', r'\101?BC', r'tab\011here', r'\012break', r'line\0break',
+    # backreferences
+    r'(a)\1', r'(ab)\1', r'(aa) \1', r'(?P<x>ab)(?P=x)',
+]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return TextIndex(TEXTS)
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_match_equals_full_scan(index, pattern):
+    expected = TEXTS.map(lambda text: text is not None and re.search(pattern, text, re.IGNORECASE) is not None)
+    assert np.array_equal(index.match_groups([[pattern]])[0], expected.to_numpy())
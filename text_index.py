@@ -0,0 +1,464 @@
+"""
+Inverted token index over a text column (abstracts or titles).
+
+Keyword matching in the app keeps the semantics of `re.search(keyword, text, re.IGNORECASE)`:
+a keyword is a case-insensitive regular expression that may match anywhere inside the text,
+including inside longer words ("MS" matches "systems"). The index answers those queries
+without scanning every row:
+
+- Each row is split into lowercase `\\w+` tokens and the index stores, for every distinct
+  token, the sorted row ids containing it (CSR layout: `indptr` into `indices`).
+- A plain keyword is split into its word runs. A run can only occur inside a text token, so
+  the candidate rows are the union of the posting lists of the vocabulary tokens that contain
+  the run (or start/end with it, or equal it, depending on where the run sits in the keyword).
+  Runs are intersected for phrases.
+- A regular expression is reduced to the literal substrings every match must contain. Those
+  literals go through the same lookup, using a trigram index over the vocabulary, and only the
+  surviving candidate rows are scanned with the compiled pattern.
+
+Single-word keywords are answered from the posting lists alone; everything else is verified
+with the original regex on the candidate rows, so results are identical to a full scan.
+
+`match_groups_progressive` runs that verification in steps over row ranges, for showing
+partial results of slow regex queries while the rest of the corpus is scanned.
+"""
+import re
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# re.IGNORECASE treats these as equal to ASCII letters; fold them the same way before tokenizing
+IGNORECASE_FOLD = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+# Characters that give a keyword regex meaning; anything else is matched literally
+_REGEX_META = set('.^$*+?{}[]\\|()')
+
+# Inline flag groups such as (?x) change how the rest of the pattern reads
+_INLINE_FLAGS = re.compile(r'\(\?[aiLmsux-]+[:)]')
+
+# Digits taken by \x, \u and \U escapes, and the digit patterns of numeric escapes
+_ESCAPE_DIGITS = {'x': 2, 'u': 4, 'U': 8}
+_HEX_DIGITS = re.compile(r'[0-9a-fA-F]*')
+_OCTAL_DIGITS = re.compile(r'[0-7]*')
+
+_BUILD_CHUNK_ROWS = 20000
+
+
+class MatchStep(NamedTuple):
+    """One step of TextIndex.match_groups_progressive."""
+    done: float         # fraction of the regex verification done
+    scanned: object     # boolean mask of the rows verified so far
+    masks: list         # one boolean mask per group, exact on the scanned rows
+    complete: list      # per group: the mask is exact on every row (no keyword left to verify)
+
+
+def split_keyword_groups(keywords):
+    """
+    Parse comma-separated keyword entries into keyword groups.
+
+    Parameters:
+    - keywords: List of raw entries; an entry containing | is an OR group
+
+    Returns:
+    - List of (display_name, alternatives) tuples, empty entries removed
+    """
+    groups = []
+    for keyword_entry in keywords:
+        keyword_entry = keyword_entry.strip()
+        if not keyword_entry:
+            continue
+        if '|' in keyword_entry:
+            alternatives = [k.strip() for k in keyword_entry.split('|') if k.strip()]
+            groups.append((' | '.join(alternatives), alternatives))
+        else:
+            groups.append((keyword_entry, [keyword_entry]))
+    return groups
+
+
+class TextIndex:
+    """Token -> sorted row ids for one text column; rows are positions in the indexed Series."""
+
+    def __init__(self, texts):
+        self.texts = pd.Series(texts).reset_index(drop=True)
+        self.size = len(self.texts)
+
+        token_ids = {}
+        keys = []
+        for start in range(0, self.size, _BUILD_CHUNK_ROWS):
+            chunk = self.texts.iloc[start:start + _BUILD_CHUNK_ROWS]
+            keys.append(self._posting_keys(chunk, start, token_ids))
+
+        keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+        # Keys are token_id * size + row, so sorting groups rows by token in ascending order
+        indices = (keys % max(self.size, 1)).astype(np.int32)
+        indptr = np.searchsorted(keys // max(self.size, 1), np.arange(len(token_ids) + 1))
+        self._set_postings(token_ids, indices, indptr)
+
+    def extend(self, texts):
+        """
+        A new index over these rows followed by `texts` (a delta batch). Only the new rows are
+        tokenized; their postings are appended to the existing lists. This index is unchanged.
+        """
+        texts = pd.Series(texts).reset_index(drop=True)
+        extended = object.__new__(TextIndex)
+        extended.texts = pd.concat([self.texts, texts], ignore_index=True)
+        extended.size = self.size + len(texts)
+
+        token_ids = dict(self._token_ids)
+        keys = [extended._posting_keys(texts.iloc[start:start + _BUILD_CHUNK_ROWS], self.size + start, token_ids)
+                for start in range(0, len(texts), _BUILD_CHUNK_ROWS)]
+        keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+        tokens = keys // max(extended.size, 1)
+        rows = (keys % max(extended.size, 1)).astype(np.int32)
+
+        # New rows come after every old row, so each token's new postings go at the end of its
+        # old list (new tokens at the end of the array); np.insert keeps the order of ties
+        positions = self.indptr[np.minimum(tokens + 1, len(self.vocab))]
+        indices = np.insert(self.indices, positions, rows)
+        counts = np.bincount(tokens, minlength=len(token_ids))
+        counts[:len(self.vocab)] += np.diff(self.indptr)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        extended._set_postings(token_ids, indices, indptr)
+        return extended
+
+    def _set_postings(self, token_ids, indices, indptr):
+        self.vocab = np.array(list(token_ids), dtype=object)
+        self.indices = indices
+        self.indptr = indptr
+
+        order = np.argsort(self.vocab)
+        self._sorted_ids = order
+        self._sorted_vocab = self.vocab[order]
+        reversed_vocab = np.array([token[::-1] for token in self.vocab], dtype=object)
+        order = np.argsort(reversed_vocab)
+        self._reversed_ids = order
+        self._sorted_reversed = reversed_vocab[order]
+        self._token_ids = token_ids
+        self._trigrams = None
+        self._lookup_cache = {}
+
+    def _posting_keys(self, chunk, row_offset, token_ids):
+        tokens = chunk.str.translate(IGNORECASE_FOLD).str.lower().str.findall(TOKEN_PATTERN.pattern)
+        exploded = tokens.explode().dropna()
+        if exploded.empty:
+            return np.empty(0, dtype=np.int64)
+        for token in pd.unique(exploded.to_numpy()):
+            token_ids.setdefault(token, len(token_ids))
+        codes = exploded.map(token_ids).to_numpy(np.int64)
+        rows = exploded.index.to_numpy(np.int64) - chunk.index[0] + row_offset
+        return np.unique(codes * self.size + rows)
+
+    def match_groups(self, groups, verify_many=None):
+        """
+        Boolean masks for several OR groups (lists of keywords), one per group.
+
+        Keywords answered from the posting lists are resolved directly; the rest are verified
+        together by `verify_many({keyword: candidate_rows}) -> {keyword: matching_rows}`,
+        e.g. RegexPool.scan, so all regex keywords of a query share one scan.
+        """
+        masks, pending = self._resolve_groups(groups)
+        self._verify_pending(masks, groups, pending, {keyword: rows for keyword, (_, rows) in pending.items()},
+                             verify_many)
+        return masks
+
+    def match_groups_progressive(self, groups, chunk_rows, verify_many=None):
+        """
+        match_groups in steps, yielding a MatchStep after each one.
+
+        Keywords answered from the posting lists are resolved before the first step. The rows
+        are split into ranges holding about `chunk_rows` candidate rows of the regex keywords,
+        verified one range per step in a fixed shuffled order: rows are stored grouped by
+        research cluster, so partial results then sample every cluster instead of the first
+        ones. The last step has every row scanned and the masks of match_groups; closing the
+        generator between steps skips the remaining ranges.
+        """
+        masks, pending = self._resolve_groups(groups)
+        complete = [not any(keyword in pending for keyword in keywords) for keywords in groups]
+        candidates = [rows for _, rows in pending.values()]
+        candidates = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int32)
+        bounds = np.concatenate([[0], candidates[chunk_rows::max(chunk_rows, 1)], [self.size]])
+        order = np.random.default_rng(0).permutation(len(bounds) - 1) if pending else []
+
+        scanned = np.zeros(self.size, dtype=bool)
+        for step, i in enumerate(order):
+            start, stop = bounds[i], bounds[i + 1]
+            chunk = {}
+            for keyword, (_, rows) in pending.items():
+                lo, hi = np.searchsorted(rows, [start, stop])
+                if hi > lo:
+                    chunk[keyword] = rows[lo:hi]
+            self._verify_pending(masks, groups, pending, chunk, verify_many)
+            scanned[start:stop] = True
+            if step < len(order) - 1:
+                yield MatchStep((step + 1) / len(order), scanned, masks, complete)
+        yield MatchStep(1.0, np.ones(self.size, dtype=bool), masks, [True] * len(groups))
+
+    def _resolve_groups(self, groups):
+        # Empty masks with the rows of posting-list keywords set, and the regex keywords left to
+        # verify: keyword -> (compiled pattern, candidate rows)
+        masks = [np.zeros(self.size, dtype=bool) for _ in groups]
+        pending = {}
+        for mask, keywords in zip(masks, groups):
+            for keyword in keywords:
+                pattern = re.compile(keyword, re.IGNORECASE)
+                rows, exact = self.candidates(keyword)
+                if exact:
+                    mask[rows] = True
+                elif keyword not in pending:
+                    instrumentation.count('rows_scanned', len(rows))
+                    pending[keyword] = (pattern, rows)
+        return masks, pending
+
+    def _verify_pending(self, masks, groups, pending, keyword_rows, verify_many):
+        # Verify `keyword_rows` (keyword -> rows to check) and set the matches in the group masks
+        if not keyword_rows:
+            return
+        if verify_many is not None:
+            matched = verify_many(keyword_rows)
+        else:
+            matched = {keyword: self.verify(pending[keyword][0], rows) for keyword, rows in keyword_rows.items()}
+        for mask, keywords in zip(masks, groups):
+            for keyword in keywords:
+                if keyword in matched:
+                    mask[matched[keyword]] = True
+
+    def candidates(self, keyword):
+        """
+        Return (rows, exact): a sorted superset of the rows matching `keyword`, and whether
+        the rows are already the exact answer (no regex verification needed).
+        """
+        if _is_plain_literal(keyword):
+            literal = keyword.lower()
+            runs = _literal_runs(literal)
+            exact = len(runs) == 1 and runs[0] == (literal, 'contains')
+            return self._literal_rows(runs), exact
+
+        rows = None
+        if '|' not in keyword and not _INLINE_FLAGS.search(keyword):
+            for literal in _required_literals(keyword):
+                literal = literal.lower()
+                if not literal.isascii():
+                    continue
+                literal_rows = self._literal_rows(_literal_runs(literal))
+                rows = literal_rows if rows is None else np.intersect1d(rows, literal_rows, assume_unique=True)
+        if rows is None:
+            rows = np.arange(self.size, dtype=np.int32)
+        return rows, False
+
+    def exact_token(self, keyword):
+        """
+        Id of the one vocabulary token whose posting list is exactly the rows matching
+        `keyword`, or None when the keyword needs several tokens, verification, or matches nothing.
+        """
+        if not _is_plain_literal(keyword):
+            return None
+        literal = keyword.lower()
+        if _literal_runs(literal) != [(literal, 'contains')]:
+            return None
+        token_ids = self._lookup(literal, 'contains')
+        return token_ids[0] if len(token_ids) == 1 else None
+
+    def verify(self, pattern, rows):
+        """Return the subset of `rows` whose text matches the compiled `pattern`."""
+        texts = self.texts.iloc[rows]
+        hits = [isinstance(text, str) and pattern.search(text) is not None for text in texts]
+        return rows[np.array(hits, dtype=bool)] if len(rows) else rows
+
+    def _literal_rows(self, runs):
+        rows = None
+        for run, relation in runs:
+            run_rows = self._rows_for_tokens(self._lookup(run, relation))
+            rows = run_rows if rows is None else np.intersect1d(rows, run_rows, assume_unique=True)
+            if not len(rows):
+                break
+        if rows is None:
+            rows = np.arange(self.size, dtype=np.int32)
+        return rows
+
+    def _rows_for_tokens(self, token_ids):
+        if len(token_ids) == 1:
+            t = token_ids[0]
+            return self.indices[self.indptr[t]:self.indptr[t + 1]]
+        mask = np.zeros(self.size, dtype=bool)
+        for t in token_ids:
+            mask[self.indices[self.indptr[t]:self.indptr[t + 1]]] = True
+        return np.flatnonzero(mask).astype(np.int32)
+
+    def _lookup(self, run, relation):
+        key = (run, relation)
+        if key not in self._lookup_cache:
+            self._lookup_cache[key] = self._find_tokens(run, relation)
+        return self._lookup_cache[key]
+
+    def _find_tokens(self, run, relation):
+        if relation == 'exact':
+            return [self._token_ids[run]] if run in self._token_ids else []
+        if relation == 'prefix':
+            return self._sorted_range(self._sorted_vocab, self._sorted_ids, run)
+        if relation == 'suffix':
+            return self._sorted_range(self._sorted_reversed, self._reversed_ids, run[::-1])
+        if len(run) < 3:
+            return [i for i, token in enumerate(self.vocab) if run in token]
+        candidates = None
+        trigrams = self._trigram_index()
+        for gram in {run[i:i + 3] for i in range(len(run) - 2)}:
+            ids = trigrams.get(gram)
+            if ids is None:
+                return []
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+        return [i for i in candidates if run in self.vocab[i]]
+
+    @staticmethod
+    def _sorted_range(sorted_tokens, ids, prefix):
+        lo = np.searchsorted(sorted_tokens, prefix, side='left')
+        hi = np.searchsorted(sorted_tokens, prefix + '\U0010ffff', side='left')
+        return list(ids[lo:hi])
+
+    def _trigram_index(self):
+        # Built on first substring lookup: trigram -> ids of vocabulary tokens containing it
+        if self._trigrams is None:
+            grams = {}
+            for i, token in enumerate(self.vocab):
+                for gram in {token[j:j + 3] for j in range(len(token) - 2)}:
+                    grams.setdefault(gram, []).append(i)
+            self._trigrams = {gram: np.array(ids, dtype=np.int32) for gram, ids in grams.items()}
+        return self._trigrams
+
+
+def _is_plain_literal(keyword):
+    return keyword.isascii() and not any(c in _REGEX_META for c in keyword)
+
+
+def _literal_runs(literal):
+    """
+    Split a lowercase literal into its word runs and how each run must appear in a text token:
+    'contains' when the literal is a single run, 'suffix' for a leading run, 'prefix' for a
+    trailing run and 'exact' for runs bounded by non-word characters on both sides.
+    """
+    runs = []
+    for m in TOKEN_PATTERN.finditer(literal):
+        open_left = m.start() == 0
+        open_right = m.end() == len(literal)
+        if open_left and open_right:
+            relation = 'contains'
+        elif open_left:
+            relation = 'suffix'
+        elif open_right:
+            relation = 'prefix'
+        else:
+            relation = 'exact'
+        runs.append((m.group(), relation))
+    return runs
+
+
+def _required_literals(pattern):
+    """
+    Return literal substrings that every match of `pattern` must contain.
+
+    Conservative: groups, classes and escapes other than escaped punctuation end the current
+    literal, and a character made optional by ?, * or {0,...} is dropped. Patterns with a
+    top-level | are not reduced by the caller.
+    """
+    literals = []
+    current = []
+    i = 0
+
+    def flush():
+        if current:
+            literals.append(''.join(current))
+            current.clear()
+
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            char, i = pattern[i + 1], i + 2
+        elif c == '\\':
+            # Classes, anchors, backreferences and character codes (\x41, \101, \N{...}) end the literal
+            flush()
+            i = _escape_end(pattern, i)
+            continue
+        elif c == '[':
+            flush()
+            i = _skip_class(pattern, i)
+            continue
+        elif c == '(':
+            flush()
+            i = _skip_group(pattern, i)
+            continue
+        elif c == '{':
+            flush()
+            end = pattern.find('}', i)
+            i = end + 1 if end != -1 else i + 1
+            continue
+        elif c in _REGEX_META:
+            flush()
+            i += 1
+            continue
+        else:
+            char, i = c, i + 1
+
+        quantifier = pattern[i] if i < len(pattern) else ''
+        if quantifier in ('?', '*') or pattern.startswith('{0', i) or pattern.startswith('{,', i):
+            flush()
+        elif quantifier in ('+', '{'):
+            current.append(char)
+            flush()
+        else:
+            current.append(char)
+    flush()
+    return literals
+
+
+def _escape_end(pattern, i):
+    # End of the escape starting at pattern[i] (a backslash followed by a letter or digit)
+    c = pattern[i + 1] if i + 1 < len(pattern) else ''
+    if c in _ESCAPE_DIGITS:
+        width = _ESCAPE_DIGITS[c]
+        return i + 2 + len(_HEX_DIGITS.match(pattern, i + 2, i + 2 + width).group())
+    if c == 'N' and pattern.startswith('{', i + 2):
+        end = pattern.find('}', i + 2)
+        return end + 1 if end != -1 else len(pattern)
+    if c == '0':
+        return i + 2 + len(_OCTAL_DIGITS.match(pattern, i + 2, i + 4).group())
+    if c.isdigit():
+        # \ooo with three octal digits is a character; otherwise a one- or two-digit backreference
+        if _OCTAL_DIGITS.match(pattern, i + 1, i + 4).end() - (i + 1) == 3:
+            return i + 4
+        return i + 3 if i + 2 < len(pattern) and pattern[i + 2].isdigit() else i + 2
+    return i + 2
+
+
+def _skip_class(pattern, i):
+    i += 1
+    if i < len(pattern) and pattern[i] == '^':
+        i += 1
+    if i < len(pattern) and pattern[i] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        i += 2 if pattern[i] == '\\' else 1
+    return i + 1
+
+
+def _skip_group(pattern, i):
+    depth = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            i = _skip_class(pattern, i)
+            continue
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
@@ -0,0 +1,118 @@
+"""
+Year-trend engine for keyword groups.
+
+Publication years are factorized once per dataset into integer codes with per-year paper
+totals, so a trend query is one match mask per keyword group followed by a single
+`np.bincount` over the year codes of the matching rows.
+
+For trends split by research cluster or journal, TrendCells assigns every paper to a
+(year, cluster, journal) cell and TermCube holds, for every token of a text index, the
+number of papers containing it in each cell. A keyword group is then a vector of per-cell
+counts, read from the cube when the group is exactly one indexed token and counted from its
+match mask otherwise, and any facet (year, year x cluster, year x journal) is a weighted
+`np.bincount` over the cells instead of another pass over the papers.
+"""
+import numpy as np
+import pandas as pd
+
+
+class YearTable:
+    """Publication-year codes and per-year paper totals for one dataset."""
+
+    def __init__(self, pub_years):
+        codes, years = pd.factorize(pd.Series(pub_years), sort=True)
+        self._set_codes(codes, np.asarray(years))
+
+    def extend(self, pub_years):
+        """A new table over these rows followed by `pub_years` (a delta batch)."""
+        codes, years = pd.factorize(pd.Series(pub_years), sort=True)
+        all_years = np.union1d(self.years, np.asarray(years))
+        # Re-code both parts against the merged years; -1 (no year) stays -1
+        old_codes = np.where(self._valid, np.searchsorted(all_years, self.years)[self.codes], -1)
+        new_codes = np.where(codes >= 0, np.searchsorted(all_years, np.asarray(years))[codes], -1)
+        extended = object.__new__(YearTable)
+        extended._set_codes(np.concatenate([old_codes, new_codes]), all_years)
+        return extended
+
+    def _set_codes(self, codes, years):
+        self.codes = codes
+        self.years = years
+        # Rows without a year get code -1 and are left out of every count
+        self._valid = codes >= 0
+        self.totals = self.counts(np.ones(len(codes), dtype=bool))
+
+    def counts(self, mask):
+        """Number of rows selected by the boolean `mask` in each year."""
+        return np.bincount(self.codes[mask & self._valid], minlength=len(self.years))
+
+
+class TrendCells:
+    """(year, cluster, journal) cell of every paper, with per-cell paper totals."""
+
+    def __init__(self, year_table, clusters, journals):
+        """`clusters`, `journals`: the predicted_category and journal_title columns, aligned with `year_table`."""
+        cluster_codes, self.clusters = pd.factorize(pd.Series(clusters))
+        journal_codes, self.journals = pd.factorize(pd.Series(journals))
+        self.clusters, self.journals = list(self.clusters), list(self.journals)
+        self.years = year_table.years
+
+        # Missing clusters and journals get their own -1 slot; papers without a year get no cell
+        n_clusters, n_journals = len(self.clusters) + 1, len(self.journals) + 1
+        keys = (year_table.codes.astype(np.int64) * n_clusters + cluster_codes + 1) * n_journals + journal_codes + 1
+        valid = year_table.codes >= 0
+        cell_keys, cells = np.unique(keys[valid], return_inverse=True)
+        self.cells = np.full(len(keys), -1, dtype=np.int32)
+        self.cells[valid] = cells
+        self.cell_year = (cell_keys // (n_clusters * n_journals)).astype(np.int32)
+        self.cell_cluster = (cell_keys // n_journals % n_clusters - 1).astype(np.int32)
+        self.cell_journal = (cell_keys % n_journals - 1).astype(np.int32)
+        self.totals = np.bincount(cells, minlength=len(cell_keys))
+
+    def __len__(self):
+        return len(self.totals)
+
+    def counts(self, mask):
+        """Number of rows selected by the boolean `mask` in each cell."""
+        cells = self.cells[mask]
+        return np.bincount(cells[cells >= 0], minlength=len(self))
+
+    def by_year(self, cell_counts):
+        """Per-cell counts summed per year (aligned with `years`)."""
+        return np.bincount(self.cell_year, weights=cell_counts, minlength=len(self.years)).astype(np.int64)
+
+    def by_facet(self, cell_counts, facet):
+        """Per-cell counts summed per (cluster or journal, year): a matrix over `clusters`/`journals` x `years`."""
+        codes = self.cell_cluster if facet == 'cluster' else self.cell_journal
+        n_values = len(self.clusters if facet == 'cluster' else self.journals)
+        keep = codes >= 0
+        counts = np.bincount(codes[keep] * len(self.years) + self.cell_year[keep], weights=cell_counts[keep],
+                             minlength=n_values * len(self.years))
+        return counts.astype(np.int64).reshape(n_values, len(self.years))
+
+
+class TermCube:
+    """Token -> papers containing it per TrendCells cell, for one text index (CSR: `indptr` into `cells`/`counts`)."""
+
+    def __init__(self, text_index, trend_cells):
+        self.n_cells = len(trend_cells)
+        tokens = np.repeat(np.arange(len(text_index.vocab), dtype=np.int64), np.diff(text_index.indptr))
+        cells = trend_cells.cells[text_index.indices]
+        valid = cells >= 0
+        keys, counts = np.unique(tokens[valid] * self.n_cells + cells[valid], return_counts=True)
+        self.cells = (keys % self.n_cells).astype(np.int32)
+        self.counts = counts.astype(np.int32)
+        self.indptr = np.searchsorted(keys // self.n_cells, np.arange(len(text_index.vocab) + 1))
+
+    def cell_counts(self, token_id):
+        """Papers containing the token in each cell."""
+        start, stop = self.indptr[token_id], self.indptr[token_id + 1]
+        counts = np.zeros(self.n_cells, dtype=np.int64)
+        counts[self.cells[start:stop]] = self.counts[start:stop]
+        return counts
+
+
+def percentages(counts, totals):
+    """`counts` as a percentage of `totals`, 0 where there are no papers."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(totals > 0, counts / totals * 100, 0.0)
+